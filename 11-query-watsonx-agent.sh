@@ -11,6 +11,10 @@ VENV_PATH="./mcpgateway/.venv"
 # For federated agents, the method is the full tool name.
 METHOD="watsonx-agent-chat"
 
+# Scripted calls queue behind interactive UI chats in the agent's scheduler.
+PRIORITY="${PRIORITY:-batch}"
+TENANT="${TENANT:-${USER:-scripts}}"
+
 # --- 1) Activate venv ---
 if [[ -f "${VENV_PATH}/bin/activate" ]]; then
   # shellcheck disable=SC1090
@@ -45,7 +49,9 @@ PROMPT=${PROMPT:-What is the capital of Italy?}
 RPC_BODY=$(jq -n \
   --arg method "$METHOD" \
   --arg q      "$PROMPT" \
-  '{jsonrpc:"2.0",id:1,method:$method,params:{query:$q}}')
+  --arg prio   "$PRIORITY" \
+  --arg tenant "$TENANT" \
+  '{jsonrpc:"2.0",id:1,method:$method,params:{query:$q,priority:$prio,tenant:$tenant}}')
 
 # --- 6) Call the Gateway ---
 echo -e "\n🚀 Sending request ..."
@@ -2,23 +2,11 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-echo "Monitoring MCP Gateway (press Ctrl-C to stop)…"
-while true; do
-  TIMESTAMP="$(date '+%Y-%m-%d %H:%M:%S')"
-  PIDS="$(pgrep -f 'mcpgateway --host' || true)"
-  if [ -n "$PIDS" ]; then
-    echo "$TIMESTAMP | ✅ Running (PID${PIDS// /, PID})"
-  else
-    echo "$TIMESTAMP | ❌ Not running"
-  fi
-
-  # Check if port 4444 is listening
-  if ss -tunlp | grep -q ':4444'; then
-    echo "$TIMESTAMP | ✅ Listening on port 4444"
-  else
-    echo "$TIMESTAMP | ❌ Port 4444 not in use"
-  fi
-
-  echo "—"
-  sleep 5
-done
+# Thin wrapper around monitor.py: synthetic probes, latency/error/CPU/RSS
+# history and drift alerts for the gateway, frontends and agents.
+# History is served on http://127.0.0.1:9100/summary (and /series, /metrics).
+#
+#   ./Monitor-MCP-Gateway.sh                                  # local stack
+#   ./Monitor-MCP-Gateway.sh --config monitor.example.json    # custom targets
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+exec python3 "${SCRIPT_DIR}/monitor.py" "$@"
@@ -5,6 +5,12 @@ from mcp.client.sse import sse_client
 from mcp.client.session import ClientSession
 
 
+async def print_chunk(progress: float, total: float | None, message: str | None) -> None:
+    """Progress notifications carry the newly generated text in ``message``."""
+    if message:
+        print(message, end="", flush=True)
+
+
 async def main():
     # 1) Open the SSE transport
     async with sse_client("http://127.0.0.1:6278/sse") as (read_stream, write_stream):
@@ -32,11 +38,12 @@ async def main():
             except Exception as e:
                 print("❌ ping failed:", e)
 
-            # 6) Invoke the `watsonx_chat` tool
+            # 6) Invoke the `watsonx_chat` tool, printing the reply as it streams in
             try:
-                # FIX: Use the correct method 'call_tool'
-                chat = await session.call_tool("watsonx_chat", {"prompt": "hello world"})
-                print("📨 watsonx_chat →", chat)
+                print("📨 watsonx_chat → ", end="", flush=True)
+                chat = await session.call_tool("watsonx_chat", {"prompt": "hello world"},
+                                               progress_callback=print_chunk)
+                print("\n📨 watsonx_chat →", chat)
             except Exception as e:
                 print("❌ watsonx_chat failed:", e)
 
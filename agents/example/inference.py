@@ -1,10 +1,128 @@
+"""
+inference.py – concurrent tool evaluation for an MCP server
+
+Connects to an SSE endpoint, discovers every tool, calls each one with
+several parameter sets at bounded concurrency and records the latency of
+every call. Tools that stream (progress notifications, like the watsonx
+agent's ``chat``) also get their time to first chunk recorded. Prints a
+summary table and writes a JSON report with percentiles – a quick
+performance check after registering an agent.
+
+Run
+───
+
+python inference.py                                  # http://127.0.0.1:6278/sse
+python inference.py --url http://127.0.0.1:6288/sse --concurrency 8 --repeat 5
+python inference.py --params params.json --report report.json
+
+`--params` points to a JSON file mapping tool name → list of argument dicts;
+tools not listed get parameter sets derived from their input schema.
+"""
+
+import argparse
+import json
+import math
+import time
+from datetime import datetime, timezone
+
 import anyio
 from mcp.client.sse import sse_client
 from mcp.client.session import ClientSession
 
-async def evaluate_tools():
+DEFAULT_URL = "http://127.0.0.1:6278/sse"
+SAMPLE_PROMPTS = [
+    "Hello from inference.py",
+    "What is the capital of Italy?",
+    "Summarise the benefits of an MCP gateway in one sentence.",
+]
+
+
+def _sample_value(schema: dict, index: int):
+    """Pick a sample value for one JSON-schema property."""
+    kind = schema.get("type")
+    if "anyOf" in schema:                 # Union[str, int] and friends
+        kinds = [s.get("type") for s in schema["anyOf"]]
+        kind = "string" if "string" in kinds else kinds[0]
+    if kind == "integer":
+        return index + 1
+    if kind == "number":
+        return float(index + 1)
+    if kind == "boolean":
+        return bool(index % 2)
+    return SAMPLE_PROMPTS[index % len(SAMPLE_PROMPTS)]
+
+
+def default_param_sets(tool) -> list[dict]:
+    """Build one argument dict per sample prompt from the tool's input schema."""
+    schema = getattr(tool, "inputSchema", None) or {}
+    props = schema.get("properties") or {}
+    required = schema.get("required") or list(props)
+    if not required:
+        return [{}]
+    return [
+        {name: _sample_value(props.get(name, {}), i) for name in required}
+        for i in range(len(SAMPLE_PROMPTS))
+    ]
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return math.nan
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    if lo == hi:
+        return sorted_values[lo]
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarise(samples: dict[str, list[dict]]) -> dict[str, dict]:
+    """Aggregate per-call samples into per-tool latency statistics (ms)."""
+    summary = {}
+    for name, calls in samples.items():
+        ok = sorted(c["latency_ms"] for c in calls if c["ok"])
+        first = sorted(c["first_chunk_ms"] for c in calls
+                       if c["ok"] and c["first_chunk_ms"] is not None)
+        summary[name] = {
+            "calls": len(calls),
+            "errors": sum(1 for c in calls if not c["ok"]),
+            "min_ms": ok[0] if ok else math.nan,
+            "mean_ms": sum(ok) / len(ok) if ok else math.nan,
+            "p50_ms": percentile(ok, 50),
+            "p90_ms": percentile(ok, 90),
+            "p95_ms": percentile(ok, 95),
+            "p99_ms": percentile(ok, 99),
+            "max_ms": ok[-1] if ok else math.nan,
+            "ttft_p50_ms": percentile(first, 50),
+            "ttft_p95_ms": percentile(first, 95),
+        }
+    return summary
+
+
+def print_table(summary: dict[str, dict]) -> None:
+    cols = ["calls", "errors", "min_ms", "p50_ms", "p90_ms", "p95_ms", "p99_ms", "max_ms",
+            "ttft_p50_ms"]
+    widths = [max(9, len(c)) for c in cols]
+    width = max([len("tool")] + [len(n) for n in summary])
+    print(f"\n{'tool':<{width}}  " + "  ".join(f"{c:>{w}}" for c, w in zip(cols, widths)))
+    print("─" * (width + sum(w + 2 for w in widths)))
+    for name, row in summary.items():
+        cells = [
+            f"{row[c]:>{w}d}" if isinstance(row[c], int) else f"{row[c]:>{w}.1f}"
+            for c, w in zip(cols, widths)
+        ]
+        print(f"{name:<{width}}  " + "  ".join(cells))
+
+
+async def evaluate_tools(
+    url: str = DEFAULT_URL,
+    concurrency: int = 4,
+    repeat: int = 1,
+    overrides: dict[str, list[dict]] | None = None,
+) -> dict:
+    """Call every tool with every parameter set, ``repeat`` times, in parallel."""
+    overrides = overrides or {}
     # 1) Connect to your demo server’s SSE endpoint
-    url = "http://127.0.0.1:6278/sse"
     async with sse_client(url) as (read_stream, write_stream):
         # 2) Establish an MCP session
         async with ClientSession(read_stream, write_stream) as session:
@@ -20,18 +138,97 @@ async def evaluate_tools():
                 desc = getattr(tool, "description", "")
                 print(f" • {tool.name} — {desc}")
 
-            # 5) Evaluate each tool
-            for tool in tools:
-                name = tool.name
-                params = {} if name == "ping" else {"prompt": "Hello from inference.py"}
-                try:
-                    # FIX: Use 'session.call_tool' instead of 'session.request'.
-                    # The 'call_tool' method returns a result object, and printing it
-                    # yields the detailed format you want.
-                    result = await session.call_tool(name, params)
-                    print(f"\n📨 {name}({params}) → {result}")
-                except Exception as e:
-                    print(f"\n❌ {name} failed:", e)
+            jobs = [
+                (tool.name, params)
+                for tool in tools
+                for params in overrides.get(tool.name) or default_param_sets(tool)
+                for _ in range(repeat)
+            ]
+            samples: dict[str, list[dict]] = {tool.name: [] for tool in tools}
+            limiter = anyio.CapacityLimiter(concurrency)
+
+            # 5) Evaluate each tool – requests share one session, bounded by the limiter
+            async def run(name: str, params: dict) -> None:
+                first_chunk_ms = None
+
+                async def on_progress(progress, total, message) -> None:
+                    nonlocal first_chunk_ms
+                    if first_chunk_ms is None:
+                        first_chunk_ms = (time.perf_counter() - start) * 1000
+
+                async with limiter:
+                    start = time.perf_counter()
+                    try:
+                        result = await session.call_tool(name, params,
+                                                         progress_callback=on_progress)
+                        ok, error = not result.isError, None
+                        if result.isError:
+                            error = str(result.content)
+                    except Exception as e:
+                        ok, error = False, str(e)
+                    latency_ms = (time.perf_counter() - start) * 1000
+                samples[name].append(
+                    {"params": params, "ok": ok, "latency_ms": latency_ms,
+                     "first_chunk_ms": first_chunk_ms, "error": error}
+                )
+                if not ok:
+                    print(f"❌ {name}({params}) failed: {error}")
+
+            wall_start = time.perf_counter()
+            async with anyio.create_task_group() as tg:
+                for name, params in jobs:
+                    tg.start_soon(run, name, params)
+            wall_s = time.perf_counter() - wall_start
+
+    summary = summarise(samples)
+    print_table(summary)
+    print(f"\n⏱  {len(jobs)} calls in {wall_s:.2f}s "
+          f"({len(jobs) / wall_s:.1f} calls/s, concurrency={concurrency})")
+    return {
+        "url": url,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "concurrency": concurrency,
+        "repeat": repeat,
+        "total_calls": len(jobs),
+        "wall_time_s": wall_s,
+        "throughput_cps": len(jobs) / wall_s if wall_s else math.nan,
+        "tools": summary,
+        "samples": samples,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Concurrent MCP tool evaluation")
+    parser.add_argument("--url", default=DEFAULT_URL, help="SSE endpoint of the MCP server")
+    parser.add_argument("--concurrency", type=int, default=4, help="max in-flight calls")
+    parser.add_argument("--repeat", type=int, default=1, help="calls per parameter set")
+    parser.add_argument("--params", help="JSON file: {tool: [args, ...]}")
+    parser.add_argument("--report", default="inference_report.json", help="JSON report path")
+    return parser.parse_args()
+
+
+async def main() -> None:
+    args = parse_args()
+    overrides = None
+    if args.params:
+        with open(args.params, encoding="utf-8") as fh:
+            overrides = json.load(fh)
+    report = await evaluate_tools(args.url, args.concurrency, args.repeat, overrides)
+    with open(args.report, "w", encoding="utf-8") as fh:
+        json.dump(_nan_to_none(report), fh, indent=2)
+    print(f"📝 Report written to {args.report}")
+
+
+def _nan_to_none(obj):
+    """NaN is not valid JSON – report missing percentiles as null."""
+    if isinstance(obj, float) and math.isnan(obj):
+        return None
+    if isinstance(obj, dict):
+        return {k: _nan_to_none(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_nan_to_none(v) for v in obj]
+    return obj
+
 
 if __name__ == "__main__":
-    anyio.run(evaluate_tools)
\ No newline at end of file
+    anyio.run(main)
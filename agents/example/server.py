@@ -4,7 +4,7 @@ watsonx-demo MCP server – Hello World
 Tools exposed
 ─────────────
 • ping          → {"reply": "pong"}
-• watsonx-chat  → {"reply": PROMPT.upper()}
+• watsonx-chat  → {"reply": PROMPT.upper()}, streamed word by word as progress
 
 Run
 ───
@@ -12,8 +12,14 @@ Run
 python server.py            # port 6278 by default
 """
 
-import os, time, logging
-from mcp.server.fastmcp import FastMCP
+import os, sys, logging
+from pathlib import Path
+import anyio
+import uvicorn
+from mcp.server.fastmcp import Context, FastMCP
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))   # <repo>/common
+from common.sse_sessions import SessionLimitMiddleware, Sessions
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 log = logging.getLogger("watsonx-demo")
@@ -30,12 +36,18 @@ async def ping() -> dict:
     return {"reply": "pong"}
 
 @mcp.tool(description="Chat with IBM watsonx.ai (dummy)")
-async def watsonx_chat(prompt: str) -> dict:
+async def watsonx_chat(prompt: str, ctx: Context) -> dict:
     log.info("watsonx_chat(%s)", prompt)
-    time.sleep(0.2)                       # simulate latency
+    words = prompt.upper().split()
+    for i, word in enumerate(words, 1):   # simulate a streamed generation
+        await anyio.sleep(0.2 / max(len(words), 1))
+        await ctx.report_progress(i, len(words), word + " ")   # no-op without a progress token
     return {"reply": prompt.upper()}
 
 # 3 ────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
     log.info("🚀 listening on http://0.0.0.0:%d/sse", PORT)
-    mcp.run(transport="sse")              # SSE endpoint is /sse
+    app = mcp.sse_app()                   # SSE endpoint is /sse
+    # SSE_MAX_SESSIONS / SSE_IDLE_SECONDS: cap and expire client sessions
+    app.add_middleware(SessionLimitMiddleware, sessions=Sessions())
+    uvicorn.run(app, host=mcp.settings.host, port=PORT)
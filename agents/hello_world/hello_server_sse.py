@@ -1,15 +1,23 @@
 # agents/hello_world/hello_server.py
 import logging
+import os
+import sys
+from pathlib import Path
 from typing import Union
 
+import uvicorn
 from mcp.server.fastmcp import FastMCP
 
+# Shared helpers live in <repo>/common
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common.sse_sessions import SessionLimitMiddleware, Sessions
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
 )
 
-PORT = 6274                        # same port you’ll enter in “Add Gateway”
+PORT = int(os.getenv("PORT", 6274))   # same port you’ll enter in “Add Gateway”
 mcp  = FastMCP(name="hello-world-agent", port=PORT)
 
 # ─── Tool: echo ────────────────────────────────────────────────────────────
@@ -23,6 +31,11 @@ async def echo(text: Union[str, int]) -> dict:
     return {"reply": str(text)}
 
 # ─── Run over SSE ──────────────────────────────────────────────────────────
+# SSE_MAX_SESSIONS open sessions at most, idle ones closed after SSE_IDLE_SECONDS
+sessions = Sessions()
+
 if __name__ == "__main__":
     logging.info("🚀 Serving Hello World agent on http://127.0.0.1:%d/sse", PORT)
-    mcp.run(transport="sse")        # Gateway Transport Type = “SSE”
+    app = mcp.sse_app()             # Gateway Transport Type = “SSE”
+    app.add_middleware(SessionLimitMiddleware, sessions=sessions)
+    uvicorn.run(app, host=mcp.settings.host, port=PORT)
@@ -0,0 +1,98 @@
+# bench/bench_cache.py
+"""
+Read latency of the cache tiers: in-memory only vs shared store vs disk.
+
+Fills every tier with the same ENTRIES replies of VALUE_BYTES each, then
+times random hits (and a share of misses) and prints p50 / p99 / mean in
+microseconds. Also times warming a fresh in-memory tier from disk, which
+is what a restarted agent pays once at start-up.
+
+Run
+───
+
+python bench/bench_cache.py
+python bench/bench_cache.py --entries 50000 --value-bytes 2048 --reads 100000 \\
+       --disk-path /var/lib/watsonx/cache.db
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3]))
+from common.response_cache import DiskCache, MemoryCache, ResponseCache, make_key  # noqa: E402
+from common.shared_store import SharedStore  # noqa: E402
+
+TTL = 3600.0
+
+
+def time_reads(get, keys: list[str], reads: int, miss_ratio: float) -> dict:
+    samples = []
+    for _ in range(reads):
+        key = make_key("miss", random.random()) if random.random() < miss_ratio else random.choice(keys)
+        start = time.perf_counter_ns()
+        get(key)
+        samples.append((time.perf_counter_ns() - start) / 1000)
+    samples.sort()
+    return {
+        "p50_us": samples[len(samples) // 2],
+        "p99_us": samples[int(len(samples) * 0.99)],
+        "mean_us": sum(samples) / len(samples),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cache tier read latency")
+    parser.add_argument("--entries", type=int, default=10_000)
+    parser.add_argument("--value-bytes", type=int, default=1024)
+    parser.add_argument("--reads", type=int, default=50_000)
+    parser.add_argument("--miss-ratio", type=float, default=0.1)
+    parser.add_argument("--disk-path", help="SQLite file for the disk tier (default: temp dir)")
+    opts = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-cache-")
+    disk_path = opts.disk_path or os.path.join(workdir, "cache.db")
+    value = "x" * opts.value_bytes
+    keys = [make_key("model", i) for i in range(opts.entries)]
+
+    memory = MemoryCache(max_entries=opts.entries)
+    shared = SharedStore(os.path.join(workdir, "state.db"), max_entries=opts.entries)
+    disk = DiskCache(disk_path, max_bytes=1 << 40)
+
+    fill_start = time.perf_counter()
+    for key in keys:
+        memory.set(key, value, TTL)
+        shared.set(key, value, TTL)
+        disk.set(key, value, TTL)
+    print(f"filled {opts.entries} × {opts.value_bytes} B into 3 tiers "
+          f"in {time.perf_counter() - fill_start:.1f}s\n")
+
+    two_tier = ResponseCache(MemoryCache(max_entries=opts.entries), disk, ttl=TTL)
+    warm_start = time.perf_counter()
+    warmed = two_tier.warm(opts.entries)
+    warm_s = time.perf_counter() - warm_start
+
+    tiers = {
+        "memory only": memory.get,
+        "shared store (tmpfs)": shared.get,
+        "disk only": disk.get,
+        "memory + disk (warmed)": two_tier.get,
+    }
+    print(f"{'tier':<24}{'p50 µs':>10}{'p99 µs':>10}{'mean µs':>10}")
+    for name, get in tiers.items():
+        row = time_reads(get, keys, opts.reads, opts.miss_ratio)
+        print(f"{name:<24}{row['p50_us']:>10.1f}{row['p99_us']:>10.1f}{row['mean_us']:>10.1f}")
+
+    print(f"\nwarm-up from disk: {warmed} entries in {warm_s * 1000:.0f} ms "
+          f"(hits front={two_tier.hits['front']} disk={two_tier.hits['disk']} "
+          f"miss={two_tier.misses})")
+    print(f"disk file: {disk.total_bytes() / 1e6:.1f} MB payload, "
+          f"{disk.compact()} entries evicted on compaction")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# bench/bench_workers.py
+"""
+Measure how the non-generation overhead of main.py scales with workers.
+
+The response for one prompt is seeded straight into the shared store, so
+every request is a cache hit: what gets measured is HTTP parsing, the
+shared rate-limit bucket and the shared cache lookup – never watsonx.
+For each worker count the script starts `uvicorn main:app --workers N`,
+drives it from several load-generator processes and reports requests per
+second plus the scaling efficiency against one worker.
+
+Run (with the same .env as the agent)
+───
+
+python bench/bench_workers.py                      # 1, 2, 4 … up to CPU count
+python bench/bench_workers.py --workers 1 2 4 8 --duration 10 --json scaling.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing as mp
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+HOST = "127.0.0.1"
+PROMPT = "benchmark: cached prompt"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+def seed_cache(state_path: str) -> None:
+    """Write the benchmark reply into the store the workers will open."""
+    os.environ["SHARED_STATE_PATH"] = state_path
+    os.environ["CACHE_TTL_SECONDS"] = "3600"     # the cache is off by default
+    sys.path.insert(0, str(PROJECT_ROOT))
+    import main  # noqa: E402 – reads .env and the store path on import
+
+    main.store.set(main.cache_key(main.profiles.default.tag, PROMPT), "cached reply", 3600)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+async def _load(url: str, connections: int, duration: float) -> tuple[int, int, list[float]]:
+    payload = {"tool": "chat", "args": {"prompt": PROMPT}}
+    ok = errors = 0
+    latencies: list[float] = []
+    limits = httpx.Limits(max_connections=connections)
+    async with httpx.AsyncClient(limits=limits, timeout=10) as client:
+        stop_at = time.perf_counter() + duration
+
+        async def user() -> None:
+            nonlocal ok, errors
+            while time.perf_counter() < stop_at:
+                start = time.perf_counter()
+                try:
+                    resp = await client.post(url, json=payload)
+                    if resp.status_code == 200:
+                        ok += 1
+                        latencies.append((time.perf_counter() - start) * 1000)
+                    else:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+
+        await asyncio.gather(*(user() for _ in range(connections)))
+    return ok, errors, latencies
+
+
+def load_process(url: str, connections: int, duration: float, out: mp.Queue) -> None:
+    out.put(asyncio.run(_load(url, connections, duration)))
+
+
+def run_level(workers: int, clients: int, connections: int,
+              duration: float, state_path: str) -> dict:
+    port = free_port()
+    env = {**os.environ, "SHARED_STATE_PATH": state_path, "RATE_LIMIT_RPS": "1000000",
+           "CACHE_TTL_SECONDS": "3600"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", HOST, "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=PROJECT_ROOT, env=env,
+    )
+    try:
+        wait_ready(f"http://{HOST}:{port}/")
+        url = f"http://{HOST}:{port}/http"
+        out: mp.Queue = mp.Queue()
+        procs = [mp.Process(target=load_process, args=(url, connections, duration, out))
+                 for _ in range(clients)]
+        for p in procs:
+            p.start()
+        results = [out.get() for _ in procs]
+        for p in procs:
+            p.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    ok = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    latencies = sorted(l for r in results for l in r[2])
+    pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] if latencies else 0.0
+    return {
+        "workers": workers,
+        "requests": ok,
+        "errors": errors,
+        "rps": ok / duration,
+        "p50_ms": pick(0.50),
+        "p99_ms": pick(0.99),
+    }
+
+
+def main() -> None:
+    cpus = os.cpu_count() or 1
+    default_levels = [n for n in (1, 2, 4, 8, 16, 32) if n <= cpus] or [1]
+    parser = argparse.ArgumentParser(description="Multi-worker scaling benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=default_levels)
+    parser.add_argument("--clients", type=int, default=max(2, cpus // 2),
+                        help="load-generator processes")
+    parser.add_argument("--connections", type=int, default=32,
+                        help="concurrent connections per load generator")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per level")
+    parser.add_argument("--json", help="also write results to this file")
+    opts = parser.parse_args()
+
+    state_path = os.path.join(tempfile.mkdtemp(prefix="bench-workers-"), "state.db")
+    seed_cache(state_path)
+
+    rows = []
+    for workers in opts.workers:
+        row = run_level(workers, opts.clients, opts.connections, opts.duration, state_path)
+        base = rows[0]["rps"] / rows[0]["workers"] if rows else row["rps"] / workers
+        row["efficiency"] = row["rps"] / (base * workers) if base else 0.0
+        rows.append(row)
+        print(f"workers={workers:<3} rps={row['rps']:>9.1f}  p50={row['p50_ms']:>6.2f}ms  "
+              f"p99={row['p99_ms']:>7.2f}ms  errors={row['errors']:<5} "
+              f"efficiency={row['efficiency']:.0%}")
+
+    if opts.json:
+        Path(opts.json).write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
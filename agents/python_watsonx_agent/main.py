@@ -4,32 +4,54 @@ main.py – Minimal, robust Watsonx Chat Agent
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
+import sys
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
 from functools import lru_cache
-from typing import Final, Optional
+from pathlib import Path
+from typing import TYPE_CHECKING, Final, Optional
+from urllib.parse import urlsplit
 
+import httpx
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
-# --------------------------------------------------------------------------- #
-# IBM Watsonx SDK imports
-# --------------------------------------------------------------------------- #
-try:
-    from ibm_watsonx_ai.credentials import Credentials
+load_dotenv()  # .env support; first, as some of the helpers below read settings at import
+
+# Shared helpers live in <repo>/common
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common import metrics  # noqa: E402
+from common.drain import CLOSE_SECONDS, PROBE_PATHS, Drain, DrainMiddleware  # noqa: E402
+from common.deadline import (  # noqa: E402
+    HEADER, ClientDisconnected, Deadline, DeadlineExceeded, WorkTracker, collect_stream, run_guarded,
+)
+from common.credentials import refresh_enabled, token_manager  # noqa: E402
+from common.response_cache import DiskCache, ResponseCache, make_key  # noqa: E402
+from common.scheduler import FairScheduler, QueueFull, UnknownPriority  # noqa: E402
+from common.jobs import FINISHED, InvalidJob, Job, JobRunner, JobStore  # noqa: E402
+from common.logsetup import configure_logging  # noqa: E402
+from common.model_client import model_client  # noqa: E402
+from common.profiles import Profile, ProfileSet, UnknownProfile  # noqa: E402
+from common.profiling import ProfilingMiddleware, admin_router  # noqa: E402
+from common.prompt_limit import PromptLimit, PromptTooLong  # noqa: E402
+from common.shared_store import SharedStore, default_path  # noqa: E402
+from common.usage import UsageLedger  # noqa: E402
+
+if TYPE_CHECKING:
     from ibm_watsonx_ai.foundation_models import ModelInference
-    from ibm_watsonx_ai.metanames import GenTextParamsMetaNames as GenParams
-except ImportError as exc:  # pragma: no cover
-    raise SystemExit(
-        "The package `ibm-watsonx-ai` is required. "
-        "Install it with `pip install ibm-watsonx-ai`."
-    ) from exc
 
 # --------------------------------------------------------------------------- #
 # Logging
 # --------------------------------------------------------------------------- #
-logging.basicConfig(
+configure_logging(
     format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
     datefmt="%Y-%m-%d %H:%M:%S",
     level=logging.INFO,
@@ -39,13 +61,51 @@ logger: Final = logging.getLogger("watsonx-agent")
 # --------------------------------------------------------------------------- #
 # Configuration
 # --------------------------------------------------------------------------- #
-load_dotenv()  # .env support
-
 WATSONX_APIKEY: Final[str | None] = os.getenv("WATSONX_APIKEY")
 WATSONX_URL:    Final[str | None] = os.getenv("WATSONX_URL")
 PROJECT_ID:     Final[str | None] = os.getenv("PROJECT_ID")
+MODEL_ID:       str = os.getenv("MODEL_ID", "ibm/granite-13b-instruct-v2")   # reloaded on SIGHUP
+
+# Optional: generate through the host's shared model daemon, which then holds
+# the credentials, the watsonx SDK and the reply cache (agents/watsonx-agent/model_daemon.py)
+MODEL_DAEMON_SOCKET: Final[str | None] = os.getenv("MODEL_DAEMON_SOCKET")
+
+# Pre-fork workers; cache and budgets below are shared between all of them
+WORKERS: Final[int] = int(os.getenv("WORKERS", "1"))
+SHARED_STATE_PATH: Final[str | None] = os.getenv("SHARED_STATE_PATH")
+# 0 = off; with the model daemon, replies are cached there for every agent instead
+CACHE_TTL_SECONDS: Final[float] = (
+    0 if MODEL_DAEMON_SOCKET else float(os.getenv("CACHE_TTL_SECONDS", "0")))
+CACHE_MAX_ENTRIES: Final[int] = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+RATE_LIMIT_RPS:    Final[float] = float(os.getenv("RATE_LIMIT_RPS", "0"))          # 0 = off
+RATE_LIMIT_BURST:  Final[float] = float(os.getenv("RATE_LIMIT_BURST", "20"))
+MAX_CONCURRENT_GENERATIONS: Final[int] = int(os.getenv("MAX_CONCURRENT_GENERATIONS", "0"))
+
+# Optional persistent tier that survives restarts and redeploys
+CACHE_DISK_PATH:    Final[str | None] = os.getenv("CACHE_DISK_PATH")
+CACHE_DISK_MAX_MB:  Final[float] = float(os.getenv("CACHE_DISK_MAX_MB", "256"))
+CACHE_WARM_ENTRIES: Final[int] = int(os.getenv("CACHE_WARM_ENTRIES", "1000"))
 
-if not all([WATSONX_APIKEY, WATSONX_URL, PROJECT_ID]):
+# Health probes: readiness serves the result of a background refresh
+HEALTH_REFRESH_SECONDS: Final[float] = float(os.getenv("HEALTH_REFRESH_SECONDS", "15"))
+HEALTH_PROBE_TIMEOUT:   Final[float] = float(os.getenv("HEALTH_PROBE_TIMEOUT", "5"))
+GATEWAY_URL:            Final[str | None] = os.getenv("GATEWAY_URL")   # optional, reported only
+
+# Budget for /http when the caller sends no X-Request-Timeout-Ms header
+REQUEST_TIMEOUT_SECONDS: Final[float] = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "120"))
+
+# Batch jobs: a directory per job on a persistent disk (see common/jobs.py)
+JOBS_DIR:             Final[str] = os.getenv("JOBS_DIR", str(Path(__file__).with_name("jobs")))
+JOBS_CONCURRENCY:     Final[int] = int(os.getenv("JOBS_CONCURRENCY", "4"))        # per job
+JOBS_MAX_CONCURRENCY: Final[int] = int(os.getenv("JOBS_MAX_CONCURRENCY", "32"))
+JOBS_MAX_MB:          Final[float] = float(os.getenv("JOBS_MAX_MB", "64"))        # upload size
+JOBS_ADOPT_SECONDS:   Final[float] = float(os.getenv("JOBS_ADOPT_SECONDS", "30"))
+# Hosts that callback_url may point at; none = callbacks refused (the agent
+# must not be made to POST into the network it runs in)
+JOBS_CALLBACK_HOSTS:  Final[frozenset[str]] = frozenset(
+    host.strip().lower() for host in os.getenv("JOBS_CALLBACK_HOSTS", "").split(",") if host.strip())
+
+if not MODEL_DAEMON_SOCKET and not all([WATSONX_APIKEY, WATSONX_URL, PROJECT_ID]):
     missing = [k for k, v in {
         "WATSONX_APIKEY": WATSONX_APIKEY,
         "WATSONX_URL":    WATSONX_URL,
@@ -56,11 +116,22 @@ if not all([WATSONX_APIKEY, WATSONX_URL, PROJECT_ID]):
         "Create a .env file or export them before running."
     )
 
+if not MODEL_DAEMON_SOCKET:
+    try:
+        import ibm_watsonx_ai  # noqa: F401
+    except ImportError as exc:  # pragma: no cover
+        raise SystemExit(
+            "The package `ibm-watsonx-ai` is required. "
+            "Install it with `pip install ibm-watsonx-ai`."
+        ) from exc
+
 # --------------------------------------------------------------------------- #
 # Pydantic models
 # --------------------------------------------------------------------------- #
 class ToolArgs(BaseModel):
     prompt: str
+    profile: Optional[str] = None   # e.g. "interactive-fast", "balanced", "long-form"
+    slo_ms: Optional[int] = None    # or: the richest profile that answers in time
 
 
 class ToolRequest(BaseModel):
@@ -75,45 +146,18 @@ class ToolResponse(BaseModel):
 # --------------------------------------------------------------------------- #
 # Model initialisation (lazy singleton)
 # --------------------------------------------------------------------------- #
-@lru_cache
-def get_model() -> Optional[ModelInference]:
+@lru_cache(maxsize=2)
+def load_model(model_id: str) -> Optional[ModelInference]:
     """
-    Cache a single ModelInference client. Return None if initialisation fails
-    so later requests can respond quickly with 503.
-    """
-    logger.info("Initialising Watsonx.ai model …")
-
-    # --- Watsonx.ai Model Initialisation ---
-    credentials = Credentials(url=WATSONX_URL, api_key=WATSONX_APIKEY)
-    decoding="sample"
-    if decoding == "sample":
-
-        parameters = {
-            GenParams.DECODING_METHOD: "sample",
-            GenParams.MAX_NEW_TOKENS: 512,
-            GenParams.MIN_NEW_TOKENS: 50,
-            GenParams.TEMPERATURE: 0.7,
-            GenParams.TOP_P: 0.9,
-            GenParams.REPETITION_PENALTY: 1.2,
-            GenParams.STOP_SEQUENCES: ["\n\n", "===", "---"],
-        }
-    else:
-            parameters = {                      
-        GenParams.DECODING_METHOD:    "greedy",
-        GenParams.MAX_NEW_TOKENS:     512,
-        GenParams.MIN_NEW_TOKENS:     1,
-        GenParams.REPETITION_PENALTY: 1.1,
-        GenParams.STOP_SEQUENCES:     ["\n\n", "===", "---"],
-    }
-
-
+    Cache a single ModelInference client (or model daemon client) per model
+    id. Return None if initialisation fails so later requests can respond
+    quickly with 503. Generation parameters come from the request's profile,
+    not from the client.
+    """
+    logger.info("Initialising Watsonx.ai model %s …", model_id)
     try:
-        model = ModelInference(
-            model_id="ibm/granite-13b-instruct-v2",
-            params=parameters,
-            credentials=credentials,
-            project_id=PROJECT_ID,
-        )
+        # The process's background-refreshed IAM token, or the shared model daemon
+        model = model_client(model_id, WATSONX_URL, WATSONX_APIKEY, PROJECT_ID)
         logger.info("Watsonx.ai model ready.")
         return model
     except Exception as exc:
@@ -121,52 +165,541 @@ def get_model() -> Optional[ModelInference]:
         return None  # type: ignore[return-value]
 
 
+def get_model() -> Optional[ModelInference]:
+    """The client for the current ``MODEL_ID``, which a config reload may change."""
+    return load_model(MODEL_ID)
+
+
+# --------------------------------------------------------------------------- #
+# Shared state (one store per host, opened by every worker)
+# --------------------------------------------------------------------------- #
+# One store per deployment: the workers of this app directory and port
+store: Final = SharedStore(
+    SHARED_STATE_PATH or default_path(f"{Path(__file__).resolve().parent}:{os.getenv('PORT', '')}"),
+    max_entries=CACHE_MAX_ENTRIES)
+disk_cache: Final = (
+    DiskCache(CACHE_DISK_PATH, max_bytes=int(CACHE_DISK_MAX_MB * 1024 * 1024))
+    if CACHE_DISK_PATH else None
+)
+cache: Final = ResponseCache(store, disk_cache, ttl=CACHE_TTL_SECONDS)
+
+
+def cache_key(profile_tag: str, prompt: str) -> str:
+    return make_key(MODEL_ID, profile_tag, prompt)
+
+
+# Named generation profiles, built once (see common/profiles.py)
+profiles: Final = ProfileSet.load(default="long-form")
+
+# Per-tenant weighted queues and strict priority classes in front of watsonx
+# (see common/scheduler.py). Per process: each worker schedules its own slots.
+scheduler: Final = FairScheduler.from_env()
+
+
+generation_work: Final = WorkTracker("watsonx")
+
+# Prompts are counted and held to PROMPT_MAX_TOKENS before any model call
+# (truncate, reject or summarize; see common/prompt_limit.py)
+prompt_limit: Final = PromptLimit.from_env()
+
+# Token usage per model, tenant and profile, flushed to /metrics and
+# USAGE_LOG_PATH every USAGE_FLUSH_SECONDS (see common/usage.py). Per worker.
+usage_ledger: Final = UsageLedger.from_env("python-watsonx-agent")
+
+job_store: Final = JobStore(JOBS_DIR)
+
+# SIGTERM drains before exiting, SIGHUP reloads the config (see common/drain.py)
+drain: Final = Drain()
+
+
+def reload_config() -> None:
+    """
+    SIGHUP: read ``MODEL_ID`` and the generation profiles again (from .env or
+    the environment). The new model client is built before it replaces the
+    old one; calls in flight finish on the model they started with.
+    Credentials, URLs and sizes need a restart.
+    """
+    global MODEL_ID
+    load_dotenv(override=True)
+    profiles.reload()
+    model_id = os.getenv("MODEL_ID", MODEL_ID)
+    if model_id != MODEL_ID:
+        if load_model(model_id) is None:
+            load_model.cache_clear()
+            raise RuntimeError(f"model {model_id} could not be initialised")
+        logger.info("Model %s → %s", MODEL_ID, model_id)
+        MODEL_ID = model_id
+
+
+drain.on_reload(reload_config)
+
+
+class SlotsBusy(Exception):
+    """Every cross-worker generation lease (MAX_CONCURRENT_GENERATIONS) is taken."""
+
+
+async def generate(model: ModelInference, prompt: str, profile: Profile, tenant: str,
+                   priority: str, stop: threading.Event,
+                   budget: Optional[float] = None) -> tuple[str, dict, float]:
+    """
+    Wait for a scheduler slot, then stream one generation. Returns the text,
+    its usage and the generation time without the queue wait. ``stop`` ends
+    the stream early (see common/deadline.py). ``budget`` bounds the
+    generation itself, counted from when the slot is granted.
+    """
+    async with scheduler.slot(tenant, priority, cost=profile.params.get("max_new_tokens", 1)):
+        lease = None
+        if MAX_CONCURRENT_GENERATIONS > 0:
+            lease = store.acquire("generate", MAX_CONCURRENT_GENERATIONS)
+            if lease is None:
+                raise SlotsBusy("All generation slots are busy")
+        start = time.perf_counter()
+
+        def stream() -> tuple[str, dict]:
+            return collect_stream(model.generate_text_stream(
+                prompt=prompt, params=profile.params, raw_response=True), stop)
+
+        try:
+            if budget is None:
+                result, usage = await run_in_threadpool(stream)
+            else:
+                result, usage = await run_guarded(lambda: run_in_threadpool(stream),
+                                                  Deadline(budget), generation_work, stop=stop)
+        finally:
+            if lease is not None:
+                store.release(lease)
+    return result, usage, time.perf_counter() - start
+
+
+# --------------------------------------------------------------------------- #
+# Health checks (refreshed in the background, served from memory)
+# --------------------------------------------------------------------------- #
+@dataclass
+class Probe:
+    ok: bool = False
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+    checked_at: float = 0.0          # time.time() of the last check, 0 = never
+
+
+health_state: Final[dict[str, Probe]] = {"model": Probe()}
+if WATSONX_URL:
+    health_state["watsonx"] = Probe()
+if refresh_enabled() and not MODEL_DAEMON_SOCKET:
+    health_state["credentials"] = Probe()
+if GATEWAY_URL:
+    health_state["gateway"] = Probe()
+_deep_lock = asyncio.Lock()
+
+
+def _probe_url(name: str) -> str:
+    if name == "watsonx":
+        # Public model catalogue: a real round trip to the region, no token, no generation
+        return f"{WATSONX_URL.rstrip('/')}/ml/v1/foundation_model_specs?version=2024-05-01&limit=1"
+    return f"{GATEWAY_URL.rstrip('/')}/health"
+
+
+async def probe_http(client: httpx.AsyncClient, url: str) -> Probe:
+    start = time.perf_counter()
+    try:
+        resp = await client.get(url, timeout=HEALTH_PROBE_TIMEOUT)
+        resp.raise_for_status()
+        error = None
+    except httpx.HTTPError as exc:
+        error = f"{exc.__class__.__name__}: {exc}"[:200]
+    return Probe(ok=error is None, latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                 error=error, checked_at=time.time())
+
+
+async def probe_model() -> Probe:
+    """Initialise the client if needed. A cached failure is retried, not kept forever."""
+    start = time.perf_counter()
+    model = await run_in_threadpool(get_model)
+    if model is None:
+        load_model.cache_clear()
+    return Probe(ok=model is not None, latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                 error=None if model is not None else "model initialisation failed",
+                 checked_at=time.time())
+
+
+async def probe_generation() -> Probe:
+    """One-token generation: the latency a user request would see, minus output."""
+    model = get_model()
+    if model is None:
+        return Probe(error="model unavailable", checked_at=time.time())
+    start = time.perf_counter()
+    try:
+        await run_in_threadpool(model.generate_text, prompt="ping",
+                                params={"max_new_tokens": 1, "min_new_tokens": 1})
+        error = None
+    except Exception as exc:
+        error = f"{exc.__class__.__name__}: {exc}"[:200]
+    return Probe(ok=error is None, latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                 error=error, checked_at=time.time())
+
+
+def probe_credentials(model_ok: bool) -> Probe:
+    """The background-refreshed IAM token: read from memory, no exchange."""
+    # The manager is started by the first successful model initialisation
+    state = token_manager(WATSONX_APIKEY).status() if model_ok else {}
+    error = state.get("last_error") or (None if state.get("valid") else "no valid IAM token")
+    return Probe(ok=bool(state.get("valid")), error=error, checked_at=time.time())
+
+
+async def run_health_checks(client: httpx.AsyncClient) -> None:
+    names = [n for n in health_state if n not in ("model", "credentials")]
+    results = await asyncio.gather(probe_model(), *(probe_http(client, _probe_url(n)) for n in names))
+    results = dict(zip(["model", *names], results))
+    if "credentials" in health_state:
+        results["credentials"] = probe_credentials(results["model"].ok)
+    for name, probe in results.items():
+        if probe.ok != health_state[name].ok:
+            logger.log(logging.INFO if probe.ok else logging.WARNING,
+                       "Health: %s %s%s", name, "up" if probe.ok else "down",
+                       f" ({probe.error})" if probe.error else "")
+        health_state[name] = probe
+
+
+async def refresh_health(client: httpx.AsyncClient) -> None:
+    while True:
+        try:
+            await run_health_checks(client)
+        except Exception:  # pragma: no cover – never let the refresher die
+            logger.exception("Health refresh failed")
+        await asyncio.sleep(HEALTH_REFRESH_SECONDS)
+
+
+def is_ready() -> bool:
+    fresh_after = time.time() - 3 * HEALTH_REFRESH_SECONDS
+    return all(health_state[n].ok and health_state[n].checked_at > fresh_after
+               for n in ("model", "watsonx", "credentials") if n in health_state)
+
+
 # --------------------------------------------------------------------------- #
 # FastAPI application
 # --------------------------------------------------------------------------- #
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if disk_cache is not None:
+        removed = disk_cache.compact()
+        loaded = cache.warm(CACHE_WARM_ENTRIES)
+        logger.info("Disk cache %s: %d entries warmed, %d expired removed",
+                    CACHE_DISK_PATH, loaded, removed)
+    async with httpx.AsyncClient() as client:
+        app.state.http = client
+        app.state.jobs = JobRunner(job_store, process_job_item, http=client)
+        app.state.jobs.resume_all()
+        refresher = asyncio.create_task(refresh_health(client))
+        adopter = asyncio.create_task(app.state.jobs.adopt(JOBS_ADOPT_SECONDS))
+        yield
+        refresher.cancel()
+        adopter.cancel()
+        await app.state.jobs.shutdown()
+
+
 app = FastAPI(
     title="Watsonx Chat Agent",
     description="MCP-compatible microservice backed by IBM Watsonx.ai",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# On-demand profiling under /admin/profile, only when ADMIN_TOKEN is set
+app.add_middleware(ProfilingMiddleware)
+admin = admin_router()
+if admin is not None:
+    app.include_router(admin)
+
+# Outermost: while draining, new requests get 503 and probes still answer
+app.add_middleware(DrainMiddleware, drain=drain, passthrough=PROBE_PATHS + ("/admin/",))
+
 
 @app.get("/", summary="Health-check")
 async def health() -> dict[str, str]:
     return {"status": "ok", "agent": "watsonx-agent"}
 
 
+@app.get("/livez", summary="Liveness probe")
+async def livez() -> dict[str, str]:
+    """The process is up and its event loop answers. Nothing else is checked."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz", summary="Readiness probe")
+async def readyz() -> JSONResponse:
+    """
+    Cached model and upstream status from the background refresher. O(1):
+    never calls watsonx. 503 until the first refresh succeeds, after a
+    failure, when the last result is older than three refresh intervals, or
+    while the process drains.
+    """
+    ready = is_ready() and not drain.draining
+    return JSONResponse(
+        {"status": "ready" if ready else "not ready",
+         "checks": {name: asdict(probe) for name, probe in health_state.items()},
+         "drain": drain.status()},
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+@app.get("/healthz", summary="Deep health check")
+async def healthz(generate: bool = False) -> JSONResponse:
+    """
+    Probe watsonx (and the gateway, if GATEWAY_URL is set) now and report
+    measured latencies. ``?generate=true`` also times a one-token generation.
+    Concurrent calls share one round of probes.
+    """
+    in_flight = _deep_lock.locked()
+    async with _deep_lock:
+        if not in_flight:   # otherwise reuse what the round we waited for measured
+            await run_health_checks(app.state.http)
+        checks = {name: asdict(probe) for name, probe in health_state.items()}
+    if generate:
+        checks["generation"] = asdict(await probe_generation())
+    ready = is_ready() and checks.get("generation", {"ok": True})["ok"]
+    return JSONResponse(
+        {"status": "ok" if ready else "degraded", "checks": checks},
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+@app.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    return metrics.render()
+
+
 @app.post("/http", response_model=ToolResponse, summary="Invoke tool")
-async def call_tool(
-    payload: ToolRequest,
-    model: Optional[ModelInference] = Depends(get_model),
-) -> ToolResponse:
-    """Only the 'chat' tool is supported."""
+async def call_tool(payload: ToolRequest, request: Request) -> ToolResponse:
+    """
+    Only the 'chat' tool is supported. The generation is abandoned when the
+    caller disconnects or its ``X-Request-Timeout-Ms`` budget runs out.
+    ``X-Tenant`` and ``X-Priority`` (interactive | batch) place the request
+    in the generation scheduler's queues.
+    """
+    deadline = Deadline.from_headers(request.headers, REQUEST_TIMEOUT_SECONDS)
     if payload.tool.lower() != "chat":
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Tool '{payload.tool}' not found.",
         )
 
+    if RATE_LIMIT_RPS > 0 and not store.take_token("http", RATE_LIMIT_RPS, RATE_LIMIT_BURST):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": "1"},
+        )
+
+    try:
+        profile = profiles.select(
+            payload.args.profile, payload.args.slo_ms,
+            budget_ms=deadline.timeout_ms() if HEADER in request.headers else None,
+        )
+        priority = scheduler.priority(request.headers.get("X-Priority"))
+    except (UnknownProfile, UnknownPriority) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    # a client-chosen name: only configured tenants become queues and usage labels
+    tenant = scheduler.tenant(request.headers.get("X-Tenant"))
+
+    try:
+        checked = prompt_limit.apply(payload.args.prompt, profile.params.get("max_new_tokens", 0))
+    except PromptTooLong as exc:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(exc))
+    prompt = checked.prompt
+
+    key = cache_key(profile.tag, prompt)
+    cached = cache.get(key)
+    if cached is not None:
+        return ToolResponse(result=cached)
+
+    model = get_model()
     if model is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Watsonx model unavailable",
         )
 
-    prompt_preview = payload.args.prompt.replace("\n", " ")[:80]
-    logger.info("Prompt: %s%s", prompt_preview, "…" if len(prompt_preview) == 80 else "")
+    prompt_preview = prompt.replace("\n", " ")[:80]
+    logger.info("Prompt (%s, ~%d tokens%s): %s%s", profile.name, checked.tokens,
+                "" if checked.action == "ok" else f", {checked.action}", prompt_preview,
+                "…" if len(prompt_preview) == 80 else "")
 
     try:
-        result = model.generate_text(prompt=payload.args.prompt)
-        return ToolResponse(result=result)
+        generation_work.check_arrival(deadline)
+    except DeadlineExceeded as exc:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(exc))
+
+    # Streamed so that an abandoned request stops reading and watsonx stops generating
+    stop = threading.Event()
+    start = time.perf_counter()
+    try:
+        result, usage, seconds = await run_guarded(
+            lambda: generate(model, prompt, profile, tenant, priority, stop),
+            deadline, generation_work, request.is_disconnected, stop=stop,
+        )
+    except (QueueFull, SlotsBusy) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(exc),
+            headers={"Retry-After": "1"},
+        )
+    except ClientDisconnected:
+        logger.info("Client disconnected; generation stopped")
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except DeadlineExceeded as exc:
+        profile.observe(time.perf_counter() - start, None, outcome="deadline")
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=str(exc))
     except Exception as exc:  # pragma: no cover
+        profile.observe(time.perf_counter() - start, None, outcome="error")
         logger.exception("Watsonx.ai error")
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail="Error communicating with Watsonx.ai",
         ) from exc
 
+    profile.observe(seconds, usage["generated_tokens"])
+    usage_ledger.record(model.model_id, tenant, profile.name, usage, seconds)
+    prompt_limit.observe(checked, usage["input_tokens"])
+    cache.set(key, result)
+    return ToolResponse(result=result)
+
+
+# --------------------------------------------------------------------------- #
+# Batch jobs: JSONL in, results to results.jsonl, GET /jobs/{id}/results and
+# an optional callback URL. Generations queue as "batch" behind interactive
+# /http traffic.
+# --------------------------------------------------------------------------- #
+async def process_job_item(item: dict, job: Job) -> dict:
+    profile = profiles.select(item.get("profile") or job.params.get("profile"))
+    try:
+        checked = prompt_limit.apply(item["prompt"], profile.params.get("max_new_tokens", 0))
+    except PromptTooLong as exc:
+        return {"error": f"PromptTooLong: {exc}"}    # final: not retried
+    key = cache_key(profile.tag, checked.prompt)
+    cached = cache.get(key)
+    if cached is not None:
+        return {"result": cached, "cached": True}
+    model = get_model()
+    if model is None:
+        raise RuntimeError("Watsonx model unavailable")
+    while True:
+        try:
+            # the budget starts at the slot: batch items may queue behind interactive traffic
+            result, usage, seconds = await generate(
+                model, checked.prompt, profile, job.params["tenant"], job.params["priority"],
+                threading.Event(), budget=REQUEST_TIMEOUT_SECONDS)
+            break
+        except (QueueFull, SlotsBusy):
+            await asyncio.sleep(1)    # jobs wait for capacity instead of failing
+    profile.observe(seconds, usage["generated_tokens"])
+    usage_ledger.record(model.model_id, job.params["tenant"], profile.name, usage, seconds)
+    prompt_limit.observe(checked, usage["input_tokens"])
+    cache.set(key, result)
+    return {"result": result, "usage": usage}
+
+
+def _check_item(item: dict) -> None:
+    profile = item.get("profile")
+    if profile and not isinstance(profile, str):
+        raise InvalidJob('"profile" must be a string')
+    if profile:
+        profiles.select(profile)      # UnknownProfile is a ValueError
+
+
+def _check_callback(url: str) -> None:
+    if not JOBS_CALLBACK_HOSTS:
+        raise InvalidJob("callback_url is disabled: no JOBS_CALLBACK_HOSTS configured")
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or (parts.hostname or "") not in JOBS_CALLBACK_HOSTS:
+        raise InvalidJob(f"callback_url must be http(s) to one of: {', '.join(sorted(JOBS_CALLBACK_HOSTS))}")
+
+
+def _job_or_404(job_id: str) -> Job:
+    try:
+        return job_store.load(job_id)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job '{job_id}' not found.")
+
+
+@app.post("/jobs", status_code=status.HTTP_202_ACCEPTED, summary="Submit a batch job")
+async def submit_job(request: Request, concurrency: int = JOBS_CONCURRENCY,
+                     profile: Optional[str] = None, priority: Optional[str] = None,
+                     tenant: str = "batch", callback_url: Optional[str] = None) -> dict:
+    """
+    The body is JSONL: one ``{"prompt": ..., "id": ..., "profile": ...}``
+    object per line (``id`` and ``profile`` are optional). Returns the job id
+    at once; the work happens in the background.
+    """
+    body = await request.body()
+    if len(body) > JOBS_MAX_MB * 1024 * 1024:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Jobs are limited to {JOBS_MAX_MB:g} MB")
+    try:
+        if callback_url:
+            _check_callback(callback_url)
+        if profile:
+            profiles.select(profile)
+        default_priority = "batch" if "batch" in scheduler.classes else scheduler.classes[-1]
+        priority = scheduler.priority(priority or default_priority)
+        job = job_store.create(body, {
+            "concurrency": max(1, min(concurrency, JOBS_MAX_CONCURRENCY)),
+            "profile": profile, "priority": priority, "tenant": scheduler.tenant(tenant),
+            "callback_url": callback_url,
+        }, check=_check_item)
+    except (InvalidJob, UnknownProfile, UnknownPriority, UnicodeDecodeError) as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    request.app.state.jobs.submit(job)
+    logger.info("Batch job %s accepted: %d items", job.id, job.total)
+    return {"id": job.id, "total": job.total, "status": job.status,
+            "status_url": f"/jobs/{job.id}", "results_url": f"/jobs/{job.id}/results"}
+
+
+@app.get("/jobs", summary="List batch jobs")
+async def list_jobs() -> list[dict]:
+    return [asdict(job) for job in job_store.list()]
+
+
+@app.get("/jobs/{job_id}", summary="Batch job status and throughput")
+async def get_job(job_id: str) -> dict:
+    return asdict(_job_or_404(job_id))
+
+
+@app.get("/jobs/{job_id}/results", summary="Stream batch job results (JSONL)")
+async def get_job_results(job_id: str, offset: int = 0, follow: bool = False) -> StreamingResponse:
+    """
+    Result lines from ``offset`` on. With ``follow=true`` the response stays
+    open and new results are sent as they are written, until the job ends.
+    """
+    _job_or_404(job_id)
+    path = job_store.results_path(job_id)
+
+    async def lines():
+        position, seen = 0, 0
+        while True:
+            finished = job_store.load(job_id).status in FINISHED
+            if path.exists():
+                with path.open("rb") as fh:
+                    fh.seek(position)
+                    for line in fh:
+                        if not line.endswith(b"\n"):
+                            break            # still being written
+                        position += len(line)
+                        seen += 1
+                        if seen > offset:
+                            yield line
+            if finished or not follow or drain.draining:
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.delete("/jobs/{job_id}", summary="Cancel a batch job")
+async def cancel_job(job_id: str, request: Request) -> dict:
+    """In-flight items finish; the rest are skipped. Results so far are kept."""
+    _job_or_404(job_id)
+    return asdict(request.app.state.jobs.cancel(job_id))
+
 
 # --------------------------------------------------------------------------- #
 # Entry-point
@@ -174,5 +707,6 @@ async def call_tool(
 if __name__ == "__main__":  # pragma: no cover
     import uvicorn
 
-    logger.info("Starting Watsonx Chat Agent at http://0.0.0.0:8082")
-    uvicorn.run("main:app", host="0.0.0.0", port=8082, log_level="info")
+    logger.info("Starting Watsonx Chat Agent at http://0.0.0.0:8082 (%d worker(s))", WORKERS)
+    uvicorn.run("main:app", host="0.0.0.0", port=8082, log_level="info", workers=WORKERS,
+                timeout_graceful_shutdown=CLOSE_SECONDS)
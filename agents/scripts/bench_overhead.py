@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+bench_overhead.py
+
+Per-hop latency baseline with the no-op agents: the Go time server
+(agents/go_time_server, REST) and the hello-world agent
+(agents/hello_world/hello_server_sse.py, MCP over SSE). Their tools do no
+work, so every millisecond measured is overhead, not model time.
+
+Each target is called at every layer, at rising concurrency, and the hops
+are derived from the differences between layers (medians):
+
+    hello-sse  runtime    in-process FastMCP call_tool("echo")
+               transport  MCP session over SSE, straight to the agent  − runtime
+               gateway    gateway /rpc                                  − direct
+    go-time    transport  HTTP round trip the Go mux answers with 404
+               runtime    POST /http get_system_time                    − transport
+               gateway    gateway /rpc                                  − direct
+    frontend              ui.py /call                                   − the same /rpc call
+    model                 /rpc of a model tool                          − hello-sse /rpc
+
+The frontend and model rows are optional (--frontend-url, --model-method).
+At high concurrency the differences also include queueing, which is the point:
+they show which hop saturates first.
+
+Usage:
+    python agents/scripts/bench_overhead.py --start --register
+    python agents/scripts/bench_overhead.py --concurrency 1 8 32 128 --requests 400
+    python agents/scripts/bench_overhead.py --model-method watsonx-agent-chat \\
+           --model-params '{"query": "What is the capital of Italy?"}'
+    python agents/scripts/bench_overhead.py --frontend-url http://localhost:8000 \\
+           --frontend-agent watsonx-agent --json overhead.json
+
+Environment: GATEWAY_URL, ADMIN_TOKEN, BASIC_AUTH_USER, JWT_SECRET_KEY (as
+register_agents.py), HELLO_PORT (6274), GO_TIME_PORT (8081).
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from contextlib import AsyncExitStack
+from pathlib import Path
+
+import httpx
+from mcp.client.session import ClientSession
+from mcp.client.sse import sse_client
+
+HERE = Path(__file__).resolve().parent
+AGENTS_DIR = HERE.parent
+sys.path.insert(0, str(AGENTS_DIR.parent))
+sys.path.insert(0, str(HERE))
+import register_agents  # noqa: E402 – same gateway settings and JWT minting
+from common.timeseries import percentile  # noqa: E402
+
+HELLO_PORT = int(os.getenv('HELLO_PORT', '6274'))
+GO_PORT = int(os.getenv('GO_TIME_PORT', '8081'))
+HELLO_GATEWAY = 'hello-world-sse'
+GO_TOOL = 'go-time-server'
+
+
+def manifest(go_url: str, hello_url: str) -> dict:
+    return {
+        'gateways': [{'name': HELLO_GATEWAY, 'url': hello_url, 'transport': 'SSE',
+                      'description': 'Hello-world agent over SSE (overhead baseline)'}],
+        'tools': [{'name': GO_TOOL, 'url': go_url, 'integration_type': 'REST',
+                   'request_type': 'POST',
+                   'description': 'Go time server (overhead baseline)',
+                   'input_schema': {'type': 'object',
+                                    'properties': {'tool': {'type': 'string'}, 'args': {}},
+                                    'required': ['tool']}}],
+    }
+
+
+def wait_for_port(port: int, proc: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'{proc.args} exited with {proc.returncode}')
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f'nothing listening on port {port} after {timeout:.0f}s')
+
+
+def start_agents() -> list[subprocess.Popen]:
+    procs = [
+        subprocess.Popen([sys.executable, 'hello_server_sse.py'], cwd=AGENTS_DIR / 'hello_world',
+                         env={**os.environ, 'PORT': str(HELLO_PORT)},
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True),
+        # own process group: `go run` leaves the compiled server as a child
+        subprocess.Popen(['go', 'run', '.'], cwd=AGENTS_DIR / 'go_time_server',
+                         env={**os.environ, 'PORT': str(GO_PORT)},
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True),
+    ]
+    try:
+        wait_for_port(HELLO_PORT, procs[0])
+        wait_for_port(GO_PORT, procs[1])
+    except RuntimeError:
+        stop_agents(procs)
+        raise
+    return procs
+
+
+def stop_agents(procs: list[subprocess.Popen]) -> None:
+    for proc in procs:
+        if proc.poll() is None:
+            os.killpg(proc.pid, signal.SIGTERM)
+
+
+def load_hello_module():
+    """hello_server_sse.py, imported without running it, for in-process calls."""
+    path = AGENTS_DIR / 'hello_world' / 'hello_server_sse.py'
+    spec = importlib.util.spec_from_file_location('hello_server_sse', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def measure(call, workers: list, requests: int, warmup: int = 5) -> dict:
+    """Run ``requests`` calls spread over ``len(workers)`` concurrent loops."""
+    for _ in range(warmup):
+        await call(workers[0])
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async def loop(worker) -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                ok = await call(worker)
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+
+    wall = time.perf_counter()
+    await asyncio.gather(*(loop(w) for w in workers))
+    wall = time.perf_counter() - wall
+    latencies.sort()
+    return {'requests': requests, 'errors': errors,
+            'p50_ms': percentile(latencies, 50), 'p95_ms': percentile(latencies, 95),
+            'rps': len(latencies) / wall if wall else 0.0}
+
+
+def rpc_call(client: httpx.AsyncClient, method: str, params: dict):
+    body = {'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params}
+
+    async def call(_worker) -> bool:
+        resp = await client.post('/rpc', json=body)
+        return resp.status_code == 200 and 'error' not in resp.json()
+    return call
+
+
+async def run(opts) -> list[dict]:
+    rows: list[dict] = []
+    hello = load_hello_module()
+    logging.getLogger().setLevel(logging.WARNING)   # the agent's basicConfig would log every call
+    headers = {'Authorization': f'Bearer {register_agents.mint_token()}'}
+    top = max(opts.concurrency)
+    limits = httpx.Limits(max_connections=top, max_keepalive_connections=top)
+    go_url = f'http://127.0.0.1:{GO_PORT}'
+    hello_method = f'{HELLO_GATEWAY}-echo'
+
+    async with httpx.AsyncClient(base_url=register_agents.GATEWAY_URL, headers=headers,
+                                 limits=limits, timeout=60) as gateway, \
+            httpx.AsyncClient(base_url=go_url, limits=limits, timeout=60) as go, \
+            httpx.AsyncClient(base_url=opts.frontend_url or 'http://unused',
+                              limits=limits, timeout=120) as frontend:
+
+        async def go_floor(_w) -> bool:
+            return (await go.get('/__baseline_404')).status_code == 404
+
+        async def go_direct(_w) -> bool:
+            resp = await go.post('/http', json={'tool': 'get_system_time', 'args': None})
+            return resp.status_code == 200
+
+        async def hello_runtime(_w) -> bool:
+            await hello.mcp.call_tool('echo', {'text': 'ping'})
+            return True
+
+        async def hello_direct(session: ClientSession) -> bool:
+            return not (await session.call_tool('echo', {'text': 'ping'})).isError
+
+        async def frontend_call(_w) -> bool:
+            resp = await frontend.post('/call', json={'tool': opts.frontend_agent,
+                                                      'args': {'prompt': 'ping'}})
+            return resp.status_code == 200
+
+        layers = [
+            ('go-time', 'transport', go_floor, False),
+            ('go-time', 'direct', go_direct, False),
+            ('go-time', 'rpc', rpc_call(gateway, opts.go_method,
+                                        {'tool': 'get_system_time', 'args': None}), False),
+            ('hello-sse', 'runtime', hello_runtime, False),
+            ('hello-sse', 'direct', hello_direct, True),
+            ('hello-sse', 'rpc', rpc_call(gateway, hello_method, {'text': 'ping'}), False),
+        ]
+        if opts.frontend_url:
+            layers += [
+                ('frontend', 'rpc', rpc_call(gateway, f'{opts.frontend_agent}/chat',
+                                             {'query': 'ping'}), False),
+                ('frontend', 'ui', frontend_call, False),
+            ]
+        if opts.model_method:
+            layers.append(('model', 'rpc', rpc_call(gateway, opts.model_method,
+                                                    json.loads(opts.model_params)), False))
+
+        for level in opts.concurrency:
+            print(f'▶ concurrency {level}')
+            async with AsyncExitStack() as stack:
+                sessions = []
+                for _ in range(level):   # one MCP session per concurrent caller
+                    streams = await stack.enter_async_context(
+                        sse_client(f'http://127.0.0.1:{HELLO_PORT}/sse'))
+                    session = await stack.enter_async_context(ClientSession(*streams))
+                    await session.initialize()
+                    sessions.append(session)
+                for target, layer, call, per_session in layers:
+                    workers = sessions if per_session else [None] * level
+                    requests = max(opts.requests, level)
+                    if target == 'model':
+                        requests = max(opts.model_requests, level)
+                    result = await measure(call, workers, requests)
+                    rows.append({'target': target, 'layer': layer, 'concurrency': level, **result})
+                    print(f"  {target:<10} {layer:<10} p50 {result['p50_ms']:8.2f} ms  "
+                          f"p95 {result['p95_ms']:8.2f} ms  {result['rps']:8.0f} rps"
+                          f"  errors {result['errors']}")
+    return rows
+
+
+def breakdown(rows: list[dict]) -> list[dict]:
+    """Per-hop overhead (p50 differences) for every concurrency level."""
+    out = []
+    for level in sorted({r['concurrency'] for r in rows}):
+        p50 = {(r['target'], r['layer']): r['p50_ms'] for r in rows if r['concurrency'] == level}
+        hops = {
+            'go transport': p50[('go-time', 'transport')],
+            'go runtime': p50[('go-time', 'direct')] - p50[('go-time', 'transport')],
+            'go gateway': p50[('go-time', 'rpc')] - p50[('go-time', 'direct')],
+            'python runtime': p50[('hello-sse', 'runtime')],
+            'sse transport': p50[('hello-sse', 'direct')] - p50[('hello-sse', 'runtime')],
+            'sse gateway': p50[('hello-sse', 'rpc')] - p50[('hello-sse', 'direct')],
+        }
+        if ('frontend', 'ui') in p50:
+            hops['frontend'] = p50[('frontend', 'ui')] - p50[('frontend', 'rpc')]
+        if ('model', 'rpc') in p50:
+            hops['model'] = p50[('model', 'rpc')] - p50[('hello-sse', 'rpc')]
+        out.append({'concurrency': level, 'hops_ms': hops})
+    return out
+
+
+def print_breakdown(table: list[dict]) -> None:
+    names = list(table[0]['hops_ms'])
+    print(f"\n{'p50 ms per hop':<16}" + ''.join(f'{n:>16}' for n in names))
+    for row in table:
+        print(f"{'c=' + str(row['concurrency']):<16}"
+              + ''.join(f"{row['hops_ms'][n]:>16.2f}" for n in names))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-hop latency baseline with no-op agents')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--requests', type=int, default=200, help='calls per layer and level')
+    parser.add_argument('--start', action='store_true',
+                        help='start hello_server_sse.py and the Go time server (go run)')
+    parser.add_argument('--register', action='store_true',
+                        help='register both agents in the gateway first')
+    parser.add_argument('--go-method', default=GO_TOOL, help='gateway name of the Go tool')
+    parser.add_argument('--frontend-url', help='also measure ui.py /call (e.g. http://localhost:8000)')
+    parser.add_argument('--frontend-agent', default=HELLO_GATEWAY,
+                        help='agent for the frontend row; ui.py calls <agent>/chat with "query"')
+    parser.add_argument('--model-method', help='a model tool, e.g. watsonx-agent-chat')
+    parser.add_argument('--model-params', default='{"query": "What is the capital of Italy?"}')
+    parser.add_argument('--model-requests', type=int, default=20)
+    parser.add_argument('--json', type=Path, help='also write raw rows and the breakdown here')
+    opts = parser.parse_args()
+
+    procs = start_agents() if opts.start else []
+    try:
+        if opts.register:
+            report = asyncio.run(register_agents.run(
+                manifest(f'http://127.0.0.1:{GO_PORT}/http', f'http://127.0.0.1:{HELLO_PORT}/sse'),
+                concurrency=4, dry_run=False, prune=False))
+            register_agents.print_report(report, 0.0, False)
+        rows = asyncio.run(run(opts))
+    finally:
+        stop_agents(procs)
+    table = breakdown(rows)
+    print_breakdown(table)
+    if opts.json:
+        opts.json.write_text(json.dumps({'rows': rows, 'breakdown': table}, indent=2))
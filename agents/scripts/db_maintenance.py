@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+db_maintenance.py
+
+Maintenance and tuning for the MCP Gateway SQLite database (mcp.db), on the
+same SQLAlchemy engine as clear_db.py.
+
+Commands:
+    report   table sizes, pragmas and query plans for the gateway's hot lookups
+    tune     switch to WAL and incremental auto-vacuum (persistent settings)
+    index    create indexes the hot lookups are missing
+    vacuum   incremental VACUUM, ANALYZE / PRAGMA optimize, WAL checkpoint
+    prune    delete metric rows older than --days in small batches
+    all      tune, index, prune, vacuum, then report
+
+Usage:
+    python agents/scripts/db_maintenance.py report
+    MCP_DB_PATH=/data/mcp.db python agents/scripts/db_maintenance.py prune --days 14
+    python agents/scripts/db_maintenance.py all --days 30 --batch 2000
+
+Only tables and columns that exist are touched, so it works across gateway
+versions. Per-connection pragmas (synchronous, busy_timeout, cache_size)
+cannot be stored in the file. The gateway has to set them itself, so
+`report` only prints recommended values for them.
+"""
+import argparse
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine, inspect, text
+
+# Path to your MCP Gateway SQLite database file
+DB_PATH = os.getenv('MCP_DB_PATH', 'mcp.db')
+
+# Lookups the gateway runs on every RPC, discovery or admin page load.
+# (label, required table, SQL with an optional :v parameter)
+HOT_QUERIES = [
+    ('tool by name', 'tools', 'SELECT * FROM tools WHERE name = :v'),
+    ('tools of a gateway', 'tools', 'SELECT * FROM tools WHERE gateway_id = :v'),
+    ('active tools', 'tools', 'SELECT * FROM tools WHERE is_active = 1'),
+    ('resource by uri', 'resources', 'SELECT * FROM resources WHERE uri = :v'),
+    ('gateway by url', 'gateways', 'SELECT * FROM gateways WHERE url = :v'),
+    ('server tools', 'server_tool_association',
+     'SELECT * FROM server_tool_association WHERE server_id = :v'),
+    ('tool metrics', 'tool_metrics',
+     'SELECT * FROM tool_metrics WHERE tool_id = :v ORDER BY timestamp DESC'),
+    ('resource metrics', 'resource_metrics',
+     'SELECT * FROM resource_metrics WHERE resource_id = :v ORDER BY timestamp DESC'),
+    ('server metrics', 'server_metrics',
+     'SELECT * FROM server_metrics WHERE server_id = :v ORDER BY timestamp DESC'),
+    ('prompt metrics', 'prompt_metrics',
+     'SELECT * FROM prompt_metrics WHERE prompt_id = :v ORDER BY timestamp DESC'),
+]
+
+# Indexes backing HOT_QUERIES and pruning: table → column lists
+WANTED_INDEXES = {
+    'tools': [['name'], ['gateway_id'], ['is_active']],
+    'resources': [['uri']],
+    'gateways': [['url']],
+    'server_tool_association': [['server_id'], ['tool_id']],
+    'server_resource_association': [['server_id']],
+    'server_prompt_association': [['server_id']],
+    'tool_metrics': [['tool_id', 'timestamp'], ['timestamp']],
+    'resource_metrics': [['resource_id', 'timestamp'], ['timestamp']],
+    'server_metrics': [['server_id', 'timestamp'], ['timestamp']],
+    'prompt_metrics': [['prompt_id', 'timestamp'], ['timestamp']],
+}
+
+RECOMMENDED_CONNECTION_PRAGMAS = {
+    'synchronous': 'NORMAL (1)  – safe with WAL, avoids an fsync per commit',
+    'busy_timeout': '5000       – wait for the writer instead of failing',
+    'cache_size': '-65536     – 64 MiB page cache',
+    'temp_store': 'MEMORY (2)',
+}
+
+
+def get_engine(db_path: str):
+    return create_engine(f"sqlite:///{db_path}", isolation_level='AUTOCOMMIT')
+
+
+def pragma(conn, name: str):
+    return conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+
+
+def table_sizes(conn, tables: list[str]) -> list[tuple[str, int, int | None]]:
+    """(table, rows, bytes incl. indexes). Bytes need the dbstat virtual table."""
+    try:
+        sizes = dict(conn.exec_driver_sql(
+            'SELECT tbl_name, SUM(pgsize) FROM dbstat '
+            'JOIN sqlite_master ON dbstat.name = sqlite_master.name GROUP BY tbl_name'
+        ).all())
+    except Exception:  # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+        sizes = {}
+    rows = []
+    for table in tables:
+        count = conn.exec_driver_sql(f'SELECT COUNT(*) FROM "{table}"').scalar()
+        rows.append((table, count, sizes.get(table)))
+    return sorted(rows, key=lambda r: (r[2] or 0, r[1]), reverse=True)
+
+
+def report(engine) -> None:
+    tables = inspect(engine).get_table_names()
+    with engine.connect() as conn:
+        page_size = pragma(conn, 'page_size')
+        pages = pragma(conn, 'page_count')
+        free = pragma(conn, 'freelist_count')
+        print(f"📦 {DB_PATH}: {pages * page_size / 1e6:.1f} MB "
+              f"({free * page_size / 1e6:.1f} MB free pages)")
+        wal = f"{DB_PATH}-wal"
+        if os.path.exists(wal):
+            print(f"   WAL file: {os.path.getsize(wal) / 1e6:.1f} MB")
+
+        print(f"\n{'table':<32}{'rows':>10}{'MB':>10}")
+        for table, count, size in table_sizes(conn, tables):
+            mb = f"{size / 1e6:.2f}" if size is not None else '–'
+            print(f"{table:<32}{count:>10}{mb:>10}")
+
+        print('\n⚙️  pragmas (stored in the file)')
+        auto_vacuum = {0: 'NONE', 1: 'FULL', 2: 'INCREMENTAL'}
+        print(f"   journal_mode  {pragma(conn, 'journal_mode')}")
+        print(f"   auto_vacuum   {auto_vacuum.get(pragma(conn, 'auto_vacuum'))}")
+        print('   per-connection, set these in the gateway engine:')
+        for name, value in RECOMMENDED_CONNECTION_PRAGMAS.items():
+            print(f"   {name:<13} now {pragma(conn, name)!s:<8} recommended {value}")
+
+        print('\n🔍 query plans')
+        for label, table, sql in HOT_QUERIES:
+            if table not in tables:
+                continue
+            try:
+                params = (1,) if ':v' in sql else ()
+                plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql.replace(":v", "?")}',
+                                            params).all()
+            except Exception as e:  # column missing in this gateway version
+                print(f"   –  {label:<20} n/a ({e.__class__.__name__})")
+                continue
+            detail = '; '.join(row[-1] for row in plan)
+            flag = '⚠️ ' if detail.startswith('SCAN') or 'TEMP B-TREE' in detail else '✅'
+            print(f"   {flag} {label:<20} {detail}")
+
+
+def tune(engine) -> None:
+    with engine.connect() as conn:
+        mode = pragma(conn, 'journal_mode=WAL')
+        print(f"journal_mode → {mode}")
+        if pragma(conn, 'auto_vacuum') != 2:
+            # Takes effect only after a full VACUUM, which rewrites the file once
+            print('auto_vacuum → INCREMENTAL (one-off full VACUUM, locks the database)')
+            conn.exec_driver_sql('PRAGMA auto_vacuum=INCREMENTAL')
+            start = time.perf_counter()
+            conn.exec_driver_sql('VACUUM')
+            print(f"   done in {time.perf_counter() - start:.1f}s")
+        else:
+            print('auto_vacuum already INCREMENTAL')
+
+
+def missing_indexes(engine) -> list[tuple[str, list[str]]]:
+    insp = inspect(engine)
+    tables = set(insp.get_table_names())
+    missing = []
+    for table, wanted in WANTED_INDEXES.items():
+        if table not in tables:
+            continue
+        columns = {c['name'] for c in insp.get_columns(table)}
+        covered = [ix['column_names'] for ix in insp.get_indexes(table)]
+        covered += [uc['column_names'] for uc in insp.get_unique_constraints(table)]
+        pk = insp.get_pk_constraint(table).get('constrained_columns') or []
+        if pk:
+            covered.append(pk)
+        for cols in wanted:
+            if not set(cols) <= columns:
+                continue
+            # An existing index whose leading columns match serves the lookup too
+            if any(existing[:len(cols)] == cols for existing in covered):
+                continue
+            missing.append((table, cols))
+    return missing
+
+
+def add_indexes(engine) -> None:
+    missing = missing_indexes(engine)
+    if not missing:
+        print('All hot lookups are indexed.')
+        return
+    with engine.connect() as conn:
+        for table, cols in missing:
+            name = f"ix_{table}_{'_'.join(cols)}"
+            start = time.perf_counter()
+            conn.exec_driver_sql(
+                f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({", ".join(cols)})'
+            )
+            print(f"created {name} in {time.perf_counter() - start:.2f}s")
+
+
+def vacuum(engine, pages: int) -> None:
+    with engine.connect() as conn:
+        free = pragma(conn, 'freelist_count')
+        if pragma(conn, 'auto_vacuum') == 2:
+            # a single step frees one page; executescript runs the pragma to the end
+            conn.connection.driver_connection.executescript(
+                f'PRAGMA incremental_vacuum({pages});' if pages else 'PRAGMA incremental_vacuum;'
+            )
+            print(f"incremental_vacuum: {free - pragma(conn, 'freelist_count')} pages returned")
+        else:
+            print(f"auto_vacuum is not INCREMENTAL ({free} free pages kept); run `tune` once")
+        start = time.perf_counter()
+        # optimize runs ANALYZE only where statistics are stale or missing
+        conn.exec_driver_sql('PRAGMA analysis_limit=1000')
+        conn.exec_driver_sql('PRAGMA optimize=0x10002')
+        print(f"optimize/ANALYZE in {time.perf_counter() - start:.2f}s")
+        busy, log, done = conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)').one()
+        if pragma(conn, 'journal_mode') == 'wal':
+            print(f"wal_checkpoint: {done}/{log} frames{' (busy)' if busy else ''}")
+
+
+def prune(engine, days: float, batch: int, pause: float) -> None:
+    """
+    Delete metric rows older than ``days``. Each batch is its own short
+    transaction, and the pause between batches lets the gateway's writes
+    through, so the write lock is never held for long.
+    """
+    insp = inspect(engine)
+    targets = [
+        t for t in insp.get_table_names()
+        if t.endswith('_metrics') and 'timestamp' in {c['name'] for c in insp.get_columns(t)}
+    ]
+    cutoff = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - days * 86400))
+    delete = ('DELETE FROM "{t}" WHERE rowid IN '
+              '(SELECT rowid FROM "{t}" WHERE timestamp < :cutoff LIMIT :batch)')
+    with engine.connect() as conn:
+        for table in targets:
+            stmt = text(delete.format(t=table))
+            total, longest, start = 0, 0.0, time.perf_counter()
+            while True:
+                t0 = time.perf_counter()
+                # autocommit: every batch is its own transaction
+                deleted = conn.execute(stmt, {'cutoff': cutoff, 'batch': batch}).rowcount
+                longest = max(longest, time.perf_counter() - t0)
+                total += deleted
+                if deleted < batch:
+                    break
+                time.sleep(pause)
+            print(f"{table}: deleted {total} rows older than {cutoff} UTC in "
+                  f"{time.perf_counter() - start:.1f}s (longest lock {longest * 1000:.0f} ms)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MCP Gateway SQLite maintenance')
+    parser.add_argument('command', choices=['report', 'tune', 'index', 'vacuum', 'prune', 'all'])
+    parser.add_argument('--days', type=float, default=30, help='prune: keep this many days')
+    parser.add_argument('--batch', type=int, default=1000, help='prune: rows per transaction')
+    parser.add_argument('--pause', type=float, default=0.05,
+                        help='prune: seconds between batches')
+    parser.add_argument('--pages', type=int, default=0,
+                        help='vacuum: max pages to free (0 = all)')
+    args = parser.parse_args()
+
+    if not os.path.isfile(DB_PATH):
+        print(f"Database file '{DB_PATH}' does not exist.")
+        sys.exit(1)
+
+    engine = get_engine(DB_PATH)
+    if args.command in ('tune', 'all'):
+        tune(engine)
+    if args.command in ('index', 'all'):
+        add_indexes(engine)
+    if args.command in ('prune', 'all'):
+        prune(engine, args.days, args.batch, args.pause)
+    if args.command in ('vacuum', 'all'):
+        vacuum(engine, args.pages)
+    if args.command in ('report', 'all'):
+        report(engine)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+register_agents.py
+
+Declarative, concurrent registration of agents in the MCP Gateway.
+
+Reads a manifest of federated agents (gateways), REST tools, resources and
+virtual servers, diffs it against what the gateway already has, and
+applies only the differences. Every request goes through one pooled,
+authenticated HTTP client, so it mints a single JWT per run instead of one
+per script. Running the same manifest twice changes nothing the second
+time.
+
+Usage:
+    python agents/scripts/register_agents.py agents/scripts/agents.example.json
+    python agents/scripts/register_agents.py manifest.yaml --dry-run
+    python agents/scripts/register_agents.py manifest.json --prune --concurrency 32
+
+Manifest (JSON, or YAML when PyYAML is installed):
+    {
+      "gateways":  [{"name": ..., "url": ..., "transport": "SSE", ...}],
+      "tools":     [{"name": ..., "url": ..., "integration_type": "REST", ...}],
+      "resources": [{"uri": ..., "name": ..., "content_file": "path.py", ...}],
+      "servers":   [{"name": ..., "associated_tools": ["tool-name", ...],
+                     "associated_resources": ["resource-uri", ...], ...}]
+    }
+
+Environment: GATEWAY_URL (http://localhost:4444), ADMIN_TOKEN (skip minting),
+BASIC_AUTH_USER, JWT_SECRET_KEY.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+GATEWAY_URL = os.getenv('GATEWAY_URL', 'http://localhost:4444')
+BASIC_AUTH_USER = os.getenv('BASIC_AUTH_USER', 'admin')
+JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'my-test-key')
+
+# kind → (collection path, identity field). Applied in this order because
+# servers reference tools and resources that gateways and /tools create.
+KINDS = {
+    'gateways':  ('/gateways', 'name'),
+    'tools':     ('/tools', 'name'),
+    'resources': ('/resources', 'uri'),
+    'servers':   ('/servers', 'name'),
+}
+STAGES = [['gateways'], ['tools', 'resources'], ['servers']]
+
+
+def mint_token() -> str:
+    """One admin JWT for the whole run (same utility the shell scripts use)."""
+    if os.getenv('ADMIN_TOKEN'):
+        return os.environ['ADMIN_TOKEN']
+    cmd = [sys.executable, '-m', 'mcpgateway.utils.create_jwt_token',
+           '--username', BASIC_AUTH_USER, '--secret', JWT_SECRET_KEY, '--exp', '30']
+    return subprocess.check_output(cmd, text=True).strip()
+
+
+def load_manifest(path: Path) -> dict:
+    text = path.read_text(encoding='utf-8')
+    if path.suffix in ('.yaml', '.yml'):
+        import yaml  # optional dependency, only for YAML manifests
+        manifest = yaml.safe_load(text)
+    else:
+        manifest = json.loads(text)
+    for resource in manifest.get('resources', []):
+        content_file = resource.pop('content_file', None)
+        if content_file:
+            resource['content'] = (path.parent / content_file).read_text(encoding='utf-8')
+    return manifest
+
+
+def _camel(name: str) -> str:
+    head, *rest = name.split('_')
+    return head + ''.join(word.title() for word in rest)
+
+
+def _normalise(value):
+    if isinstance(value, list):
+        return sorted(map(str, value))
+    return value
+
+
+def differs(desired: dict, current: dict) -> list[str]:
+    """Manifest fields whose value differs from the gateway's copy."""
+    changed = []
+    for key, want in desired.items():
+        have = current.get(key, current.get(_camel(key)))
+        if _normalise(want) != _normalise(have):
+            changed.append(key)
+    return changed
+
+
+class Registrar:
+    def __init__(self, client: httpx.AsyncClient, concurrency: int, dry_run: bool):
+        self.client = client
+        self.limit = asyncio.Semaphore(concurrency)
+        self.dry_run = dry_run
+        self.report: list[dict] = []
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        async with self.limit:
+            resp = await self.client.request(method, url, **kwargs)
+        resp.raise_for_status()
+        return resp
+
+    async def fetch(self, kind: str) -> dict[str, dict]:
+        path, key = KINDS[kind]
+        params = {'include_inactive': 'true'} if kind in ('gateways', 'servers', 'tools') else None
+        items = (await self._request('GET', path, params=params)).json()
+        if isinstance(items, dict):  # some versions wrap lists: {"servers": [...]}
+            items = next(iter(items.values()), [])
+        return {item[key]: item for item in items}
+
+    async def _apply(self, kind: str, action: str, name: str, method: str, url: str,
+                     body: dict | None = None, fields: list[str] | None = None) -> None:
+        entry = {'kind': kind, 'name': name, 'action': action, 'fields': fields or []}
+        start = time.perf_counter()
+        if not self.dry_run:
+            try:
+                await self._request(method, url, json=body)
+            except httpx.HTTPError as e:
+                detail = e.response.text if isinstance(e, httpx.HTTPStatusError) else str(e)
+                entry.update(action='failed', error=f'{action}: {detail}'[:300])
+        entry['ms'] = (time.perf_counter() - start) * 1000
+        self.report.append(entry)
+
+    async def sync(self, kind: str, desired: list[dict], current: dict[str, dict],
+                   prune: bool) -> None:
+        path, key = KINDS[kind]
+        jobs = []
+        for item in desired:
+            name = item[key]
+            existing = current.get(name)
+            if existing is None:
+                jobs.append(self._apply(kind, 'created', name, 'POST', path, item))
+                continue
+            ident = existing.get('id', name) if kind != 'resources' else name
+            fields = differs(item, existing)
+            if kind == 'resources' and 'content' in fields:
+                # list views omit content – compare against the full record
+                full = (await self._request('GET', f'{path}/{ident}')).json()
+                fields = differs(item, full if isinstance(full, dict) else {'content': full})
+            if fields:
+                jobs.append(self._apply(kind, 'updated', name, 'PUT', f'{path}/{ident}',
+                                        item, fields))
+            else:
+                self.report.append({'kind': kind, 'name': name, 'action': 'unchanged',
+                                    'fields': [], 'ms': 0.0})
+        if prune:
+            wanted = {item[key] for item in desired}
+            for name, existing in current.items():
+                if name not in wanted:
+                    ident = existing.get('id', name) if kind != 'resources' else name
+                    jobs.append(self._apply(kind, 'deleted', name, 'DELETE', f'{path}/{ident}'))
+        await asyncio.gather(*jobs)
+
+
+def resolve_references(servers: list[dict], tools: dict[str, dict],
+                       resources: dict[str, dict]) -> None:
+    """Servers may name tools and resource URIs; the gateway wants their ids."""
+    for server in servers:
+        for field, known in (('associated_tools', tools), ('associated_resources', resources)):
+            if field in server:
+                server[field] = [known[r]['id'] if r in known else r for r in server[field]]
+
+
+async def run(manifest: dict, concurrency: int, dry_run: bool, prune: bool) -> list[dict]:
+    headers = {'Authorization': f'Bearer {mint_token()}'}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=GATEWAY_URL, headers=headers,
+                                 limits=limits, timeout=30) as client:
+        registrar = Registrar(client, concurrency, dry_run)
+        for stage in STAGES:
+            kinds = [k for k in stage if k in manifest]
+            if not kinds:
+                continue
+            if 'servers' in kinds:
+                # tools discovered from gateways in earlier stages count too
+                tools, resources = await asyncio.gather(registrar.fetch('tools'),
+                                                        registrar.fetch('resources'))
+                resolve_references(manifest['servers'], tools, resources)
+            current = await asyncio.gather(*(registrar.fetch(k) for k in kinds))
+            await asyncio.gather(*(
+                registrar.sync(k, manifest[k], cur, prune) for k, cur in zip(kinds, current)
+            ))
+        return registrar.report
+
+
+def print_report(report: list[dict], elapsed: float, dry_run: bool) -> None:
+    for entry in sorted(report, key=lambda e: (list(KINDS).index(e['kind']), e['name'])):
+        extra = f" ({', '.join(entry['fields'])})" if entry['fields'] else ''
+        error = f" – {entry['error']}" if 'error' in entry else ''
+        print(f"{entry['action']:>9}  {entry['kind']:<9} {entry['name']}{extra}"
+              f"  [{entry['ms']:.0f} ms]{error}")
+    counts: dict[str, int] = {}
+    for entry in report:
+        counts[entry['action']] = counts.get(entry['action'], 0) + 1
+    summary = ', '.join(f'{n} {a}' for a, n in sorted(counts.items()))
+    print(f"\n{'[dry-run] ' if dry_run else ''}{summary or 'nothing to do'} in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sync a manifest of agents into the MCP Gateway')
+    parser.add_argument('manifest', type=Path)
+    parser.add_argument('--concurrency', type=int, default=16, help='parallel gateway requests')
+    parser.add_argument('--dry-run', action='store_true', help='show the plan, change nothing')
+    parser.add_argument('--prune', action='store_true',
+                        help='delete items of the listed kinds that are not in the manifest')
+    parser.add_argument('--json', type=Path, help='also write the report to this file')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    report = asyncio.run(run(load_manifest(args.manifest), args.concurrency,
+                             args.dry_run, args.prune))
+    elapsed = time.perf_counter() - started
+    print_report(report, elapsed, args.dry_run)
+    if args.json:
+        args.json.write_text(json.dumps({'elapsed_s': elapsed, 'changes': report}, indent=2))
+    sys.exit(1 if any(e['action'] == 'failed' for e in report) else 0)
@@ -0,0 +1,210 @@
+# bench/bench_daemon.py
+"""
+Measure what the shared model daemon saves: memory per agent and cache hits.
+
+The same set of AGENTS `server_stdio.py` processes (one per MCP session, as
+the gateway runs stdio agents) is started twice:
+
+• local  – each agent imports the watsonx SDK and holds its own
+  credentials, connection pool and reply cache;
+• daemon – each agent is a thin client of one `model_daemon.py`
+  (MODEL_DAEMON_SOCKET), which owns all of that.
+
+Both runs replay the same workload: REQUESTS chat calls spread round-robin
+over the agents, with prompts drawn from DISTINCT prompts with a Zipf
+distribution, so some prompts repeat, as real traffic does. The report gives:
+
+• PSS per agent and for the daemon. PSS shares the pages that processes
+  have in common, so adding up PSS gives the real total.
+• The cache hit rate. Local hits are counted from each agent's own log, and
+  daemon hits come from the daemon's stats.
+• Upstream generations, i.e. calls that actually reached watsonx.
+
+Run
+───
+
+python bench/bench_daemon.py                          # 4 agents, 200 calls
+python bench/bench_daemon.py --agents 8 --requests 500 --distinct 100 --json daemon.json
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import AsyncExitStack
+from pathlib import Path
+
+import anyio
+from mcp import StdioServerParameters
+from mcp.client.session import ClientSession
+from mcp.client.stdio import stdio_client
+
+from bench_transports import child_pids, percentile, rss_kb
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SERVER = PROJECT_ROOT / "server_stdio.py"
+DAEMON = PROJECT_ROOT / "model_daemon.py"
+# The reply cache is off by default; both modes run with it on
+CACHE_ON = {"CACHE_TTL_SECONDS": "3600"}
+
+sys.path.insert(0, str(PROJECT_ROOT.parents[1]))
+from common.model_client import DaemonError, daemon_request  # noqa: E402
+
+
+def pss_kb(pid: int) -> int:
+    """Proportional set size in KiB, or RSS on kernels without smaps_rollup."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return rss_kb(pid)
+
+
+def workload(requests: int, distinct: int, skew: float, seed: int) -> list[str]:
+    """Zipf-distributed prompts: prompt i is drawn with weight 1 / (i + 1) ** skew."""
+    rng = random.Random(seed)
+    prompts = [f"Benchmark question {i}: summarise topic {i} in one sentence."
+               for i in range(distinct)]
+    weights = [1 / (i + 1) ** skew for i in range(distinct)]
+    return rng.choices(prompts, weights, k=requests)
+
+
+def daemon_stats(path: str) -> dict:
+    return next(daemon_request(path, {"op": "stats"}, timeout=10))
+
+
+def start_daemon(path: str, timeout: float = 60.0) -> subprocess.Popen:
+    proc = subprocess.Popen([sys.executable, str(DAEMON)], cwd=PROJECT_ROOT,
+                            env={**os.environ, "MODEL_DAEMON_SOCKET": path, **CACHE_ON},
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"model_daemon.py exited with code {proc.returncode}")
+        try:
+            daemon_stats(path)
+            return proc
+        except DaemonError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"model daemon did not open {path} within {timeout:.0f}s")
+
+
+async def run_mode(mode: str, agents: int, prompts: list[str], tmp: Path) -> dict:
+    env = {**os.environ, **CACHE_ON}
+    env.pop("MODEL_DAEMON_SOCKET", None)
+    daemon = None
+    socket_path = str(tmp / "model.sock")
+    if mode == "daemon":
+        daemon = start_daemon(socket_path)
+        env["MODEL_DAEMON_SOCKET"] = socket_path
+        before = daemon_stats(socket_path)
+
+    logs = [tmp / f"{mode}-agent-{i}.log" for i in range(agents)]
+    latencies: list[float] = []
+    errors = 0
+    try:
+        async with AsyncExitStack() as stack:
+            sessions = []
+            for log_path in logs:
+                errlog = stack.enter_context(open(log_path, "w", encoding="utf-8"))
+                params = StdioServerParameters(command=sys.executable, args=[str(SERVER)],
+                                               env=env, cwd=str(PROJECT_ROOT))
+                streams = await stack.enter_async_context(stdio_client(params, errlog=errlog))
+                session = await stack.enter_async_context(ClientSession(*streams))
+                await session.initialize()
+                sessions.append(session)
+
+            async def drive(index: int, session: ClientSession) -> None:
+                nonlocal errors
+                for prompt in prompts[index::agents]:
+                    start = time.perf_counter()
+                    try:
+                        result = await session.call_tool("chat", {"query": prompt})
+                        errors += result.isError
+                    except Exception:
+                        errors += 1
+                        continue
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+            wall_start = time.perf_counter()
+            async with anyio.create_task_group() as tg:
+                for index, session in enumerate(sessions):
+                    tg.start_soon(drive, index, session)
+            wall_s = time.perf_counter() - wall_start
+
+            # measured after the workload, when caches and pools are populated
+            agent_pss = [pss_kb(pid) for pid in child_pids(SERVER)]
+            daemon_kb = pss_kb(daemon.pid) if daemon else 0
+            after = daemon_stats(socket_path) if daemon else None
+    finally:
+        if daemon:
+            daemon.terminate()
+            daemon.wait(timeout=10)
+
+    if after is not None:
+        hits = after["cache"]["hits"] - before["cache"]["hits"]
+        upstream = after["generations"] - before["generations"]
+    else:
+        hits = sum(p.read_text(encoding="utf-8").count("→ (cached)") for p in logs)
+        upstream = len(prompts) - hits - errors
+
+    latencies.sort()
+    per_agent_kb = sum(agent_pss) / max(len(agent_pss), 1)
+    return {
+        "mode": mode,
+        "agents": agents,
+        "requests": len(prompts),
+        "errors": errors,
+        "pss_per_agent_mb": per_agent_kb / 1024,
+        "daemon_pss_mb": daemon_kb / 1024,
+        "total_pss_mb": (sum(agent_pss) + daemon_kb) / 1024,
+        "cache_hit_rate": hits / len(prompts) if prompts else 0.0,
+        "upstream_calls": upstream,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "throughput_rps": len(latencies) / wall_s if wall_s else 0.0,
+    }
+
+
+def print_table(rows: list[dict]) -> None:
+    cols = ["agents", "requests", "pss_per_agent_mb", "daemon_pss_mb", "total_pss_mb",
+            "cache_hit_rate", "upstream_calls", "p50_ms", "p95_ms"]
+    print(f"\n{'mode':<8}" + "".join(f"{c:>18}" for c in cols))
+    for row in rows:
+        cells = [f"{row[c]:>18d}" if isinstance(row[c], int) else f"{row[c]:>18.2f}"
+                 for c in cols]
+        print(f"{row['mode']:<8}" + "".join(cells))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--agents", type=int, default=4, help="stdio agent processes")
+    parser.add_argument("--requests", type=int, default=200, help="chat calls in total")
+    parser.add_argument("--distinct", type=int, default=50, help="distinct prompts")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--modes", nargs="+", default=["local", "daemon"])
+    parser.add_argument("--json", help="also write results to this file")
+    opts = parser.parse_args()
+
+    prompts = workload(opts.requests, opts.distinct, opts.skew, opts.seed)
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench-daemon-") as tmp:
+        for mode in opts.modes:
+            print(f"▶ {mode}: {opts.agents} agents × {opts.requests // opts.agents} chat calls")
+            rows.append(await run_mode(mode, opts.agents, prompts, Path(tmp)))
+    print_table(rows)
+    if opts.json:
+        Path(opts.json).write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    anyio.run(main)
@@ -0,0 +1,200 @@
+# bench/bench_sessions.py
+"""
+How many idle and active MCP-over-SSE sessions one agent process holds.
+
+The script starts an SSE agent (`server_sse.py` by default, or any script
+with --server, e.g. ../hello_world/hello_server_sse.py) and opens sessions
+in steps. At each step it measures the server's RSS and open file
+descriptors per session, and the latency of tool calls made while the
+sessions are connected:
+
+• idle   – the sessions only connect and initialise; one probe session
+  calls the tool PROBES times, so the cost of idle sessions to an active
+  client shows up in its latency;
+• active – every session calls the tool CALLS times at once.
+
+A step fails when sessions cannot connect or calls error out; the table
+then shows where the process runs out (file descriptors, memory, event
+loop). The server runs with SSE_MAX_SESSIONS=0 and SSE_IDLE_SECONDS=0 so
+that no limit interferes; pass --max-sessions to see the 503 refusals
+instead. The open-file limit is raised to its hard maximum for both sides.
+
+Run
+───
+
+python bench/bench_sessions.py                                   # server_sse.py, chat
+python bench/bench_sessions.py --server ../hello_world/hello_server_sse.py \\
+       --tool echo --args '{"text": "hi"}' --idle 100 500 1000 2000 --active 50 200
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from contextlib import AsyncExitStack
+from pathlib import Path
+
+import anyio
+from mcp.client.session import ClientSession
+from mcp.client.sse import sse_client
+
+from bench_transports import HOST, free_port, percentile, rss_kb, wait_for_port
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SERVER = PROJECT_ROOT / "server_sse.py"
+
+
+def raise_nofile() -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def fd_count(pid: int) -> int:
+    return len(os.listdir(f"/proc/{pid}/fd"))
+
+
+async def open_sessions(stack: AsyncExitStack, port: int, count: int,
+                        sessions: list, parallel: int = 50) -> int:
+    """Open up to ``count`` more sessions, ``parallel`` at a time. Returns the failures."""
+    failures = 0
+    limiter = anyio.CapacityLimiter(parallel)
+
+    async def one() -> None:
+        nonlocal failures
+        async with limiter:
+            try:
+                streams = await stack.enter_async_context(sse_client(f"http://{HOST}:{port}/sse"))
+                session = await stack.enter_async_context(ClientSession(*streams))
+                with anyio.fail_after(30):
+                    await session.initialize()
+                sessions.append(session)
+            except Exception:
+                failures += 1
+
+    # entered one by one: the exit stack is not task-safe
+    for _ in range(count):
+        await one()
+    return failures
+
+
+async def call_many(sessions: list, calls: int, tool: str, args: dict) -> tuple[list[float], int, float]:
+    latencies: list[float] = []
+    errors = 0
+
+    async def drive(session: ClientSession) -> None:
+        nonlocal errors
+        for _ in range(calls):
+            start = time.perf_counter()
+            try:
+                with anyio.fail_after(120):
+                    result = await session.call_tool(tool, args)
+                if result.isError:
+                    errors += 1
+                    continue
+            except Exception:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    wall_start = time.perf_counter()
+    async with anyio.create_task_group() as tg:
+        for session in sessions:
+            tg.start_soon(drive, session)
+    latencies.sort()
+    return latencies, errors, time.perf_counter() - wall_start
+
+
+async def run_steps(opts, mode: str, steps: list[int]) -> list[dict]:
+    port = free_port()
+    env = {**os.environ, "MCP_TRANSPORT": "sse", "PORT": str(port), "HOST": HOST,
+           "SSE_MAX_SESSIONS": str(opts.max_sessions), "SSE_IDLE_SECONDS": "0"}
+    server = subprocess.Popen([sys.executable, str(opts.server)], env=env,
+                              cwd=opts.server.parent, preexec_fn=raise_nofile,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    rows = []
+    try:
+        wait_for_port(port)
+        base_kb, base_fds = rss_kb(server.pid), fd_count(server.pid)
+        async with AsyncExitStack() as stack:
+            sessions: list[ClientSession] = []
+            failures = 0
+            for target in steps:
+                print(f"▶ {mode}: {target} sessions")
+                connect_start = time.perf_counter()
+                failures += await open_sessions(stack, port, target - len(sessions) - failures,
+                                                sessions)
+                connect_s = time.perf_counter() - connect_start
+                open_now = len(sessions)
+                kb, fds = rss_kb(server.pid), fd_count(server.pid)
+                if mode == "idle":
+                    latencies, errors, wall_s = await call_many(sessions[:1], opts.probes,
+                                                                opts.tool, opts.args)
+                else:
+                    latencies, errors, wall_s = await call_many(sessions, opts.calls,
+                                                                opts.tool, opts.args)
+                rows.append({
+                    "mode": mode, "sessions": target, "open": open_now, "failed": failures,
+                    "connect_s": connect_s, "errors": errors,
+                    "p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95),
+                    "throughput_rps": len(latencies) / wall_s if wall_s else 0.0,
+                    "rss_mb": kb / 1024,
+                    "kb_per_session": (kb - base_kb) / max(open_now, 1),
+                    "fds_per_session": (fds - base_fds) / max(open_now, 1),
+                })
+                if failures or server.poll() is not None:
+                    break
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return rows
+
+
+def print_table(rows: list[dict]) -> None:
+    cols = ["open", "failed", "connect_s", "errors", "p50_ms", "p95_ms", "throughput_rps",
+            "rss_mb", "kb_per_session", "fds_per_session"]
+    print(f"\n{'mode':<8}{'sessions':>10}" + "".join(f"{c:>16}" for c in cols))
+    for row in rows:
+        cells = [f"{row[c]:>16d}" if isinstance(row[c], int) else f"{row[c]:>16.2f}"
+                 for c in cols]
+        print(f"{row['mode']:<8}{row['sessions']:>10}" + "".join(cells))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--server", type=Path, default=SERVER, help="SSE agent script")
+    parser.add_argument("--tool", default="chat")
+    parser.add_argument("--args", type=json.loads,
+                        default={"query": "What is the capital of Italy?"},
+                        help="tool arguments as JSON")
+    parser.add_argument("--idle", type=int, nargs="*", default=[100, 250, 500, 1000],
+                        help="idle session counts to step through")
+    parser.add_argument("--active", type=int, nargs="*", default=[10, 50, 100],
+                        help="active session counts to step through")
+    parser.add_argument("--probes", type=int, default=20, help="probe calls per idle step")
+    parser.add_argument("--calls", type=int, default=3, help="calls per active session")
+    parser.add_argument("--max-sessions", type=int, default=0,
+                        help="SSE_MAX_SESSIONS for the server (0 = no limit)")
+    parser.add_argument("--json", help="also write results to this file")
+    opts = parser.parse_args()
+    opts.server = opts.server.resolve()
+    raise_nofile()
+
+    rows = []
+    if opts.idle:
+        rows += await run_steps(opts, "idle", sorted(opts.idle))
+    if opts.active:
+        rows += await run_steps(opts, "active", sorted(opts.active))
+    print_table(rows)
+    if opts.json:
+        Path(opts.json).write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    anyio.run(main)
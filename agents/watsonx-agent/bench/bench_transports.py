@@ -0,0 +1,210 @@
+# bench/bench_transports.py
+"""
+Compare stdio, SSE and streamable-HTTP transports for the same `chat` workload.
+
+For every transport the script starts `server_sse.py` with the matching
+MCP_TRANSPORT, opens CLIENTS concurrent MCP sessions and sends CALLS chat
+requests through each one. It reports per-call latency percentiles,
+throughput and the server memory cost of one extra connection:
+
+• sse / streamable-http – one shared server; RSS growth after the sessions
+  connect, divided by the number of sessions.
+• stdio – one server process per session (how the gateway runs stdio
+  agents); RSS of a single spawned process.
+
+Run
+───
+
+python bench/bench_transports.py                       # all transports
+python bench/bench_transports.py --transports sse streamable-http \\
+       --clients 16 --calls 10 --json bench_transports.json
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import AsyncExitStack
+from pathlib import Path
+
+import anyio
+from mcp import StdioServerParameters
+from mcp.client.session import ClientSession
+from mcp.client.sse import sse_client
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SERVER = PROJECT_ROOT / "server_sse.py"
+HOST = "127.0.0.1"
+
+
+def rss_kb(pid: int) -> int:
+    """Resident set size of a process in KiB (Linux /proc)."""
+    with open(f"/proc/{pid}/status", encoding="ascii") as fh:
+        for line in fh:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def child_pids(script: Path) -> list[int]:
+    """PIDs of our direct children running ``script`` (stdio servers)."""
+    me, pids = os.getpid(), []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="ascii") as fh:
+                ppid = int(fh.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as fh:
+                cmdline = fh.read().decode(errors="replace")
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == me and str(script) in cmdline:
+            pids.append(int(entry))
+    return pids
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex((HOST, port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"server did not open port {port} within {timeout:.0f}s")
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    k = round((len(sorted_values) - 1) * pct / 100)
+    return sorted_values[k]
+
+
+def open_transport(transport: str, port: int):
+    if transport == "sse":
+        return sse_client(f"http://{HOST}:{port}/sse")
+    if transport == "streamable-http":
+        return streamablehttp_client(f"http://{HOST}:{port}/mcp")
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=[str(SERVER)],
+        env={**os.environ, "MCP_TRANSPORT": "stdio"},
+        cwd=str(PROJECT_ROOT),
+    )
+    return stdio_client(params)
+
+
+async def run_transport(transport: str, clients: int, calls: int,
+                        tool: str, args: dict) -> dict:
+    server = None
+    port = free_port()
+    if transport != "stdio":
+        env = {**os.environ, "MCP_TRANSPORT": transport, "PORT": str(port), "HOST": HOST}
+        server = subprocess.Popen([sys.executable, str(SERVER)], env=env,
+                                  cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL)
+        wait_for_port(port)
+    try:
+        baseline_kb = rss_kb(server.pid) if server else 0
+        latencies: list[float] = []
+        errors = 0
+
+        async with AsyncExitStack() as stack:
+            sessions = []
+            connect_start = time.perf_counter()
+            for _ in range(clients):
+                streams = await stack.enter_async_context(open_transport(transport, port))
+                session = await stack.enter_async_context(ClientSession(streams[0], streams[1]))
+                await session.initialize()
+                sessions.append(session)
+            connect_s = time.perf_counter() - connect_start
+
+            if server:
+                per_conn_kb = (rss_kb(server.pid) - baseline_kb) / clients
+            else:
+                pids = child_pids(SERVER)
+                per_conn_kb = sum(rss_kb(p) for p in pids) / max(len(pids), 1)
+
+            async def drive(session: ClientSession) -> None:
+                nonlocal errors
+                for _ in range(calls):
+                    start = time.perf_counter()
+                    try:
+                        result = await session.call_tool(tool, args)
+                        if result.isError:
+                            errors += 1
+                            continue
+                    except Exception:
+                        errors += 1
+                        continue
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+            wall_start = time.perf_counter()
+            async with anyio.create_task_group() as tg:
+                for session in sessions:
+                    tg.start_soon(drive, session)
+            wall_s = time.perf_counter() - wall_start
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+
+    latencies.sort()
+    return {
+        "transport": transport,
+        "clients": clients,
+        "calls": clients * calls,
+        "errors": errors,
+        "connect_s": connect_s,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "throughput_rps": len(latencies) / wall_s if wall_s else 0.0,
+        "rss_per_connection_kb": per_conn_kb,
+    }
+
+
+def print_table(rows: list[dict]) -> None:
+    cols = ["calls", "errors", "connect_s", "p50_ms", "p95_ms", "p99_ms",
+            "throughput_rps", "rss_per_connection_kb"]
+    print(f"\n{'transport':<16}" + "".join(f"{c:>22}" for c in cols))
+    for row in rows:
+        cells = [f"{row[c]:>22d}" if isinstance(row[c], int) else f"{row[c]:>22.2f}"
+                 for c in cols]
+        print(f"{row['transport']:<16}" + "".join(cells))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--transports", nargs="+",
+                        default=["stdio", "sse", "streamable-http"])
+    parser.add_argument("--clients", type=int, default=8, help="concurrent sessions")
+    parser.add_argument("--calls", type=int, default=5, help="calls per session")
+    parser.add_argument("--query", default="What is the capital of Italy?")
+    parser.add_argument("--json", help="also write results to this file")
+    opts = parser.parse_args()
+
+    rows = []
+    for transport in opts.transports:
+        print(f"▶ {transport}: {opts.clients} sessions × {opts.calls} chat calls")
+        rows.append(await run_transport(transport, opts.clients, opts.calls,
+                                        "chat", {"query": opts.query}))
+    print_table(rows)
+    if opts.json:
+        Path(opts.json).write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    anyio.run(main)
@@ -0,0 +1,294 @@
+# model_daemon.py – one watsonx client per host, shared by the local agents
+"""
+Owns what every agent process would otherwise build for itself: the
+watsonx SDK, one IAM token (refreshed in the background), one APIClient
+with its HTTP connection pool, a ``ModelInference`` per model id, and the
+reply cache. Agents started with ``MODEL_DAEMON_SOCKET`` set
+(``server_sse.py``, ``server_stdio.py``, ``python_watsonx_agent/main.py``)
+become thin clients (see common/model_client.py). They skip the SDK
+import and their own cache.
+
+Every agent on the host then hits the same cache. Identical requests that
+arrive while the first one is still generating are attached to it instead
+of starting another generation: they get the chunks produced so far and
+then stream along with it. A generation stops early only when all of its
+callers have hung up.
+
+Run
+───
+
+MODEL_DAEMON_SOCKET=/run/watsonx/model.sock python model_daemon.py
+MODEL_DAEMON_SOCKET=/run/watsonx/model.sock python server_sse.py
+python model_daemon.py --stats                 # counters and cache hit rate
+
+| Variable                   | Default                  | Meaning                        |
+| -------------------------- | ------------------------ | ------------------------------ |
+| `MODEL_DAEMON_SOCKET`      | `/tmp/watsonx-model.sock`| Unix socket (mode 0660)        |
+| `MODEL_DAEMON_CONCURRENCY` | `16`                     | Generations running at once    |
+| `CACHE_TTL_SECONDS` …      | as for the agents        | Shared reply cache             |
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()   # before the shared helpers, some read settings at import
+
+# Shared helpers live in <repo>/common
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common.credentials import api_client
+from common.deadline import collect_stream
+from common.logsetup import configure_logging
+from common.model_client import DaemonError, daemon_request
+from common.response_cache import DiskCache, MemoryCache, ResponseCache, make_key
+
+# ─── Settings ────────────────────────────────────────────────────
+API_KEY     = os.getenv("WATSONX_API_KEY") or os.getenv("WATSONX_APIKEY")
+URL         = os.getenv("WATSONX_URL")
+PROJECT_ID  = os.getenv("PROJECT_ID")
+SOCKET      = os.getenv("MODEL_DAEMON_SOCKET", "/tmp/watsonx-model.sock")
+CONCURRENCY = int(os.getenv("MODEL_DAEMON_CONCURRENCY", 16))
+
+CACHE_TTL_SECONDS  = float(os.getenv("CACHE_TTL_SECONDS", 0))      # 0 = off
+CACHE_MAX_ENTRIES  = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+CACHE_DISK_PATH    = os.getenv("CACHE_DISK_PATH")
+CACHE_DISK_MAX_MB  = float(os.getenv("CACHE_DISK_MAX_MB", 256))
+CACHE_WARM_ENTRIES = int(os.getenv("CACHE_WARM_ENTRIES", 1000))
+
+log = logging.getLogger("model-daemon")
+
+
+def rss_kb() -> int:
+    with open("/proc/self/status", encoding="ascii") as fh:
+        for line in fh:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+class Flight:
+    """One upstream generation and the callers waiting for it."""
+
+    def __init__(self) -> None:
+        self.chunks: list[str] = []
+        self.usage: Optional[dict] = None
+        self.error: Optional[Exception] = None
+        self.done = False
+        self.callers = 0
+        self.stop = threading.Event()
+        self._changed = asyncio.Event()
+
+    def _wake(self) -> None:
+        # wakes everyone waiting now; later waiters get the next event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def push(self, text: str) -> None:
+        self.chunks.append(text)
+        self._wake()
+
+    def finish(self, usage: Optional[dict], error: Optional[Exception]) -> None:
+        self.usage, self.error, self.done = usage, error, True
+        self._wake()
+
+    async def past(self, seen: int) -> None:
+        """Wait until there are more than ``seen`` chunks, or the flight is done."""
+        while len(self.chunks) <= seen and not self.done:
+            await self._changed.wait()
+
+
+class ModelDaemon:
+    def __init__(self) -> None:
+        self.client = None
+        self.models: dict[str, object] = {}
+        self.flights: dict[str, Flight] = {}
+        self.executor = ThreadPoolExecutor(CONCURRENCY, thread_name_prefix="watsonx")
+        self._models_lock = threading.Lock()
+        disk = (DiskCache(CACHE_DISK_PATH, max_bytes=int(CACHE_DISK_MAX_MB * 1024 * 1024))
+                if CACHE_DISK_PATH else None)
+        self.cache = ResponseCache(MemoryCache(CACHE_MAX_ENTRIES), disk, ttl=CACHE_TTL_SECONDS)
+        if disk is not None:
+            disk.compact()
+            log.info("Warmed %d cached replies from %s",
+                     self.cache.warm(CACHE_WARM_ENTRIES), CACHE_DISK_PATH)
+        self.started = time.time()
+        self.counts = {"requests": 0, "generations": 0, "coalesced": 0, "errors": 0,
+                       "cancelled": 0, "connections": 0}
+
+    # ── models ───────────────────────────────────────────────────
+    def model(self, model_id: str):
+        """The shared ``ModelInference`` for ``model_id``, built on first use."""
+        with self._models_lock:
+            model = self.models.get(model_id)
+            if model is None:
+                from ibm_watsonx_ai.foundation_models import ModelInference
+                if self.client is None:
+                    self.client = api_client(URL, API_KEY, PROJECT_ID)
+                model = self.models[model_id] = ModelInference(model_id=model_id,
+                                                               api_client=self.client)
+                log.info("Model %s ready", model_id)
+            return model
+
+    def _generate(self, flight: Flight, model_id: str, prompt: str, params: dict,
+                  loop: asyncio.AbstractEventLoop) -> None:
+        """Runs on the executor; hands chunks to the event loop as they arrive."""
+        usage, error = None, None
+        try:
+            chunks = self.model(model_id).generate_text_stream(
+                prompt=prompt, params=params, raw_response=True)
+            _, usage = collect_stream(
+                chunks, flight.stop, on_chunk=lambda text: loop.call_soon_threadsafe(flight.push, text))
+        except Exception as exc:
+            error = exc
+        loop.call_soon_threadsafe(flight.finish, usage, error)
+
+    # ── requests ─────────────────────────────────────────────────
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.counts["connections"] += 1
+
+        async def send(message: dict) -> None:
+            writer.write(json.dumps(message).encode() + b"\n")
+            await writer.drain()
+
+        request: dict = {}
+        try:
+            request = json.loads(await reader.readline() or b"{}")
+            op = request.get("op")
+            if op == "generate":
+                await self.generate(request, reader, send)
+            elif op == "open":
+                await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self.model, request["model_id"])
+                await send({"ok": True})
+            elif op == "stats":
+                await send(self.stats())
+            else:
+                await send({"error": f"unknown op {op!r}", "type": "ValueError"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as exc:
+            self.counts["errors"] += 1
+            log.warning("%s request failed: %s", request.get("op"), exc)
+            try:
+                await send({"error": str(exc)[:500], "type": exc.__class__.__name__})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def generate(self, request: dict, reader: asyncio.StreamReader, send) -> None:
+        self.counts["requests"] += 1
+        model_id, prompt = request["model_id"], request["prompt"]
+        params = request.get("params") or {}
+        key = make_key(model_id, json.dumps(params, sort_keys=True), prompt)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            entry = json.loads(cached)
+            await send({"text": entry["text"]})
+            await send({"done": True, "usage": entry["usage"], "cached": True})
+            return
+
+        loop = asyncio.get_running_loop()
+        flight = self.flights.get(key)
+        if flight is None or flight.stop.is_set():
+            flight = self.flights[key] = Flight()
+            self.counts["generations"] += 1
+            upstream = loop.run_in_executor(self.executor, self._generate,
+                                            flight, model_id, prompt, params, loop)
+            upstream.add_done_callback(lambda _: self._settle(key, flight))
+        else:
+            self.counts["coalesced"] += 1
+        flight.callers += 1
+
+        hangup = asyncio.ensure_future(reader.read())      # b"" once the caller closes
+        try:
+            sent = 0
+            while True:
+                while sent < len(flight.chunks):
+                    await send({"text": flight.chunks[sent]})
+                    sent += 1
+                if flight.done:
+                    break
+                changed = asyncio.ensure_future(flight.past(sent))
+                await asyncio.wait({changed, hangup}, return_when=asyncio.FIRST_COMPLETED)
+                if hangup.done():
+                    changed.cancel()
+                    return
+            if flight.error is not None:
+                raise flight.error
+            await send({"done": True, "usage": flight.usage, "cached": False})
+        finally:
+            hangup.cancel()
+            flight.callers -= 1
+            if not flight.done and flight.callers == 0:
+                flight.stop.set()              # nobody is listening: stop watsonx
+                self.counts["cancelled"] += 1
+
+    def _settle(self, key: str, flight: Flight) -> None:
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        if flight.error is None and not flight.stop.is_set():
+            self.cache.set(key, json.dumps({"text": "".join(flight.chunks), "usage": flight.usage}))
+
+    def stats(self) -> dict:
+        hits = sum(self.cache.hits.values())
+        lookups = hits + self.cache.misses
+        return {
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started, 1),
+            "rss_kb": rss_kb(),
+            "models": sorted(self.models),
+            "in_flight": len(self.flights),
+            **self.counts,
+            "cache": {"entries": len(self.cache.front), "hits": hits,
+                      "misses": self.cache.misses,
+                      "hit_rate": round(hits / lookups, 4) if lookups else None},
+        }
+
+
+async def serve() -> None:
+    daemon = ModelDaemon()
+    if os.path.exists(SOCKET):
+        os.unlink(SOCKET)             # left over from a previous run
+    server = await asyncio.start_unix_server(daemon.handle, path=SOCKET)
+    os.chmod(SOCKET, 0o660)
+    log.info("Model daemon listening on %s (%d generation threads)", SOCKET, CONCURRENCY)
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Shared watsonx model daemon")
+    parser.add_argument("--stats", action="store_true", help="print a running daemon's stats")
+    opts = parser.parse_args()
+    if opts.stats:
+        try:
+            print(json.dumps(next(daemon_request(SOCKET, {"op": "stats"}, timeout=10)), indent=2))
+        except DaemonError as exc:
+            raise SystemExit(str(exc))
+        return
+
+    for name, val in [("WATSONX_API_KEY", API_KEY), ("WATSONX_URL", URL),
+                      ("PROJECT_ID", PROJECT_ID)]:
+        if not val:
+            raise RuntimeError(f"{name} is not set")
+    configure_logging(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
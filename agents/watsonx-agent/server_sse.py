@@ -1,61 +1,305 @@
 # server.py  – lenient Watsonx agent
-import os, logging
-from typing import Union
+import asyncio, os, sys, logging, threading, time
+from pathlib import Path
+from typing import Optional, Union
+import anyio
+import uvicorn
 from dotenv import load_dotenv
 
-from mcp.server.fastmcp import FastMCP
-from ibm_watsonx_ai import APIClient, Credentials
-from ibm_watsonx_ai.foundation_models import ModelInference
-from ibm_watsonx_ai.metanames import GenTextParamsMetaNames as GenParams
+from mcp.server.fastmcp import Context, FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
 
-# ─── Load env vars ───────────────────────────────────────────────
+# Load env vars first: some of the shared helpers read settings at import
 load_dotenv()
+
+# Shared helpers live in <repo>/common
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common import metrics
+from common.deadline import Deadline, DeadlineExceeded, WorkTracker, collect_stream, run_guarded
+from common.drain import CLOSE_SECONDS, PROBE_PATHS, Drain, DrainMiddleware
+from common.logsetup import configure_logging
+from common.model_client import model_client
+from common.profiles import ProfileSet
+from common.prompt_limit import PromptLimit
+from common.response_cache import DiskCache, MemoryCache, ResponseCache, make_key
+from common.scheduler import FairScheduler
+from common.sse_sessions import SessionLimitMiddleware, Sessions
+from common.usage import UsageLedger
+
+# ─── Settings ────────────────────────────────────────────────────
 API_KEY    = os.getenv("WATSONX_API_KEY")
 URL        = os.getenv("WATSONX_URL")
 PROJECT_ID = os.getenv("PROJECT_ID")
 MODEL_ID   = os.getenv("MODEL_ID", "ibm/granite-3-3-8b-instruct")
+# Optional: generate through the host's shared model daemon (model_daemon.py)
+DAEMON_SOCKET = os.getenv("MODEL_DAEMON_SOCKET")
 PORT       = int(os.getenv("PORT", 6288))
+HOST       = os.getenv("HOST", "127.0.0.1")
+# "sse" (default), "streamable-http" or "stdio"
+TRANSPORT  = os.getenv("MCP_TRANSPORT", "sse")
+# Streamable HTTP only: no per-client session state, plain JSON replies
+STATELESS_HTTP = os.getenv("MCP_STATELESS_HTTP", "false").lower() == "true"
+JSON_RESPONSE  = os.getenv("MCP_JSON_RESPONSE", "false").lower() == "true"
+
+# Response cache: in-memory, plus an optional disk tier that survives restarts
+CACHE_TTL_SECONDS  = float(os.getenv("CACHE_TTL_SECONDS", 0))      # 0 = off
+if DAEMON_SOCKET:   # the model daemon caches replies once for every agent on the host
+    CACHE_TTL_SECONDS = 0
+CACHE_MAX_ENTRIES  = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+CACHE_DISK_PATH    = os.getenv("CACHE_DISK_PATH")
+CACHE_DISK_MAX_MB  = float(os.getenv("CACHE_DISK_MAX_MB", 256))
+CACHE_WARM_ENTRIES = int(os.getenv("CACHE_WARM_ENTRIES", 1000))
+
+# Budget for a chat call when the caller passes no timeout_ms
+CHAT_TIMEOUT_SECONDS = float(os.getenv("CHAT_TIMEOUT_SECONDS", 120))
+
+if TRANSPORT not in ("sse", "streamable-http", "stdio"):
+    raise RuntimeError(f"MCP_TRANSPORT must be sse, streamable-http or stdio, got {TRANSPORT!r}")
 
 for name, val in [("WATSONX_API_KEY", API_KEY),
                   ("WATSONX_URL",     URL),
                   ("PROJECT_ID",      PROJECT_ID)]:
-    if not val:
+    if not val and not DAEMON_SOCKET:   # the daemon holds the credentials
         raise RuntimeError(f"{name} is not set")
 
-logging.basicConfig(
+configure_logging(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
 
-creds  = Credentials(url=URL, api_key=API_KEY)
-client = APIClient(credentials=creds, project_id=PROJECT_ID)
-model  = ModelInference(model_id=MODEL_ID,
-                        credentials=creds,
-                        project_id=PROJECT_ID)
+# One IAM token for the process, refreshed in the background (common/credentials.py),
+# or a thin client of the host's model daemon when MODEL_DAEMON_SOCKET is set
+model = model_client(MODEL_ID, URL, API_KEY, PROJECT_ID)
+
+# Named generation profiles (common/generation_profiles.json or
+# GENERATION_PROFILES_PATH); GENERATION_PROFILE overrides the default
+profiles = ProfileSet.load(default="balanced")
+
+disk_cache = (DiskCache(CACHE_DISK_PATH, max_bytes=int(CACHE_DISK_MAX_MB * 1024 * 1024))
+              if CACHE_DISK_PATH else None)
+cache = ResponseCache(MemoryCache(CACHE_MAX_ENTRIES), disk_cache, ttl=CACHE_TTL_SECONDS)
+if disk_cache is not None:
+    disk_cache.compact()
+    logging.info("Warmed %d cached replies from %s",
+                 cache.warm(CACHE_WARM_ENTRIES), CACHE_DISK_PATH)
+generation_work = WorkTracker("watsonx")
+
+# Prompts over PROMPT_MAX_TOKENS are truncated, rejected or summarized before
+# any model call (common/prompt_limit.py)
+prompt_limit = PromptLimit.from_env()
+
+# Weighted fair queuing between tenants, interactive ahead of batch
+# (common/scheduler.py; SCHEDULER_CONCURRENCY, SCHEDULER_WEIGHTS, ...)
+scheduler = FairScheduler.from_env()
+
+# Token usage per model, tenant and profile, flushed to /metrics and
+# USAGE_LOG_PATH every USAGE_FLUSH_SECONDS (common/usage.py)
+usage_ledger = UsageLedger.from_env("watsonx-agent-sse")
+
+# SIGTERM: refuse new sessions and calls, let running calls finish, then exit.
+# SIGHUP: reload MODEL_ID and the generation profiles (common/drain.py)
+drain = Drain()
+
+def reload_config() -> None:
+    global MODEL_ID, model
+    load_dotenv(override=True)
+    profiles.reload()
+    model_id = os.getenv("MODEL_ID", MODEL_ID)
+    if model_id != MODEL_ID:
+        new_model = model_client(model_id, URL, API_KEY, PROJECT_ID)   # may raise: keep the old one
+        logging.info("Model %s → %s", MODEL_ID, model_id)
+        MODEL_ID, model = model_id, new_model
+
+drain.on_reload(reload_config)
+
+# SSE only: at most SSE_MAX_SESSIONS open sessions (503 + Retry-After beyond),
+# idle ones closed after SSE_IDLE_SECONDS (common/sse_sessions.py)
+sse_sessions = Sessions()
+
+class ChunkRelay:
+    """
+    Sends generated text to the caller as MCP progress notifications while
+    the generation thread is still reading from watsonx. ``message`` holds
+    the new text, ``progress`` counts chunks. Chunks that pile up while a
+    notification is being sent go out together, so a slow client gets fewer,
+    larger notifications and never holds up the generation.
+    """
+
+    def __init__(self, ctx: Context, total: Optional[float]) -> None:
+        self.ctx = ctx
+        self.total = total
+        self.chunks = 0
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._pump())
+
+    @classmethod
+    def for_call(cls, ctx: Optional[Context], total: Optional[float]) -> Optional["ChunkRelay"]:
+        """A relay if the caller sent a progress token, else None."""
+        try:
+            meta = ctx.request_context.meta if ctx is not None else None
+        except ValueError:      # called in-process, outside an MCP request
+            return None
+        if meta is None or meta.progressToken is None:
+            return None
+        return cls(ctx, total)
+
+    def push(self, text: str) -> None:
+        """Called from the generation thread."""
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, text)
+        except RuntimeError:    # loop closed: nobody is listening any more
+            pass
+
+    async def _pump(self) -> None:
+        done = False
+        while not done:
+            parts = [await self._queue.get()]
+            while not self._queue.empty():
+                parts.append(self._queue.get_nowait())
+            if parts[-1] is None:
+                done = True
+                parts.pop()
+            if not parts:
+                continue
+            self.chunks += len(parts)
+            try:
+                await self.ctx.report_progress(self.chunks, self.total, "".join(parts))
+            except Exception as exc:    # client gone; the final result still counts
+                logging.debug("Progress notification failed: %s", exc)
+                return
+
+    async def aclose(self) -> None:
+        """Flush what is queued, so every chunk is sent before the result."""
+        self._queue.put_nowait(None)
+        await self._task
+
 
 # ─── Define MCP server ───────────────────────────────────────────
-mcp = FastMCP("Watsonx Chat Agent", port=PORT)
+mcp = FastMCP("Watsonx Chat Agent",
+              host=HOST,
+              port=PORT,
+              stateless_http=STATELESS_HTTP,
+              json_response=JSON_RESPONSE)
 
 @mcp.tool(description="Chat with IBM watsonx.ai (accepts str or int)")
-def chat(query: Union[str, int]) -> str:
+async def chat(query: Union[str, int], timeout_ms: Optional[int] = None,
+               profile: Optional[str] = None, slo_ms: Optional[int] = None,
+               tenant: Optional[str] = None, priority: Optional[str] = None,
+               ctx: Optional[Context] = None) -> str:
+    """
+    ``timeout_ms`` is the caller's remaining budget (see common/deadline.py).
+    ``profile`` names a generation profile; ``slo_ms`` asks for the richest
+    profile that answers within that time. ``tenant`` and ``priority``
+    (interactive | batch) place the call in the generation queues.
+
+    Callers that send a progress token receive the text as it is generated,
+    as progress notifications, before the full reply is returned.
+    """
+    deadline = Deadline.from_timeout_ms(timeout_ms, CHAT_TIMEOUT_SECONDS)
+    chosen = profiles.select(profile, slo_ms, budget_ms=timeout_ms)
+    priority = scheduler.priority(priority)
+    tenant = scheduler.tenant(tenant)   # unknown names would be unbounded usage labels
     # Coerce to string so int → str
     query = str(query).strip()
     # Substitute a real prompt if UI sent the placeholder 0
     if query == "0":
         query = "What is the capital of Italy?"
 
-    logging.info("chat() got %r", query)
+    checked = prompt_limit.apply(query, chosen.params.get("max_new_tokens", 0))   # may raise
+    if checked.action != "ok":
+        logging.info("Prompt of ~%d tokens %s", checked.tokens, checked.action)
+    query = checked.prompt
+
+    logging.info("chat() got %.80r (profile %s)", query, chosen.name)
 
-    params = {
-        GenParams.DECODING_METHOD: "greedy",
-        GenParams.MAX_NEW_TOKENS:   200,
-    }
-    resp  = model.generate_text(prompt=query, params=params, raw_response=True)
-    reply = resp["results"][0]["generated_text"].strip()
+    llm = model     # a config reload does not switch models under a running call
+    key = make_key(llm.model_id, chosen.tag, query)
+    cached = cache.get(key)
+    if cached is not None:
+        logging.info("→ (cached) %r", cached)
+        return cached
+
+    # Refused once a drain has begun; a drain waits for calls already running
+    with drain.track():
+        # Streamed so that a cancelled call stops reading and watsonx stops generating
+        generation_work.check_arrival(deadline)
+        stop = threading.Event()
+        start = time.perf_counter()
+        relay = ChunkRelay.for_call(ctx, chosen.params.get("max_new_tokens"))
+
+        async def generate():
+            nonlocal start
+            cost = chosen.params.get("max_new_tokens", 1)
+            async with scheduler.slot(tenant, priority, cost=cost):
+                start = time.perf_counter()   # generation time, without the queue wait
+                return await anyio.to_thread.run_sync(
+                    lambda: collect_stream(llm.generate_text_stream(
+                        prompt=query, params=chosen.params, raw_response=True), stop,
+                        on_chunk=relay.push if relay else None),
+                    abandon_on_cancel=True,
+                )
+
+        try:
+            reply, usage = await run_guarded(generate, deadline, generation_work, stop=stop)
+        except DeadlineExceeded:
+            chosen.observe(time.perf_counter() - start, None, outcome="deadline")
+            raise
+        except Exception:
+            chosen.observe(time.perf_counter() - start, None, outcome="error")
+            raise
+        finally:
+            if relay is not None:
+                await relay.aclose()
+    seconds = time.perf_counter() - start
+    chosen.observe(seconds, usage["generated_tokens"])
+    usage_ledger.record(llm.model_id, tenant, chosen.name, usage, seconds)
+    prompt_limit.observe(checked, usage["input_tokens"])
+    reply = reply.strip()
+    cache.set(key, reply)
     logging.info("→ %r", reply)
     return reply
 
+@mcp.custom_route("/livez", methods=["GET"], include_in_schema=False)
+async def livez(request: Request) -> JSONResponse:
+    return JSONResponse({"status": "ok"})
+
+@mcp.custom_route("/readyz", methods=["GET"], include_in_schema=False)
+async def readyz(request: Request) -> JSONResponse:
+    """503 while draining, so the gateway and load balancers stop sending sessions."""
+    return JSONResponse({"status": "not ready" if drain.draining else "ready",
+                         "drain": drain.status(), "sessions": sse_sessions.status()},
+                        status_code=503 if drain.draining else 200)
+
+@mcp.custom_route("/metrics", methods=["GET"], include_in_schema=False)
+async def get_metrics(request: Request) -> PlainTextResponse:
+    """Prometheus metrics, on the SSE and streamable HTTP transports."""
+    return PlainTextResponse(metrics.render())
+
 # ─── Run ─────────────────────────────────────────────────────────
+def serve_http() -> None:
+    """SSE (/sse) or streamable HTTP (/mcp) under uvicorn, with drain and reload."""
+    if TRANSPORT == "sse":
+        logging.info(f"Starting Watsonx MCP server at http://{HOST}:{PORT}/sse")
+        app = mcp.sse_app()
+        app.add_middleware(SessionLimitMiddleware, sessions=sse_sessions,
+                           sse_path=mcp.settings.sse_path, message_path=mcp.settings.message_path)
+        # sessions already open keep posting to /messages/ while draining
+        passthrough = PROBE_PATHS + (mcp.settings.message_path,)
+    else:
+        logging.info(f"Starting Watsonx MCP server at http://{HOST}:{PORT}/mcp "
+                     f"(streamable HTTP, stateless={STATELESS_HTTP})")
+        app = mcp.streamable_http_app()
+        passthrough = PROBE_PATHS
+    # Tool calls are tracked in chat(): sessions themselves stay open indefinitely
+    app.add_middleware(DrainMiddleware, drain=drain, passthrough=passthrough, track=False)
+    uvicorn.run(app, host=HOST, port=PORT, log_level=mcp.settings.log_level.lower(),
+                timeout_graceful_shutdown=CLOSE_SECONDS)
+
 if __name__ == "__main__":
-    logging.info(f"Starting Watsonx MCP server at http://127.0.0.1:{PORT}/sse")
-    mcp.run(transport="sse")   # SSE endpoint is /sse
+    if TRANSPORT == "stdio":
+        logging.info("Starting Watsonx MCP server on STDIO…")
+        mcp.run(transport="stdio")
+    else:
+        serve_http()
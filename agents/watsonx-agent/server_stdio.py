@@ -1,40 +1,96 @@
 # server.py
-import os, logging
+import os, sys, logging, time
+from typing import Optional
+from pathlib import Path
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
-from ibm_watsonx_ai import APIClient, Credentials
-from ibm_watsonx_ai.foundation_models import ModelInference
-from ibm_watsonx_ai.metanames import GenTextParamsMetaNames as GenParams
 
-# ——— Load settings ———
-load_dotenv()  
+# ——— Load settings ——— (before the shared helpers, some read them at import)
+load_dotenv()
+
+# Shared helpers live in <repo>/common
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common.logsetup import configure_logging
+from common.model_client import model_client
+from common.profiles import ProfileSet
+from common.prompt_limit import PromptLimit
+from common.response_cache import DiskCache, MemoryCache, ResponseCache, make_key
+from common.usage import UsageLedger
+
 API_KEY    = os.getenv("WATSONX_API_KEY")
 URL        = os.getenv("WATSONX_URL")
 PROJECT_ID = os.getenv("PROJECT_ID")
 MODEL_ID   = os.getenv("MODEL_ID", "ibm/granite-3-3-8b-instruct")
+# Optional: generate through the host's shared model daemon (model_daemon.py)
+DAEMON_SOCKET = os.getenv("MODEL_DAEMON_SOCKET")
+
+# Response cache: in-memory, plus an optional disk tier that survives restarts
+CACHE_TTL_SECONDS  = float(os.getenv("CACHE_TTL_SECONDS", 0))      # 0 = off
+if DAEMON_SOCKET:   # the model daemon caches replies once for every agent on the host
+    CACHE_TTL_SECONDS = 0
+CACHE_MAX_ENTRIES  = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+CACHE_DISK_PATH    = os.getenv("CACHE_DISK_PATH")
+CACHE_DISK_MAX_MB  = float(os.getenv("CACHE_DISK_MAX_MB", 256))
+CACHE_WARM_ENTRIES = int(os.getenv("CACHE_WARM_ENTRIES", 1000))
 
 for name,val in [("WATSONX_API_KEY",API_KEY),("WATSONX_URL",URL),("PROJECT_ID",PROJECT_ID)]:
-    if not val:
+    if not val and not DAEMON_SOCKET:   # the daemon holds the credentials
         raise RuntimeError(f"{name} is not set")
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+configure_logging(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+# One IAM token for the process, refreshed in the background (common/credentials.py),
+# or a thin client of the host's model daemon when MODEL_DAEMON_SOCKET is set
+model = model_client(MODEL_ID, URL, API_KEY, PROJECT_ID)
+
+# Named generation profiles, shared with server_sse.py (see common/profiles.py)
+profiles = ProfileSet.load(default="balanced")
+
+disk_cache = (DiskCache(CACHE_DISK_PATH, max_bytes=int(CACHE_DISK_MAX_MB * 1024 * 1024))
+              if CACHE_DISK_PATH else None)
+cache = ResponseCache(MemoryCache(CACHE_MAX_ENTRIES), disk_cache, ttl=CACHE_TTL_SECONDS)
+if disk_cache is not None:
+    disk_cache.compact()
+    logging.info("Warmed %d cached replies from %s",
+                 cache.warm(CACHE_WARM_ENTRIES), CACHE_DISK_PATH)
+
+# Prompt length limit, enforced before any model call (common/prompt_limit.py)
+prompt_limit = PromptLimit.from_env()
 
-creds  = Credentials(url=URL, api_key=API_KEY)
-client = APIClient(credentials=creds, project_id=PROJECT_ID)
-model  = ModelInference(model_id=MODEL_ID, credentials=creds, project_id=PROJECT_ID)
+# Token usage per model and profile, written to USAGE_LOG_PATH (common/usage.py)
+usage_ledger = UsageLedger.from_env("watsonx-agent-stdio")
 
 # ——— Define MCP server ———
 mcp = FastMCP("Watsonx Chat Agent")
 
 @mcp.tool()
-def chat(query: str) -> str:
-    logging.info("chat() got %r", query)
-    params = {
-      GenParams.DECODING_METHOD: "greedy",
-      GenParams.MAX_NEW_TOKENS:   200,
-    }
-    resp = model.generate_text(prompt=query, params=params, raw_response=True)
-    text = resp["results"][0]["generated_text"].strip()
+def chat(query: str, profile: Optional[str] = None, slo_ms: Optional[int] = None) -> str:
+    chosen = profiles.select(profile, slo_ms)
+    checked = prompt_limit.apply(query, chosen.params.get("max_new_tokens", 0))   # may raise
+    query = checked.prompt
+    logging.info("chat() got %.80r (profile %s)", query, chosen.name)
+    key = make_key(MODEL_ID, chosen.tag, query)
+    cached = cache.get(key)
+    if cached is not None:
+        logging.info("→ (cached) %r", cached)
+        return cached
+    start = time.perf_counter()
+    try:
+        resp = model.generate_text(prompt=query, params=chosen.params, raw_response=True)
+    except Exception:
+        chosen.observe(time.perf_counter() - start, None, outcome="error")
+        raise
+    seconds = time.perf_counter() - start
+    result = resp["results"][0]
+    chosen.observe(seconds, result.get("generated_token_count"))
+    usage_ledger.record(MODEL_ID, None, chosen.name,
+                        {"generated_tokens": result.get("generated_token_count"),
+                         "input_tokens": result.get("input_token_count"),
+                         "stop_reason": result.get("stop_reason"),
+                         "cached": resp.get("cached")}, seconds)
+    prompt_limit.observe(checked, result.get("input_token_count"))
+    text = result["generated_text"].strip()
+    cache.set(key, text)
     logging.info("→ %r", text)
     return text
 
@@ -0,0 +1,341 @@
+# stdio_pool.py – warm pool of stdio MCP agents behind one front door
+"""
+Keeps POOL_SIZE stdio agent processes (default: `server_stdio.py`) spawned
+and initialised, and exposes them to the gateway as a single MCP server
+over stdio or SSE. Every incoming `tools/call` is handed to an idle worker,
+so callers never pay interpreter start-up or the watsonx SDK import, and
+POOL_SIZE calls run in parallel instead of one at a time.
+
+Workers are recycled (stopped and replaced by a fresh warm process) after
+POOL_MAX_REQUESTS calls, when their RSS grows past POOL_MAX_RSS_MB, when
+a call to them fails at the transport level, or when they are found dead
+while idle. A replacement that fails to spawn is retried with backoff (up
+to RESPAWN_MAX_SECONDS apart). While no worker is alive and the last spawn
+failed, calls fail at once instead of queueing. A call waits at most
+POOL_CALL_TIMEOUT for an idle worker.
+
+Run
+───
+
+python stdio_pool.py                                   # stdio front door
+POOL_TRANSPORT=sse PORT=6289 python stdio_pool.py      # SSE on :6289/sse
+python stdio_pool.py -- python ../hello_world/hello_server_stdio.py
+"""
+
+import argparse
+import logging
+import math
+import os
+import sys
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+import anyio
+import mcp.types as types
+from dotenv import load_dotenv
+from mcp import StdioServerParameters
+from mcp.client.session import ClientSession
+from mcp.client.stdio import stdio_client
+from mcp.server.lowlevel import Server
+from mcp.shared.exceptions import McpError
+
+# ─── Settings ────────────────────────────────────────────────────
+load_dotenv()
+POOL_SIZE         = int(os.getenv("POOL_SIZE", 4))
+POOL_MAX_REQUESTS = int(os.getenv("POOL_MAX_REQUESTS", 500))
+POOL_MAX_RSS_MB   = float(os.getenv("POOL_MAX_RSS_MB", 512))
+POOL_CALL_TIMEOUT = float(os.getenv("POOL_CALL_TIMEOUT", 120))
+POOL_TRANSPORT    = os.getenv("POOL_TRANSPORT", "stdio")   # stdio | sse
+HOST              = os.getenv("HOST", "127.0.0.1")
+PORT              = int(os.getenv("PORT", 6289))
+
+# Environment marker that lets the supervisor find each worker's PID
+WORKER_MARKER = "MCP_POOL_WORKER_ID"
+RESPAWN_MAX_SECONDS = 60.0
+# Call failures that say the worker itself is gone or stuck; any other
+# error (a tool error, bad arguments) leaves the worker in the pool
+TRANSPORT_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream,
+                    OSError)
+TRANSPORT_ERROR_CODES = {types.CONNECTION_CLOSED, 408}   # 408: read timeout, still busy
+
+# Logs go to stderr so they never corrupt a stdio front door
+logging.basicConfig(stream=sys.stderr, level=logging.INFO,
+                    format="%(asctime)s [%(levelname)s] %(message)s")
+log = logging.getLogger("stdio-pool")
+
+
+def find_worker_pid(marker: str) -> int | None:
+    """Locate our child process whose environment carries ``marker``."""
+    me = os.getpid()
+    needle = f"{WORKER_MARKER}={marker}".encode()
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="ascii") as fh:
+                ppid = int(fh.read().rsplit(")", 1)[1].split()[1])
+            if ppid != me:
+                continue
+            with open(f"/proc/{entry}/environ", "rb") as fh:
+                if needle in fh.read().split(b"\0"):
+                    return int(entry)
+        except (OSError, IndexError, ValueError):
+            continue
+    return None
+
+
+def process_exited(pid: int | None) -> bool:
+    """True when ``pid`` is gone or a zombie; False when alive or unknown."""
+    if pid is None:
+        return False
+    try:
+        with open(f"/proc/{pid}/stat", encoding="ascii") as fh:
+            return fh.read().rsplit(")", 1)[1].split()[0] == "Z"
+    except (OSError, IndexError):
+        return True
+
+
+def rss_mb(pid: int | None) -> float:
+    """Resident set size of ``pid`` in MiB, 0 when unknown."""
+    if pid is None:
+        return 0.0
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+class Worker:
+    """One warm stdio agent process and its initialised client session."""
+
+    def __init__(self, command: str, args: list[str]):
+        self.id = uuid.uuid4().hex[:8]
+        self.command = command
+        self.args = args
+        self.pid: int | None = None
+        self.session: ClientSession | None = None
+        self.requests = 0
+        self.broken = False
+        self._stop = anyio.Event()
+
+    async def run(self, *, task_status=anyio.TASK_STATUS_IGNORED) -> None:
+        """Spawn, initialise, report ready and keep the session open until stopped."""
+        params = StdioServerParameters(
+            command=self.command,
+            args=self.args,
+            env={**os.environ, WORKER_MARKER: self.id},
+        )
+        started = False
+        try:
+            async with stdio_client(params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session = session
+                    self.pid = find_worker_pid(self.id)
+                    log.info("worker %s ready (pid %s)", self.id, self.pid)
+                    task_status.started()
+                    started = True
+                    await self._stop.wait()
+        except Exception:
+            if not started:
+                raise
+            # a dying worker must not take the whole pool down with it
+            self.broken = True
+            log.exception("worker %s exited unexpectedly", self.id)
+        log.info("worker %s stopped after %d requests", self.id, self.requests)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def alive(self) -> bool:
+        return not self.broken and not process_exited(self.pid)
+
+    def needs_recycle(self) -> str | None:
+        if self.broken:
+            return "transport error"
+        if process_exited(self.pid):
+            return "process exited"
+        if self.requests >= POOL_MAX_REQUESTS:
+            return f"{self.requests} requests"
+        rss = rss_mb(self.pid)
+        if rss > POOL_MAX_RSS_MB:
+            return f"RSS {rss:.0f} MiB"
+        return None
+
+
+class WorkerPool:
+    """Fixed-size pool of warm workers with recycle-and-replace."""
+
+    def __init__(self, command: str, args: list[str], size: int):
+        self.command = command
+        self.args = args
+        self.size = size
+        self.tools: list[types.Tool] = []
+        # None wakes the callers waiting for a worker, see _replace
+        self._idle_send, self._idle_recv = anyio.create_memory_object_stream[Worker | None](math.inf)
+        self._workers: set[Worker] = set()
+        self.spawn_error: Exception | None = None   # of the last failed replacement
+        self._tg: anyio.abc.TaskGroup | None = None
+
+    async def _spawn(self) -> Worker:
+        worker = Worker(self.command, self.args)
+        await self._tg.start(worker.run)
+        self._workers.add(worker)
+        self._idle_send.send_nowait(worker)
+        return worker
+
+    async def _replace(self, old: Worker, reason: str) -> None:
+        log.info("recycling worker %s (%s)", old.id, reason)
+        self._workers.discard(old)
+        old.stop()
+        delay = 1.0
+        while True:
+            try:
+                await self._spawn()
+                self.spawn_error = None
+                return
+            except Exception as exc:
+                self.spawn_error = exc
+                log.exception("could not spawn replacement worker, retrying in %.0fs", delay)
+            if not self._workers:
+                # nothing left to hand out: let the waiting callers fail now
+                for _ in range(self._idle_recv.statistics().tasks_waiting_receive):
+                    self._idle_send.send_nowait(None)
+            await anyio.sleep(delay)
+            delay = min(delay * 2, RESPAWN_MAX_SECONDS)
+
+    async def start(self, tg: anyio.abc.TaskGroup) -> None:
+        self._tg = tg
+        async with anyio.create_task_group() as spawn_tg:
+            for _ in range(self.size):
+                spawn_tg.start_soon(self._spawn)
+        # every worker runs the same agent – one tools/list is enough
+        first = next(iter(self._workers))
+        self.tools = (await first.session.list_tools()).tools
+        log.info("pool ready: %d workers, tools: %s",
+                 len(self._workers), ", ".join(t.name for t in self.tools))
+
+    async def _take(self) -> Worker:
+        """Next idle worker that is still alive; dead ones are replaced."""
+        try:
+            with anyio.fail_after(POOL_CALL_TIMEOUT):
+                while True:
+                    if not self._workers and self.spawn_error is not None:
+                        raise RuntimeError(f"no live workers: {self.spawn_error}")
+                    worker = await self._idle_recv.receive()
+                    if worker is None:
+                        continue
+                    if worker.alive():
+                        return worker
+                    worker.broken = True
+                    self._tg.start_soon(self._replace, worker, "exited while idle")
+        except TimeoutError:
+            raise RuntimeError(f"no idle worker within {POOL_CALL_TIMEOUT:.0f}s") from None
+
+    async def call_tool(self, name: str, arguments: dict) -> types.CallToolResult:
+        worker = await self._take()
+        try:
+            worker.requests += 1
+            return await worker.session.call_tool(
+                name, arguments, read_timeout_seconds=timedelta(seconds=POOL_CALL_TIMEOUT)
+            )
+        except TRANSPORT_ERRORS:
+            worker.broken = True
+            raise
+        except McpError as exc:
+            if exc.error.code in TRANSPORT_ERROR_CODES:
+                worker.broken = True
+            raise
+        finally:
+            reason = worker.needs_recycle()
+            if reason:
+                self._tg.start_soon(self._replace, worker, reason)
+            else:
+                self._idle_send.send_nowait(worker)
+
+    def close(self) -> None:
+        for worker in self._workers:
+            worker.stop()
+        self._workers.clear()
+
+
+def build_server(pool: WorkerPool) -> Server:
+    """Front-door MCP server that mirrors the workers' tools."""
+    server = Server("stdio-pool")
+
+    @server.list_tools()
+    async def list_tools() -> list[types.Tool]:
+        return pool.tools
+
+    @server.call_tool()
+    async def call_tool(name: str, arguments: dict):
+        result = await pool.call_tool(name, arguments)
+        if result.isError:
+            raise RuntimeError(" ".join(getattr(c, "text", "") for c in result.content))
+        if result.structuredContent is not None:
+            # tools with an outputSchema must hand their structured result back
+            return result.content, result.structuredContent
+        return result.content
+
+    return server
+
+
+async def serve_stdio(server: Server) -> None:
+    from mcp.server.stdio import stdio_server
+
+    async with stdio_server() as (read, write):
+        await server.run(read, write, server.create_initialization_options())
+
+
+async def serve_sse(server: Server) -> None:
+    import uvicorn
+    from mcp.server.sse import SseServerTransport
+    from starlette.applications import Starlette
+    from starlette.responses import Response
+    from starlette.routing import Mount, Route
+
+    sse = SseServerTransport("/messages/")
+
+    async def handle_sse(request):
+        async with sse.connect_sse(request.scope, request.receive, request._send) as streams:
+            await server.run(streams[0], streams[1], server.create_initialization_options())
+        return Response()
+
+    app = Starlette(routes=[
+        Route("/sse", endpoint=handle_sse),
+        Mount("/messages/", app=sse.handle_post_message),
+    ])
+    log.info("🚀 Serving pooled agent on http://%s:%d/sse", HOST, PORT)
+    await uvicorn.Server(uvicorn.Config(app, host=HOST, port=PORT, log_level="warning")).serve()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Warm pool of stdio MCP agents")
+    parser.add_argument("worker", nargs=argparse.REMAINDER,
+                        help="worker command (default: python server_stdio.py)")
+    opts = parser.parse_args()
+    worker_cmd = [a for a in opts.worker if a != "--"] or [
+        sys.executable, str(Path(__file__).resolve().parent / "server_stdio.py")
+    ]
+
+    pool = WorkerPool(worker_cmd[0], worker_cmd[1:], POOL_SIZE)
+    async with anyio.create_task_group() as tg:
+        await pool.start(tg)
+        server = build_server(pool)
+        try:
+            if POOL_TRANSPORT == "sse":
+                await serve_sse(server)
+            else:
+                await serve_stdio(server)
+        finally:
+            pool.close()
+            tg.cancel_scope.cancel()   # also drops replacements still spawning
+
+
+if __name__ == "__main__":
+    anyio.run(main)
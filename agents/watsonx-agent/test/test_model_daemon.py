@@ -0,0 +1,63 @@
+"""
+Coalesced generations in model_daemon.py: callers that attach to a running
+flight must each get every chunk, however their wakeups interleave.
+
+    python -m pytest test/test_model_daemon.py
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import model_daemon  # noqa: E402
+
+CHUNKS = 20
+
+
+class SlowModel:
+    """Stands in for ModelInference: streams CHUNKS raw chunks, 20 ms apart."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def generate_text_stream(self, prompt, params, raw_response):
+        self.calls += 1
+        for i in range(CHUNKS):
+            time.sleep(0.02)
+            yield {"results": [{"generated_text": f"{i} ", "generated_token_count": i + 1}]}
+
+
+async def caller(daemon: model_daemon.ModelDaemon, delay: float, yields: int) -> list[dict]:
+    await asyncio.sleep(delay)
+    reader = asyncio.StreamReader()      # never fed EOF: the caller stays connected
+    received: list[dict] = []
+
+    async def send(message: dict) -> None:
+        received.append(message)
+        for _ in range(yields):         # a socket drain() that has to wait
+            await asyncio.sleep(0)
+
+    await daemon.generate({"model_id": "m", "prompt": "same prompt"}, reader, send)
+    return received
+
+
+def test_concurrent_callers_share_one_generation():
+    daemon = model_daemon.ModelDaemon()
+    model = daemon.models["m"] = SlowModel()
+
+    async def run() -> list[list[dict]]:
+        callers = (caller(daemon, i * 0.03, yields=i) for i in range(5))
+        return await asyncio.wait_for(asyncio.gather(*callers), timeout=10)
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        daemon.executor.shutdown(wait=True)
+
+    assert model.calls == 1
+    assert daemon.counts["coalesced"] == 4
+    expected = "".join(f"{i} " for i in range(CHUNKS))
+    for received in results:
+        assert "".join(m.get("text", "") for m in received) == expected
+        assert received[-1]["done"] and not received[-1]["cached"]
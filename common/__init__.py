@@ -0,0 +1,7 @@
+"""
+common – helpers shared by the agents and frontends in this repository.
+
+The scripts here are run directly (``python main.py``, ``python ui.py``), so
+each one puts the repository root on ``sys.path`` before importing from
+this package.
+"""
@@ -0,0 +1,232 @@
+"""
+adaptive_timeout.py – per-agent, per-tool timeouts from observed latency
+
+A fixed timeout suits nobody: a no-op echo tool that hangs ties up a
+connection for the full minute, while a long granite generation may need
+all of it. ``AdaptiveTimeouts`` keeps the last ``window`` latencies of each
+(agent, tool) pair and, once it has ``min_samples`` of them, sets
+
+    timeout = clamp(p<quantile> × multiplier, floor, ceiling)
+
+Until then it uses the ceiling. Calls that time out at this timeout are
+recorded at the time they hit, so a timeout that is too tight grows again:
+by ``multiplier`` per window at most, up to the ceiling. Calls cut short by
+a tighter budget of the caller's are not recorded. Samples older than
+``max_age`` seconds are ignored, so the values follow the agent as it
+speeds up or slows down. Failed calls are not recorded: fast errors would
+pull the timeout down.
+
+Floors and ceilings can be set per agent (``TIMEOUT_LIMITS``, e.g.
+``hello-world-agent=0.5:5,watsonx-agent=5:120``).
+
+Hedging
+───────
+For the tools in ``HEDGE_TOOLS`` (``agent/tool`` names, ``*`` allowed,
+e.g. ``hello-world-agent/*``), ``hedged`` sends a second, identical
+request once the first has been running longer than the pair's p95. The
+first success wins and the other request is cancelled. Only list tools
+that are safe to run twice. At most ``HEDGE_BUDGET`` (default 10 %) of
+calls are hedged, so a slow agent is not sent twice the load.
+
+Metrics
+───────
+adaptive_timeout_seconds{agent,tool}         current timeout
+adaptive_latency_seconds{agent,tool,quantile}  p50 | p95 | p99 of the window
+hedged_requests_total{agent,tool,winner}     primary | hedge
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fnmatch
+import math
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Iterable, Optional, TypeVar
+
+from common import metrics
+from common.timeseries import RingSeries
+
+T = TypeVar("T")
+
+TIMEOUT = metrics.gauge("adaptive_timeout_seconds", "Current adaptive timeout",
+                        ["agent", "tool"])
+LATENCY = metrics.gauge("adaptive_latency_seconds", "Latency percentiles over the window",
+                        ["agent", "tool", "quantile"])
+HEDGES = metrics.counter("hedged_requests_total", "Hedged requests by the request that won",
+                         ["agent", "tool", "winner"])
+
+
+def parse_limits(spec: str) -> dict[str, tuple[float, float]]:
+    """``agent=floor:ceiling,…`` → {agent: (floor, ceiling)}."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        agent, _, pair = entry.rpartition("=")
+        floor, _, ceiling = pair.partition(":")
+        try:
+            if not agent:
+                raise ValueError
+            limits[agent] = (float(floor), float(ceiling))
+        except ValueError:
+            raise ValueError(f"TIMEOUT_LIMITS: expected agent=floor:ceiling, got {entry!r}") from None
+    return limits
+
+
+class _Pair:
+    __slots__ = ("samples", "timeout", "p95", "dirty")
+
+    def __init__(self, window: int, timeout: float) -> None:
+        self.samples = RingSeries(window)
+        self.timeout = timeout
+        self.p95: Optional[float] = None
+        self.dirty = False
+
+
+class AdaptiveTimeouts:
+    """Rolling latency per (agent, tool); lookups are O(1) between observations."""
+
+    def __init__(self, floor: float = 1.0, ceiling: float = 60.0, quantile: float = 99,
+                 multiplier: float = 2.0, window: int = 256, min_samples: int = 20,
+                 max_age: float = 900.0,
+                 limits: Optional[dict[str, tuple[float, float]]] = None,
+                 hedge_tools: Iterable[str] = (), hedge_budget: float = 0.1) -> None:
+        self.floor = floor
+        self.ceiling = ceiling
+        self.quantile = quantile
+        self.multiplier = multiplier
+        self.window = window
+        self.min_samples = min_samples
+        self.max_age = max_age
+        self.limits = dict(limits or {})
+        self.hedge_tools = tuple(hedge_tools)
+        self.hedge_budget = hedge_budget
+        self._pairs: dict[tuple[str, str], _Pair] = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._hedges = 0
+
+    @classmethod
+    def from_env(cls, ceiling: float) -> "AdaptiveTimeouts":
+        """``TIMEOUT_*`` and ``HEDGE_*`` settings; ``ceiling`` is the default ceiling."""
+        return cls(floor=float(os.getenv("TIMEOUT_FLOOR_SECONDS", "1")),
+                   ceiling=float(os.getenv("TIMEOUT_CEILING_SECONDS", str(ceiling))),
+                   quantile=float(os.getenv("TIMEOUT_QUANTILE", "99")),
+                   multiplier=float(os.getenv("TIMEOUT_MULTIPLIER", "2")),
+                   window=int(os.getenv("TIMEOUT_WINDOW", "256")),
+                   min_samples=int(os.getenv("TIMEOUT_MIN_SAMPLES", "20")),
+                   limits=parse_limits(os.getenv("TIMEOUT_LIMITS", "")),
+                   hedge_tools=[t.strip() for t in os.getenv("HEDGE_TOOLS", "").split(",")
+                                if t.strip()],
+                   hedge_budget=float(os.getenv("HEDGE_BUDGET", "0.1")))
+
+    def _bounds(self, agent: str) -> tuple[float, float]:
+        return self.limits.get(agent, (self.floor, self.ceiling))
+
+    def _pair(self, agent: str, tool: str) -> _Pair:
+        pair = self._pairs.get((agent, tool))
+        if pair is None:
+            pair = self._pairs[(agent, tool)] = _Pair(self.window, self._bounds(agent)[1])
+            TIMEOUT.set(pair.timeout, agent=agent, tool=tool)
+        return pair
+
+    def _refresh(self, agent: str, tool: str, pair: _Pair) -> None:
+        values = sorted(pair.samples.since(time.time() - self.max_age))
+        pair.dirty = False
+        if len(values) < self.min_samples:
+            pair.timeout, pair.p95 = self._bounds(agent)[1], None
+            return
+        floor, ceiling = self._bounds(agent)
+        quantiles = {q: _percentile(values, q) for q in (50, 95, self.quantile)}
+        pair.timeout = min(max(quantiles[self.quantile] * self.multiplier, floor), ceiling)
+        pair.p95 = quantiles[95]
+        TIMEOUT.set(pair.timeout, agent=agent, tool=tool)
+        for q in (50, 95, 99):
+            value = quantiles.get(q)
+            if value is not None:
+                LATENCY.set(value, agent=agent, tool=tool, quantile=f"p{q}")
+
+    # ── lookups ──────────────────────────────────────────────────
+    def timeout(self, agent: str, tool: str) -> float:
+        """Seconds to allow for the next call."""
+        with self._lock:
+            pair = self._pair(agent, tool)
+            if pair.dirty:
+                self._refresh(agent, tool, pair)
+            return pair.timeout
+
+    def hedge_delay(self, agent: str, tool: str) -> Optional[float]:
+        """When to send a hedge for this call, or None: not hedged, not known, or over budget."""
+        name = f"{agent}/{tool}"
+        if not any(fnmatch.fnmatchcase(name, pattern) for pattern in self.hedge_tools):
+            return None
+        with self._lock:
+            self._calls += 1
+            pair = self._pair(agent, tool)
+            if pair.dirty:
+                self._refresh(agent, tool, pair)
+            if pair.p95 is None or self._hedges + 1 > self.hedge_budget * self._calls:
+                return None
+            return pair.p95
+
+    def observe(self, agent: str, tool: str, seconds: float) -> None:
+        """A call that succeeded, or timed out after ``seconds``."""
+        with self._lock:
+            pair = self._pair(agent, tool)
+            pair.samples.append(time.time(), seconds)
+            pair.dirty = True
+
+    def hedged(self, agent: str, tool: str, winner: str) -> None:
+        """Count a hedge that was sent, by the call that won."""
+        with self._lock:
+            self._hedges += 1
+        HEDGES.inc(agent=agent, tool=tool, winner=winner)
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            for (agent, tool), pair in self._pairs.items():
+                if pair.dirty:
+                    self._refresh(agent, tool, pair)
+            return {f"{agent}/{tool}": {"timeout_s": round(pair.timeout, 3),
+                                         "p95_s": round(pair.p95, 3) if pair.p95 else None,
+                                         "samples": len(pair.samples)}
+                    for (agent, tool), pair in self._pairs.items()}
+
+
+def _percentile(values: list[float], q: float) -> float:
+    k = (len(values) - 1) * q / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+async def hedged(fn: Callable[[], Awaitable[T]],
+                 delay: Optional[float]) -> tuple[T, Optional[str]]:
+    """
+    Run ``fn``; if it has not finished after ``delay`` seconds, run it again
+    alongside. Returns the first successful result and, if a hedge was sent,
+    which call produced it (``primary`` or ``hedge``); the other call is
+    cancelled. Raises the hedge's error if both fail.
+    """
+    primary = asyncio.ensure_future(fn())
+    if delay is None:
+        return await primary, None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+    except asyncio.CancelledError:
+        primary.cancel()
+        raise
+    if done:
+        return primary.result(), None
+    hedge = asyncio.ensure_future(fn())
+    names = {primary: "primary", hedge: "hedge"}
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), names[task]
+        raise (hedge.exception() or primary.exception())
+    finally:
+        for task in pending:
+            task.cancel()
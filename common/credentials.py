@@ -0,0 +1,223 @@
+"""
+credentials.py – one watsonx IAM token per process, refreshed in the background
+
+The SDK's ``Credentials(url=..., api_key=...)`` exchanges the API key for
+an IAM bearer token lazily. Whichever request arrives after the token
+nears expiry pays for the exchange, and every ``APIClient`` (and every
+``ModelInference`` built from bare credentials) holds its own token.
+
+``TokenManager`` owns the exchange instead. It fetches the first token at
+start-up. A daemon thread then refreshes it ``TOKEN_REFRESH_MARGIN_SECONDS``
+before it expires (default 600 s, at most a third of the token's lifetime)
+and pushes it into every attached ``APIClient`` with ``set_token``. A failed
+refresh is retried with backoff while the current token is still valid, so
+a short IAM outage is never seen by callers.
+
+    tokens = token_manager(API_KEY)
+    client = tokens.api_client(URL, PROJECT_ID)
+    model  = ModelInference(model_id=MODEL_ID, api_client=client)
+
+Set ``WATSONX_TOKEN_REFRESH=false`` to fall back to the SDK's own handling,
+e.g. for Cloud Pak for Data, which does not use IBM Cloud IAM.
+
+Metrics
+───────
+iam_token_refresh_seconds                 duration of each token exchange
+iam_token_refreshes_total{outcome}        ok | error
+iam_token_expiry_timestamp_seconds        expiry of the token in use (unix time)
+iam_token_refresh_lead_seconds            time left on the old token when it was replaced
+iam_token_blocking_fetches_total          exchanges a caller had to wait for (should stay 0)
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import httpx
+
+from common import metrics
+
+DEFAULT_IAM_URL = "https://iam.cloud.ibm.com/identity/token"
+RETRY_MIN_SECONDS = 2.0
+RETRY_MAX_SECONDS = 60.0
+
+logger = logging.getLogger("credentials")
+
+REFRESH_SECONDS = metrics.histogram("iam_token_refresh_seconds", "IAM token exchange duration")
+REFRESHES = metrics.counter("iam_token_refreshes_total", "IAM token exchanges by outcome",
+                            ["outcome"])
+EXPIRY = metrics.gauge("iam_token_expiry_timestamp_seconds",
+                       "Expiry of the IAM token in use (unix time)")
+LEAD = metrics.gauge("iam_token_refresh_lead_seconds",
+                     "Seconds left on the previous token when it was replaced")
+BLOCKING = metrics.counter("iam_token_blocking_fetches_total",
+                           "Token exchanges done on a caller's thread because no valid token was held")
+
+
+# Settings are read when used, not at import: the agents import this module
+# before they load their .env file.
+def refresh_enabled() -> bool:
+    """``WATSONX_TOKEN_REFRESH`` (default true)."""
+    return os.getenv("WATSONX_TOKEN_REFRESH", "true").lower() == "true"
+
+
+def default_iam_url() -> str:
+    """``IAM_URL`` (default IBM Cloud IAM)."""
+    return os.getenv("IAM_URL", DEFAULT_IAM_URL)
+
+
+class TokenManager:
+    """Holds the process's IAM token and keeps it fresh from a daemon thread."""
+
+    def __init__(self, api_key: str, iam_url: Optional[str] = None,
+                 margin: Optional[float] = None, timeout: float = 10.0) -> None:
+        self.api_key = api_key
+        self.iam_url = iam_url or default_iam_url()
+        self.margin = (margin if margin is not None
+                       else float(os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "600")))
+        self._http = httpx.Client(timeout=timeout)
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._clients: list = []
+        self._thread: Optional[threading.Thread] = None
+        self._token: Optional[str] = None
+        self.expires_at = 0.0          # time.time()
+        self.refreshed_at = 0.0
+        self.failures = 0              # consecutive
+        self.last_error: Optional[str] = None
+
+    # ── token exchange ───────────────────────────────────────────
+    def _exchange(self) -> None:
+        start = time.perf_counter()
+        try:
+            resp = self._http.post(
+                self.iam_url,
+                data={"grant_type": "urn:ibm:params:oauth:grant-type:apikey",
+                      "apikey": self.api_key},
+                headers={"Accept": "application/json"},
+            )
+            resp.raise_for_status()
+            body = resp.json()
+            token = body["access_token"]
+        except (httpx.HTTPError, ValueError, KeyError) as exc:
+            REFRESHES.inc(outcome="error")
+            self.failures += 1
+            self.last_error = f"{exc.__class__.__name__}: {exc}"[:200]
+            raise
+        finally:
+            REFRESH_SECONDS.observe(time.perf_counter() - start)
+
+        now = time.time()
+        expires_at = float(body.get("expiration") or now + float(body.get("expires_in", 3600)))
+        with self._lock:
+            if self._token is not None:
+                LEAD.set(max(0.0, self.expires_at - now))
+            self._token = token
+            self.expires_at = expires_at
+            self.refreshed_at = now
+            clients = list(self._clients)
+        self.failures = 0
+        self.last_error = None
+        REFRESHES.inc(outcome="ok")
+        EXPIRY.set(expires_at)
+        for client in clients:
+            client.set_token(token)
+
+    def _refresh_at(self) -> float:
+        lifetime = self.expires_at - self.refreshed_at
+        return self.expires_at - min(self.margin, lifetime / 3)
+
+    def _run(self) -> None:
+        while True:
+            delay = self._refresh_at() - time.time()
+            if self.failures:
+                # back off, but keep at least one more try before the token expires
+                delay = min(RETRY_MIN_SECONDS * 2 ** (self.failures - 1), RETRY_MAX_SECONDS,
+                            max(RETRY_MIN_SECONDS, (self.expires_at - time.time()) / 2))
+            if self._wake.wait(max(0.0, delay)):
+                return
+            try:
+                self._exchange()
+                logger.info("IAM token refreshed; valid for %.0f s",
+                            self.expires_at - time.time())
+            except Exception:
+                logger.warning("IAM token refresh failed (%d in a row, %.0f s left): %s",
+                               self.failures, self.expires_at - time.time(), self.last_error)
+
+    # ── public API ───────────────────────────────────────────────
+    def start(self) -> "TokenManager":
+        """Fetch the first token (raises if IAM refuses it) and start refreshing."""
+        with self._start_lock:
+            if self._thread is None:
+                if not self.valid:
+                    self._exchange()
+                self._thread = threading.Thread(target=self._run, name="iam-token-refresh",
+                                                daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._wake.set()
+
+    @property
+    def valid(self) -> bool:
+        return self._token is not None and time.time() < self.expires_at
+
+    def token(self) -> str:
+        """The current token. Only fetched on the caller's thread if none is valid."""
+        if not self.valid:
+            BLOCKING.inc()
+            self._exchange()
+        return self._token
+
+    def attach(self, client):
+        """Keep an ``APIClient``'s token in step with this manager."""
+        with self._lock:
+            self._clients.append(client)
+        return client
+
+    def credentials(self, url: str):
+        from ibm_watsonx_ai import Credentials
+        return Credentials(url=url, token=self.token())
+
+    def api_client(self, url: str, project_id: str):
+        """A token-authenticated ``APIClient`` that this manager refreshes."""
+        from ibm_watsonx_ai import APIClient
+        return self.attach(APIClient(credentials=self.credentials(url), project_id=project_id))
+
+    def status(self) -> dict:
+        return {"valid": self.valid,
+                "expires_in_s": round(self.expires_at - time.time(), 1) if self._token else None,
+                "refreshed_at": self.refreshed_at,
+                "consecutive_failures": self.failures,
+                "last_error": self.last_error}
+
+
+_managers: dict[tuple[str, str], TokenManager] = {}
+_managers_lock = threading.Lock()
+
+
+def token_manager(api_key: str, iam_url: Optional[str] = None) -> TokenManager:
+    """The process-wide, started manager for this key (created on first use)."""
+    iam_url = iam_url or default_iam_url()
+    with _managers_lock:
+        manager = _managers.get((iam_url, api_key))
+        if manager is None:
+            manager = _managers[(iam_url, api_key)] = TokenManager(api_key, iam_url)
+    return manager.start()
+
+
+def api_client(url: str, api_key: str, project_id: str):
+    """
+    An ``APIClient`` sharing the process's background-refreshed token, or a
+    plain API-key client when ``WATSONX_TOKEN_REFRESH=false``.
+    """
+    if not refresh_enabled():
+        from ibm_watsonx_ai import APIClient, Credentials
+        return APIClient(credentials=Credentials(url=url, api_key=api_key), project_id=project_id)
+    return token_manager(api_key).api_client(url, project_id)
@@ -0,0 +1,225 @@
+"""
+deadline.py – per-request deadlines, cancellation and upstream-work-saved metrics
+
+Each hop receives its remaining budget and passes on what is left:
+
+  browser ──X-Request-Timeout-Ms──▶ ui.py ──header + "timeout_ms" tool arg──▶
+  gateway /rpc ──▶ agent (server_sse.py chat, or main.py /http via the header)
+
+A budget is relative (milliseconds left), not an absolute time, so clock
+skew between hosts does not matter. Each hop measures from the moment it
+received the request. Work is cancelled when the deadline passes or the
+client disconnects. A generation that is already streaming from watsonx
+stops reading, which closes the upstream stream.
+
+Metrics
+───────
+deadline_outcomes_total{hop,outcome}      completed | deadline | disconnect | expired_on_arrival
+upstream_seconds_saved_total{hop}         estimated: the hop's median duration minus the
+                                          time already spent when the call was cancelled
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Awaitable, Callable, Iterable, Iterator, Mapping, Optional, TypeVar
+
+import anyio
+import anyio.abc
+
+from common import metrics
+from common.timeseries import RingSeries
+
+HEADER = "X-Request-Timeout-Ms"
+T = TypeVar("T")
+
+OUTCOMES = metrics.counter("deadline_outcomes_total",
+                           "Requests by deadline outcome", ["hop", "outcome"])
+SAVED = metrics.counter("upstream_seconds_saved_total",
+                        "Estimated upstream seconds not spent thanks to cancellation", ["hop"])
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out."""
+
+
+class ClientDisconnected(Exception):
+    """The caller went away before the work finished."""
+
+
+class Deadline:
+    """A point on the monotonic clock by which a request must be answered."""
+
+    __slots__ = ("expires",)
+
+    def __init__(self, seconds: float) -> None:
+        self.expires = time.monotonic() + seconds
+
+    @classmethod
+    def from_headers(cls, headers: Mapping[str, str], default: float,
+                     maximum: Optional[float] = None) -> "Deadline":
+        """Budget from ``X-Request-Timeout-Ms``, else ``default``, capped at ``maximum``."""
+        seconds = default
+        raw = headers.get(HEADER) or headers.get(HEADER.lower())
+        if raw:
+            try:
+                seconds = max(0.0, float(raw) / 1000)
+            except ValueError:
+                pass
+        if maximum is not None:
+            seconds = min(seconds, maximum)
+        return cls(seconds)
+
+    @classmethod
+    def from_timeout_ms(cls, timeout_ms: Optional[float], default: float) -> "Deadline":
+        return cls(timeout_ms / 1000 if timeout_ms and timeout_ms > 0 else default)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+    def timeout_ms(self, reserve: float = 0.0) -> int:
+        """Budget to hand to the next hop, keeping ``reserve`` seconds for ourselves."""
+        return int(max(0.0, self.remaining() - reserve) * 1000)
+
+    def header(self, reserve: float = 0.0) -> dict[str, str]:
+        return {HEADER: str(self.timeout_ms(reserve))}
+
+
+class WorkTracker:
+    """Rolling median of completed durations for one hop, used to estimate savings."""
+
+    def __init__(self, hop: str, window: int = 256) -> None:
+        self.hop = hop
+        self._durations = RingSeries(window)
+        self._lock = threading.Lock()
+
+    def typical(self) -> float:
+        with self._lock:
+            median = self._durations.percentile(50)
+        return 0.0 if median != median else median   # NaN until the first completion
+
+    def completed(self, elapsed: float) -> None:
+        with self._lock:
+            self._durations.append(time.time(), elapsed)
+        OUTCOMES.inc(hop=self.hop, outcome="completed")
+
+    def cancelled(self, outcome: str, elapsed: float) -> None:
+        OUTCOMES.inc(hop=self.hop, outcome=outcome)
+        SAVED.inc(max(0.0, self.typical() - elapsed), hop=self.hop)
+
+    def check_arrival(self, deadline: Deadline, minimum: float = 0.0) -> None:
+        """Refuse work whose budget is already spent (or below ``minimum``)."""
+        if deadline.remaining() <= minimum:
+            self.cancelled("expired_on_arrival", 0.0)
+            raise DeadlineExceeded("deadline already passed on arrival")
+
+
+async def run_guarded(
+    fn: Callable[[], Awaitable[T]],
+    deadline: Deadline,
+    tracker: WorkTracker,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    stop: Optional[threading.Event] = None,
+    poll: float = 0.25,
+) -> T:
+    """
+    Await ``fn()`` until it finishes, the deadline passes or
+    ``is_disconnected()`` (e.g. Starlette's ``request.is_disconnected``)
+    turns true. On cancellation ``stop`` is set so that work running in a
+    thread can stop at its next checkpoint, and the matching exception is
+    raised. Cancellation from outside (an MCP ``notifications/cancelled``)
+    sets ``stop`` too and counts as a disconnect.
+    """
+    start = time.perf_counter()
+    result: list[T] = []
+    error: list[Exception] = []
+    reason: list[str] = []
+
+    async def watch(tg: anyio.abc.TaskGroup) -> None:
+        while True:
+            await anyio.sleep(min(poll, deadline.remaining()))
+            if deadline.expired:
+                reason.append("deadline")
+                break
+            if is_disconnected is not None and await is_disconnected():
+                reason.append("disconnect")
+                break
+        if stop is not None:
+            stop.set()
+        tg.cancel_scope.cancel()
+
+    async def work(tg: anyio.abc.TaskGroup) -> None:
+        try:
+            result.append(await fn())
+        except Exception as exc:   # re-raised below, outside the task group
+            error.append(exc)
+        tg.cancel_scope.cancel()
+
+    try:
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(watch, tg)
+            tg.start_soon(work, tg)
+    except anyio.get_cancelled_exc_class():
+        if stop is not None:
+            stop.set()
+        tracker.cancelled("disconnect", time.perf_counter() - start)
+        raise
+
+    elapsed = time.perf_counter() - start
+    if reason:
+        # Checked first: a thread told to stop may still hand back partial output
+        tracker.cancelled(reason[0], elapsed)
+        if reason[0] == "disconnect":
+            raise ClientDisconnected()
+        raise DeadlineExceeded(f"deadline exceeded after {elapsed:.1f}s")
+    if error:
+        raise error[0]
+    tracker.completed(elapsed)
+    return result[0]
+
+
+def collect_stream(chunks: Iterable, stop: threading.Event,
+                   on_chunk: Optional[Callable[[str], None]] = None) -> tuple[str, dict]:
+    """
+    Join a streamed generation, stopping at the next chunk once ``stop`` is
+    set. Closing the generator closes the HTTP stream to watsonx, so the
+    rest of the output is never produced.
+
+    Chunks are text, or ``raw_response=True`` dicts. Returns the text and
+    the usage: ``generated_tokens``, ``input_tokens`` and ``stop_reason``,
+    plus ``cached`` when the model daemon answered from its cache. For
+    plain text chunks, ``generated_tokens`` is the chunk count.
+    ``on_chunk`` is called with each piece of text as it arrives, on the
+    thread that iterates the stream.
+    """
+    parts = []
+    usage: dict = {"generated_tokens": 0, "input_tokens": None, "stop_reason": None}
+    iterator: Iterator = iter(chunks)
+    try:
+        for chunk in iterator:
+            if isinstance(chunk, dict):
+                result = chunk["results"][0]
+                parts.append(result.get("generated_text", ""))
+                usage["generated_tokens"] = max(usage["generated_tokens"],
+                                                result.get("generated_token_count") or 0)
+                usage["input_tokens"] = result.get("input_token_count") or usage["input_tokens"]
+                usage["stop_reason"] = result.get("stop_reason") or usage["stop_reason"]
+                if chunk.get("cached"):
+                    usage["cached"] = True
+            else:
+                parts.append(chunk)
+                usage["generated_tokens"] += 1
+            if on_chunk is not None and parts[-1]:
+                on_chunk(parts[-1])
+            if stop.is_set():
+                break
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+    return "".join(parts), usage
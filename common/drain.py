@@ -0,0 +1,221 @@
+"""
+drain.py – graceful drain on SIGTERM and config reload on SIGHUP
+
+The first SIGTERM or SIGINT puts the process in drain mode instead of
+stopping it:
+
+  1. new work is refused with 503, ``Retry-After`` and ``Connection: close``,
+     and ``/readyz`` fails, so load balancers and the gateway move on;
+  2. after ``DRAIN_NOTICE_SECONDS`` (default 0: time for a load balancer
+     to notice), the process waits for in-flight requests and tracked
+     work to finish, up to ``DRAIN_GRACE_SECONDS`` (default 30) in all;
+  3. then uvicorn shuts down as it would have, waiting at most
+     ``CLOSE_SECONDS`` for what is left (e.g. open SSE streams) before
+     cancelling it.
+
+A second signal skips the wait. Probes and ``/metrics`` keep answering
+while the process drains.
+
+SIGHUP runs the reload hooks registered with ``on_reload``, each in a
+worker thread. A hook builds the new objects (model client, profiles)
+before it swaps them in, so a failed reload keeps the old config. Open
+connections and in-flight generations are not touched. With uvicorn
+``workers`` > 1, send SIGHUP to the supervisor instead: it starts a new
+worker next to each old one, and the old one drains.
+
+``DrainMiddleware`` installs the signal handlers once the app's lifespan
+has started, after uvicorn has installed its own, and chains to them.
+
+Metrics
+───────
+drain_active                 1 while draining
+drain_in_flight              requests and tracked work running now
+drain_rejected_total         requests refused while draining
+config_reloads_total{outcome}
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator
+
+from common import metrics
+
+logger = logging.getLogger("drain")
+
+CLOSE_SECONDS = 5.0     # pass as uvicorn's timeout_graceful_shutdown
+PROBE_PATHS = ("/livez", "/readyz", "/healthz", "/metrics")
+
+ACTIVE = metrics.gauge("drain_active", "1 while the process drains")
+IN_FLIGHT = metrics.gauge("drain_in_flight", "Requests and tracked work running now")
+REJECTED = metrics.counter("drain_rejected_total", "Requests refused while draining")
+RELOADS = metrics.counter("config_reloads_total", "SIGHUP config reloads by outcome", ["outcome"])
+
+
+class Draining(RuntimeError):
+    """The process is draining and takes no new work."""
+
+
+class Drain:
+    """
+    Drain state for one process. Use from the event loop thread. ``grace``
+    and ``notice`` default to ``DRAIN_GRACE_SECONDS`` and
+    ``DRAIN_NOTICE_SECONDS``, read here and again after each reload.
+    """
+
+    def __init__(self, grace: float | None = None, notice: float | None = None) -> None:
+        self._grace, self._notice = grace, notice
+        self._configure()
+        self.draining = False
+        self.started = 0.0
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._reload_hooks: list[Callable[[], None]] = []
+        self._installed = False
+        self._task: asyncio.Task | None = None
+
+    def _configure(self) -> None:
+        self.grace = (self._grace if self._grace is not None
+                      else float(os.getenv("DRAIN_GRACE_SECONDS", "30")))
+        self.notice = (self._notice if self._notice is not None
+                       else float(os.getenv("DRAIN_NOTICE_SECONDS", "0")))
+
+    # ── in-flight work ───────────────────────────────────────────
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Count work the drain waits for; raises ``Draining`` once it has begun."""
+        if self.draining:
+            raise Draining("draining: retry on another instance")
+        self.in_flight += 1
+        self._idle.clear()
+        IN_FLIGHT.set(self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            IN_FLIGHT.set(self.in_flight)
+            if self.in_flight == 0:
+                self._idle.set()
+
+    def status(self) -> dict:
+        return {"draining": self.draining, "in_flight": self.in_flight,
+                "draining_for_s": round(time.time() - self.started, 1) if self.draining else None}
+
+    # ── reload ───────────────────────────────────────────────────
+    def on_reload(self, hook: Callable[[], None]) -> None:
+        """Run ``hook`` (in a worker thread) on SIGHUP."""
+        self._reload_hooks.append(hook)
+
+    async def reload(self) -> bool:
+        ok = True
+        for hook in self._reload_hooks:
+            try:
+                await asyncio.to_thread(hook)
+            except Exception:
+                ok = False
+                logger.exception("Config reload: %s failed, keeping the old config",
+                                 getattr(hook, "__name__", hook))
+        RELOADS.inc(outcome="ok" if ok else "error")
+        if ok:
+            self._configure()       # the hooks have loaded the new .env
+            logger.info("Config reloaded")
+        return ok
+
+    # ── signals ──────────────────────────────────────────────────
+    def install(self) -> None:
+        """Take over SIGTERM/SIGINT (and SIGHUP if there are reload hooks)."""
+        if self._installed or threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(sig)
+            signal.signal(sig, lambda s, f, prev=previous: loop.call_soon_threadsafe(
+                self._on_stop, s, prev))
+        if self._reload_hooks:
+            signal.signal(signal.SIGHUP, lambda s, f: loop.call_soon_threadsafe(
+                lambda: asyncio.ensure_future(self.reload())))
+        self._installed = True
+
+    def _on_stop(self, sig: int, previous) -> None:
+        if self.draining or self.grace <= 0:
+            _chain(sig, previous)
+            return
+        self.draining, self.started = True, time.time()
+        ACTIVE.set(1)
+        logger.info("%s: draining (%d in flight, grace %.0fs)",
+                    signal.Signals(sig).name, self.in_flight, self.grace)
+        self._task = asyncio.ensure_future(self._drain(sig, previous))
+
+    async def _drain(self, sig: int, previous) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.grace
+        await asyncio.sleep(min(self.notice, self.grace))
+        try:
+            await asyncio.wait_for(self._idle.wait(), max(0.0, deadline - loop.time()))
+            logger.info("Drained in %.1fs", time.time() - self.started)
+        except asyncio.TimeoutError:
+            logger.warning("Grace period over with %d still in flight", self.in_flight)
+        _chain(sig, previous)
+
+
+def _chain(sig: int, previous) -> None:
+    """Hand the signal to whoever handled it before (normally uvicorn)."""
+    if callable(previous):
+        previous(sig, None)
+    else:
+        signal.signal(sig, previous)
+        signal.raise_signal(sig)
+
+
+class DrainMiddleware:
+    """
+    ASGI middleware: refuses new requests while draining and counts those in
+    flight. Requests to ``passthrough`` paths (prefixes) are always served
+    and not counted. With ``track=False`` nothing is counted; the app calls
+    ``drain.track()`` around the work it wants finished (e.g. tool calls
+    over long-lived MCP sessions).
+    """
+
+    def __init__(self, app, drain: Drain, passthrough: Iterable[str] = PROBE_PATHS,
+                 track: bool = True) -> None:
+        self.app = app
+        self.drain = drain
+        self.passthrough = tuple(passthrough)
+        self.track = track
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            async def send_started(message) -> None:
+                if message["type"] == "lifespan.startup.complete":
+                    self.drain.install()
+                await send(message)
+            return await self.app(scope, receive, send_started)
+        if scope["type"] not in ("http", "websocket") or scope["path"].startswith(self.passthrough):
+            return await self.app(scope, receive, send)
+        if self.drain.draining:
+            REJECTED.inc()
+            return await _refuse(scope, send)
+        if not self.track:
+            return await self.app(scope, receive, send)
+        with self.drain.track():
+            await self.app(scope, receive, send)
+
+
+async def _refuse(scope, send) -> None:
+    if scope["type"] == "websocket":
+        await send({"type": "websocket.close", "code": 1013})   # try again later
+        return
+    body = json.dumps({"detail": "Draining: retry on another instance"}).encode()
+    await send({"type": "http.response.start", "status": 503,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode()),
+                            (b"retry-after", b"1"), (b"connection", b"close")]})
+    await send({"type": "http.response.body", "body": body})
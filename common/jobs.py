@@ -0,0 +1,348 @@
+"""
+jobs.py – durable background batch jobs over JSONL
+
+A job is an uploaded JSONL file of items (one JSON object per line, each
+with a ``prompt`` and an optional ``id``), worked through in the background
+with bounded concurrency. Everything lives in one directory per job:
+
+    <root>/<job id>/input.jsonl     the items, normalised, ids filled in
+                    results.jsonl   one line per finished item (append-only)
+                    state.json      parameters, status and counters
+                    cancel          created when cancellation is requested
+                    lock            flock()ed by the process running the job
+
+``results.jsonl`` is the checkpoint. After a restart, unfinished jobs are
+picked up again, and items whose id already has a result line are skipped.
+The lock file makes sure only one worker process runs a given job, even
+when several pre-forked workers resume at the same time, and lets a live
+worker adopt the jobs of one that died. Results are also POSTed one by one
+to ``callback_url`` when the job was submitted with one.
+
+Metrics
+───────
+batch_items_total{outcome}        ok | error
+batch_item_seconds                time per item, including retries
+batch_jobs_running                jobs being worked on by this process
+batch_callbacks_total{outcome}    ok | error
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Iterator, Optional
+
+import httpx
+
+from common import metrics
+
+logger = logging.getLogger("jobs")
+
+ITEMS = metrics.counter("batch_items_total", "Batch job items by outcome", ["outcome"])
+ITEM_SECONDS = metrics.histogram("batch_item_seconds", "Time per batch item, including retries")
+RUNNING = metrics.gauge("batch_jobs_running", "Batch jobs being worked on by this process")
+CALLBACKS = metrics.counter("batch_callbacks_total", "Result callbacks by outcome", ["outcome"])
+
+FINISHED = ("done", "cancelled")
+CHECKPOINT_SECONDS = 2.0
+
+
+class InvalidJob(ValueError):
+    """The uploaded file is not a usable JSONL job."""
+
+
+@dataclass
+class Job:
+    id: str
+    total: int
+    params: dict
+    status: str = "queued"              # queued | running | done | cancelled
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    done: int = 0
+    failed: int = 0
+    items_per_s: Optional[float] = None    # over the current run
+    eta_s: Optional[float] = None
+
+    @property
+    def pending(self) -> int:
+        return self.total - self.done - self.failed
+
+
+def _read_jsonl(path: Path) -> Iterator[dict]:
+    if not path.exists():
+        return
+    with path.open(encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                yield json.loads(line)
+            except ValueError:   # a line cut short by a crash
+                continue
+
+
+class JobStore:
+    """Job directories under ``root``. Safe to share between worker processes."""
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _dir(self, job_id: str) -> Path:
+        if not job_id.isalnum():
+            raise KeyError(job_id)
+        return self.root / job_id
+
+    def create(self, data: bytes, params: dict,
+               check: Optional[Callable[[dict], None]] = None) -> Job:
+        """
+        Store a new job. Every item is validated up front; ``check`` may
+        reject an item with a ``ValueError``, which rejects the whole job.
+        """
+        items, ids = [], set()
+        for number, line in enumerate(data.decode("utf-8").splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as exc:
+                raise InvalidJob(f"line {number}: {exc}") from None
+            if not isinstance(item, dict) or not isinstance(item.get("prompt"), str):
+                raise InvalidJob(f'line {number}: expected an object with a "prompt" string')
+            if check is not None:
+                try:
+                    check(item)
+                except ValueError as exc:
+                    raise InvalidJob(f"line {number}: {exc}") from None
+            item["id"] = str(item.get("id", number))
+            if item["id"] in ids:
+                raise InvalidJob(f"line {number}: duplicate id {item['id']!r}")
+            ids.add(item["id"])
+            items.append(item)
+        if not items:
+            raise InvalidJob("no items")
+
+        job = Job(id=uuid.uuid4().hex, total=len(items), params=params)
+        path = self._dir(job.id)
+        path.mkdir()
+        with (path / "input.jsonl").open("w", encoding="utf-8") as fh:
+            fh.writelines(json.dumps(item, ensure_ascii=False) + "\n" for item in items)
+        self.save(job)
+        return job
+
+    def save(self, job: Job) -> None:
+        path = self._dir(job.id)
+        tmp = path / "state.json.tmp"
+        tmp.write_text(json.dumps(asdict(job)), encoding="utf-8")
+        os.replace(tmp, path / "state.json")
+
+    def load(self, job_id: str) -> Job:
+        try:
+            state = json.loads((self._dir(job_id) / "state.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            raise KeyError(job_id) from None
+        return Job(**state)
+
+    def list(self) -> list[Job]:
+        jobs = []
+        for path in self.root.iterdir():
+            try:
+                jobs.append(self.load(path.name))
+            except KeyError:
+                continue
+        return sorted(jobs, key=lambda j: j.created, reverse=True)
+
+    def items(self, job_id: str) -> Iterator[dict]:
+        return _read_jsonl(self._dir(job_id) / "input.jsonl")
+
+    def results_path(self, job_id: str) -> Path:
+        return self._dir(job_id) / "results.jsonl"
+
+    def request_cancel(self, job_id: str) -> None:
+        (self._dir(job_id) / "cancel").touch()
+
+    def cancel_requested(self, job_id: str) -> bool:
+        return (self._dir(job_id) / "cancel").exists()
+
+    def try_lock(self, job_id: str) -> Optional[int]:
+        """An exclusive, process-held lock on the job, or None if another process has it."""
+        fd = os.open(self._dir(job_id) / "lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+
+class JobRunner:
+    """Runs jobs from a ``JobStore`` in this process's event loop."""
+
+    def __init__(self, store: JobStore,
+                 process: Callable[[dict, Job], Awaitable[dict]],
+                 http: Optional[httpx.AsyncClient] = None, retries: int = 2) -> None:
+        self.store = store
+        self.process = process
+        self.http = http
+        self.retries = retries
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def submit(self, job: Job) -> bool:
+        """Start the job here unless it is finished or another process runs it."""
+        if job.status in FINISHED or job.id in self._tasks:
+            return False
+        fd = self.store.try_lock(job.id)
+        if fd is None:
+            return False
+        self._tasks[job.id] = asyncio.create_task(self._run(job.id, fd))
+        return True
+
+    def resume_all(self) -> int:
+        resumed = sum(self.submit(job) for job in self.store.list())
+        if resumed:
+            logger.info("Resumed %d unfinished batch job(s)", resumed)
+        return resumed
+
+    async def adopt(self, interval: float) -> None:
+        """Keep picking up unfinished jobs, e.g. those of a worker that died."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.resume_all()
+            except OSError:
+                logger.exception("Scanning %s for jobs failed", self.store.root)
+
+    def cancel(self, job_id: str) -> Job:
+        """Ask whichever process runs the job to stop after its in-flight items."""
+        self.store.request_cancel(job_id)
+        job = self.store.load(job_id)
+        if job.status not in FINISHED and job_id not in self._tasks:
+            fd = self.store.try_lock(job_id)
+            if fd is not None:      # nobody is running it: settle it here
+                job.status, job.finished = "cancelled", time.time()
+                self.store.save(job)
+                os.close(fd)
+        return job
+
+    async def shutdown(self) -> None:
+        """Stop working; jobs stay 'running' on disk and resume on the next start."""
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def _process(self, item: dict, job: Job) -> dict:
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                output = await self.process(item, job)
+                record = {"id": item["id"], **output}
+                break
+            except Exception as exc:
+                if attempt == self.retries:
+                    record = {"id": item["id"], "error": f"{exc.__class__.__name__}: {exc}"[:500]}
+                else:
+                    await asyncio.sleep(2 ** attempt)
+        record["seconds"] = round(time.perf_counter() - start, 3)
+        ITEM_SECONDS.observe(record["seconds"])
+        return record
+
+    async def _callback(self, url: str, record: dict) -> None:
+        try:
+            resp = await self.http.post(url, json=record, timeout=30)
+            resp.raise_for_status()
+            CALLBACKS.inc(outcome="ok")
+        except httpx.HTTPError as exc:
+            CALLBACKS.inc(outcome="error")
+            logger.warning("Result callback to %s failed: %s", url, exc)
+
+    async def _run(self, job_id: str, lock_fd: int) -> None:
+        job = self.store.load(job_id)
+        if job.status in FINISHED:      # finished elsewhere after we listed it
+            self._tasks.pop(job_id, None)
+            os.close(lock_fd)
+            return
+        results = self.store.results_path(job_id)
+        finished_ids: set[str] = set()
+        job.done = job.failed = 0
+        for record in _read_jsonl(results):
+            finished_ids.add(record["id"])
+            if "error" in record:
+                job.failed += 1
+            else:
+                job.done += 1
+        if results.exists():
+            # drop a partial last line, so the next append starts a fresh line
+            raw = results.read_bytes()
+            if raw and not raw.endswith(b"\n"):
+                with results.open("r+b") as fh:
+                    fh.truncate(raw.rfind(b"\n") + 1)
+
+        pending = asyncio.Queue()
+        for item in self.store.items(job_id):
+            if item["id"] not in finished_ids:
+                pending.put_nowait(item)
+
+        job.status = "running"
+        job.started = job.started or time.time()
+        run_start, run_count, last_checkpoint = time.monotonic(), 0, 0.0
+        callback = job.params.get("callback_url")
+        RUNNING.inc()
+        self.store.save(job)
+        logger.info("Batch job %s: %d of %d items to go", job_id, pending.qsize(), job.total)
+
+        def checkpoint(force: bool = False) -> None:
+            nonlocal last_checkpoint
+            now = time.monotonic()
+            if not force and now - last_checkpoint < CHECKPOINT_SECONDS:
+                return
+            out.flush()
+            os.fsync(out.fileno())
+            elapsed = now - run_start
+            job.items_per_s = round(run_count / elapsed, 3) if elapsed and run_count else None
+            job.eta_s = round(job.pending / job.items_per_s, 1) if job.items_per_s else None
+            self.store.save(job)
+            last_checkpoint = now
+
+        async def worker() -> None:
+            nonlocal run_count
+            while not pending.empty():
+                if self.store.cancel_requested(job_id):
+                    return
+                item = pending.get_nowait()
+                record = await self._process(item, job)
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                run_count += 1
+                if "error" in record:
+                    job.failed += 1
+                    ITEMS.inc(outcome="error")
+                else:
+                    job.done += 1
+                    ITEMS.inc(outcome="ok")
+                checkpoint()
+                if callback and self.http is not None:
+                    await self._callback(callback, record)
+
+        try:
+            with results.open("a", encoding="utf-8") as out:
+                concurrency = max(1, int(job.params.get("concurrency", 1)))
+                await asyncio.gather(*(worker() for _ in range(concurrency)))
+                job.status = "cancelled" if self.store.cancel_requested(job_id) else "done"
+                job.finished = time.time()
+                checkpoint(force=True)
+                logger.info("Batch job %s %s: %d ok, %d failed", job_id, job.status,
+                            job.done, job.failed)
+        except asyncio.CancelledError:
+            self.store.save(job)      # still "running": picked up again on restart
+            raise
+        finally:
+            RUNNING.inc(-1)
+            self._tasks.pop(job_id, None)
+            os.close(lock_fd)
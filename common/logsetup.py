@@ -0,0 +1,204 @@
+"""
+logsetup.py – logging configuration for the agents and frontends
+
+``configure_logging()`` is a drop-in for ``logging.basicConfig()``. By
+default it behaves the same. With ``LOG_MODE=async`` the request path only
+truncates, samples and enqueues records. A background thread formats them
+(JSON by default) and does the I/O.
+
+Environment
+───────────
+LOG_MODE         sync (default) | async
+LOG_LEVEL        overrides the level passed by the caller
+LOG_FORMAT       text | json (default: text for sync, json for async)
+LOG_MAX_CHARS    cap for every string argument and message (0 = no cap;
+                 default 0 for sync, 256 for async)
+LOG_SAMPLE_RPS   INFO/DEBUG records per second kept in full (0 = keep all;
+                 default 0 for sync, 50 for async)
+LOG_SAMPLE_RATE  share of INFO/DEBUG records kept above that rate (0.01)
+LOG_QUEUE_SIZE   records buffered for the writer before new ones are dropped
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def _shorten(value: str, limit: int) -> str:
+    if len(value) <= limit:
+        return value
+    return f"{value[:limit]}…(+{len(value) - limit} chars)"
+
+
+class TruncateFilter(logging.Filter):
+    """Cap string arguments before formatting, then the message itself."""
+
+    def __init__(self, max_chars: int) -> None:
+        super().__init__()
+        self.max_chars = max_chars
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        limit = self.max_chars
+        if isinstance(record.args, tuple):
+            record.args = tuple(
+                _shorten(a, limit) if isinstance(a, str) else a for a in record.args
+            )
+        elif isinstance(record.args, dict):
+            record.args = {
+                k: _shorten(v, limit) if isinstance(v, str) else v
+                for k, v in record.args.items()
+            }
+        if isinstance(record.msg, str):
+            record.msg = _shorten(record.msg, limit * 2)
+        return True
+
+
+class RateSampler(logging.Filter):
+    """
+    Keep every WARNING and above. Keep the first ``per_second`` INFO/DEBUG
+    records of each second, then only a random ``rate`` share of the rest.
+    Dropped records are counted in ``dropped``.
+    """
+
+    def __init__(self, per_second: float, rate: float) -> None:
+        super().__init__()
+        self.per_second = per_second
+        self.rate = rate
+        self.dropped = 0
+        self._window = 0
+        self._count = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        now = int(time.monotonic())
+        if now != self._window:
+            self._window, self._count = now, 0
+        self._count += 1
+        if self._count <= self.per_second or random.random() < self.rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra=`` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: a full queue drops the record."""
+
+    def __init__(self, q: queue.Queue) -> None:
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args into msg here and leave formatting to the writer thread.
+        # The record is only ever seen by this handler, so no copy is needed.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+
+def _env(name: str, default: str) -> str:
+    return os.getenv(name) or default
+
+
+def configure_logging(
+    level: int | str = logging.INFO,
+    format: str = "%(asctime)s [%(levelname)s] %(message)s",
+    datefmt: Optional[str] = None,
+    stream=None,
+) -> logging.Handler:
+    """
+    Configure the root logger like ``basicConfig`` and return the installed
+    handler. Safe to call more than once; later calls replace the setup.
+    """
+    global _listener
+    mode = _env("LOG_MODE", "sync").lower()
+    is_async = mode == "async"
+    level = (os.getenv("LOG_LEVEL") or level)
+    if isinstance(level, str):
+        level = level.upper()
+    fmt_kind = _env("LOG_FORMAT", "json" if is_async else "text").lower()
+    max_chars = int(_env("LOG_MAX_CHARS", "256" if is_async else "0"))
+    sample_rps = float(_env("LOG_SAMPLE_RPS", "50" if is_async else "0"))
+    sample_rate = float(_env("LOG_SAMPLE_RATE", "0.01"))
+
+    formatter = JsonFormatter() if fmt_kind == "json" else logging.Formatter(format, datefmt)
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(formatter)
+
+    with _lock:
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+        if is_async:
+            q: queue.Queue = queue.Queue(int(_env("LOG_QUEUE_SIZE", "10000")))
+            front: logging.Handler = DroppingQueueHandler(q)
+            _listener = logging.handlers.QueueListener(q, writer, respect_handler_level=False)
+            _listener.start()
+        else:
+            front = writer
+
+        # Sampling first so dropped records are never truncated or formatted
+        if sample_rps > 0:
+            front.addFilter(RateSampler(sample_rps, sample_rate))
+        if max_chars > 0:
+            front.addFilter(TruncateFilter(max_chars))
+
+        root.addHandler(front)
+        root.setLevel(level)
+    return front
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    if _listener is not None:
+        _listener.stop()
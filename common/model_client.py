@@ -0,0 +1,131 @@
+"""
+model_client.py – the watsonx model an agent generates with, local or shared
+
+``model_client(model_id, url, api_key, project_id)`` returns either
+
+• a ``ModelInference`` with this process's own credentials and connection
+  pool (the default), or
+• a ``DaemonModel`` when ``MODEL_DAEMON_SOCKET`` is set. This is a thin
+  client of the host's model daemon (``agents/watsonx-agent/model_daemon.py``),
+  which owns the watsonx SDK, the IAM token, the HTTP connection pool and
+  the reply cache for every agent on the host. The agent process then
+  never imports the SDK.
+
+``DaemonModel`` implements the two ``ModelInference`` methods the agents
+call, ``generate_text`` and ``generate_text_stream``, with the same
+arguments and return shapes. Closing a stream closes the connection, and
+the daemon stops the generation unless another caller is waiting for the
+same reply.
+
+Wire protocol: one request per connection on the Unix socket, one JSON
+object per line in both directions.
+
+    → {"op": "generate", "model_id": ..., "prompt": ..., "params": {...}}
+    ← {"text": "..."}                  zero or more, as they are generated
+    ← {"done": true, "usage": {...}, "cached": false}
+      or {"error": "...", "type": "..."}
+
+    → {"op": "open", "model_id": ...}  ← {"ok": true} once the model is ready
+    → {"op": "stats"}                  ← counters, cache hit rate, memory
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+from typing import Iterator, Optional
+
+from common.deadline import collect_stream
+
+DAEMON_TIMEOUT = float(os.getenv("MODEL_DAEMON_TIMEOUT", "300"))   # per read
+
+
+class DaemonError(RuntimeError):
+    """The model daemon is unreachable or reported an error."""
+
+
+def daemon_request(path: str, request: dict, timeout: float = DAEMON_TIMEOUT) -> Iterator[dict]:
+    """Send one request and yield the reply lines. Closing the iterator hangs up."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(path)
+        except OSError as exc:
+            raise DaemonError(f"model daemon at {path} is not reachable: {exc}") from None
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile("rb") as replies:
+            for line in replies:
+                message = json.loads(line)
+                if "error" in message:
+                    raise DaemonError(f"{message.get('type', 'Error')}: {message['error']}")
+                yield message
+    finally:
+        sock.close()
+
+
+class DaemonModel:
+    """Stand-in for ``ModelInference`` that generates through the model daemon."""
+
+    def __init__(self, model_id: str, path: Optional[str] = None) -> None:
+        self.model_id = model_id
+        self.path = path or os.environ["MODEL_DAEMON_SOCKET"]
+        # fail at start-up, like ModelInference, if the daemon cannot serve this model
+        for _ in daemon_request(self.path, {"op": "open", "model_id": model_id}):
+            pass
+
+    def stats(self) -> dict:
+        replies = daemon_request(self.path, {"op": "stats"}, timeout=10)
+        try:
+            return next(replies)
+        finally:
+            replies.close()
+
+    def generate_text_stream(self, prompt: str, params: Optional[dict] = None,
+                             raw_response: bool = False, **_) -> Iterator:
+        replies = daemon_request(self.path, {"op": "generate", "model_id": self.model_id,
+                                             "prompt": prompt, "params": params or {}})
+        try:
+            for message in replies:
+                if "text" in message:
+                    if raw_response:
+                        yield {"model_id": self.model_id,
+                               "results": [{"generated_text": message["text"]}]}
+                    else:
+                        yield message["text"]
+                elif message.get("done"):
+                    if raw_response:   # the totals, as watsonx reports them on its last chunk
+                        usage = message.get("usage") or {}
+                        yield {"model_id": self.model_id, "cached": message.get("cached", False),
+                               "results": [{"generated_text": "",
+                                            "generated_token_count": usage.get("generated_tokens"),
+                                            "input_token_count": usage.get("input_tokens"),
+                                            "stop_reason": usage.get("stop_reason")}]}
+                    return
+        finally:
+            replies.close()
+
+    def generate_text(self, prompt: str, params: Optional[dict] = None,
+                      raw_response: bool = False, **_):
+        text, usage = collect_stream(
+            self.generate_text_stream(prompt, params, raw_response=True), threading.Event())
+        if not raw_response:
+            return text
+        return {"model_id": self.model_id, "cached": usage.get("cached", False),
+                "results": [{"generated_text": text,
+                             "generated_token_count": usage["generated_tokens"],
+                             "input_token_count": usage["input_tokens"],
+                             "stop_reason": usage["stop_reason"]}]}
+
+
+def model_client(model_id: str, url: Optional[str], api_key: Optional[str],
+                 project_id: Optional[str]):
+    """A ``DaemonModel`` if ``MODEL_DAEMON_SOCKET`` is set, else a local ``ModelInference``."""
+    if os.getenv("MODEL_DAEMON_SOCKET"):
+        return DaemonModel(model_id)
+    from ibm_watsonx_ai.foundation_models import ModelInference
+
+    from common.credentials import api_client
+    return ModelInference(model_id=model_id, api_client=api_client(url, api_key, project_id))
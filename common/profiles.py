@@ -0,0 +1,133 @@
+"""
+profiles.py – named generation profiles for the watsonx agents
+
+A profile is a named, prebuilt set of watsonx generation parameters plus
+the latency it is meant for (``slo_ms``). The set is read once from
+``GENERATION_PROFILES_PATH`` (JSON, or YAML when PyYAML is installed), or
+from the bundled ``generation_profiles.json``. Parameter keys are the
+string values of ``GenTextParamsMetaNames``, e.g. ``max_new_tokens``.
+
+Choosing a profile for a request (``ProfileSet.select``)
+  1. an explicit profile name wins;
+  2. otherwise an SLO hint picks the richest profile whose ``slo_ms`` fits
+     it, or the fastest profile if none fits;
+  3. otherwise the agent's default, downgraded in the same way if the
+     request's remaining time budget is shorter than its ``slo_ms``.
+
+Every generation is recorded per profile:
+``generation_seconds{profile}``, ``generated_tokens{profile}`` and
+``generation_requests_total{profile,outcome}``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from common import metrics
+
+BUNDLED_PROFILES = Path(__file__).with_name("generation_profiles.json")
+
+LATENCY = metrics.histogram("generation_seconds", "Generation latency per profile", ["profile"])
+TOKENS = metrics.histogram("generated_tokens", "Generated tokens per request and profile",
+                           ["profile"], buckets=(8, 16, 32, 64, 128, 256, 512, 1024, 2048))
+REQUESTS = metrics.counter("generation_requests_total",
+                           "Generations per profile and outcome", ["profile", "outcome"])
+
+
+class UnknownProfile(ValueError):
+    """The request named a profile that is not configured."""
+
+
+@dataclass(frozen=True)
+class Profile:
+    name: str
+    params: dict[str, object]         # shared by every call: never mutate
+    slo_ms: float
+    description: str = ""
+    tag: str = ""                     # digest of the params, for cache keys
+
+    def observe(self, seconds: float, tokens: Optional[int], outcome: str = "ok") -> None:
+        REQUESTS.inc(profile=self.name, outcome=outcome)
+        if outcome == "ok":
+            LATENCY.observe(seconds, profile=self.name)
+            if tokens is not None:
+                TOKENS.observe(tokens, profile=self.name)
+
+
+def _read(path: Path) -> dict:
+    text = path.read_text(encoding="utf-8")
+    if path.suffix in (".yaml", ".yml"):
+        import yaml  # optional dependency, only for YAML profile files
+        return yaml.safe_load(text)
+    return json.loads(text)
+
+
+def _build(name: str, spec: dict) -> Profile:
+    params = dict(spec["params"])
+    tag = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+    return Profile(name=name, params=params, slo_ms=float(spec["slo_ms"]),
+                   description=spec.get("description", ""), tag=f"{name}:{tag}")
+
+
+class ProfileSet:
+    """Profiles built once at start-up. Lookups are dictionary reads."""
+
+    def __init__(self, profiles: dict[str, Profile], default: str) -> None:
+        self._set(profiles, default)
+        self._fallback = default
+
+    def _set(self, profiles: dict[str, Profile], default: str) -> None:
+        if default not in profiles:
+            raise UnknownProfile(f"default profile {default!r} is not configured "
+                                 f"(have: {', '.join(profiles)})")
+        # fastest first, so selection is a short scan
+        by_slo = sorted(profiles.values(), key=lambda p: p.slo_ms)
+        self.profiles, self.default, self._by_slo = profiles, profiles[default], by_slo
+
+    @staticmethod
+    def _read_specs(default: str, path: Optional[str]) -> tuple[dict[str, Profile], str]:
+        source = Path(path or os.getenv("GENERATION_PROFILES_PATH") or BUNDLED_PROFILES)
+        specs = _read(source)
+        return ({name: _build(name, spec) for name, spec in specs.items()},
+                os.getenv("GENERATION_PROFILE") or default)
+
+    @classmethod
+    def load(cls, default: str, path: Optional[str] = None) -> "ProfileSet":
+        """``path`` or ``GENERATION_PROFILES_PATH``; default name from ``GENERATION_PROFILE``."""
+        profiles = cls(*cls._read_specs(default, path))
+        profiles._fallback = default
+        return profiles
+
+    def reload(self, path: Optional[str] = None) -> None:
+        """
+        Read the profiles again (e.g. on SIGHUP) and swap them in. Raises,
+        keeping the current set, if the file is invalid. Calls already
+        running keep the profile they selected.
+        """
+        self._set(*self._read_specs(self._fallback, path))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.profiles
+
+    def _fitting(self, budget_ms: float) -> Profile:
+        fitting = [p for p in self._by_slo if p.slo_ms <= budget_ms]
+        return fitting[-1] if fitting else self._by_slo[0]
+
+    def select(self, name: Optional[str] = None, slo_ms: Optional[float] = None,
+               budget_ms: Optional[float] = None) -> Profile:
+        if name:
+            try:
+                return self.profiles[name]
+            except KeyError:
+                raise UnknownProfile(f"unknown profile {name!r} "
+                                     f"(have: {', '.join(self.profiles)})") from None
+        if slo_ms:
+            return self._fitting(slo_ms)
+        if budget_ms and self.default.slo_ms > budget_ms:
+            return self._fitting(budget_ms)
+        return self.default
@@ -0,0 +1,280 @@
+"""
+profiling.py – on-demand sampling profiler for the FastAPI services
+
+Nothing runs until an admin turns it on. While off, the only cost is one
+attribute check per request in ``ProfilingMiddleware``.
+
+Once started, a daemon thread samples the stacks of every Python thread
+in the process every ``interval_ms`` (``sys._current_frames``, no tracing
+hooks). It counts them in the collapsed ("folded") format that
+flamegraph.pl, speedscope and Pyroscope read:
+
+    thread:MainThread;run (base_events.py:600);call_tool (main.py:396) 42
+
+These are wall-clock samples: a thread waiting on watsonx or in
+``select()`` shows up where it waits, which is usually where the latency
+is. At the same time a task on the event loop measures loop lag, i.e. how
+late a short sleep wakes up, which shows blocking calls on the loop.
+
+Two modes:
+  window     sample for ``seconds``, whatever the process is doing;
+  requests   sample only while one of a random ``sample`` share of requests
+             is in flight (stops after ``seconds`` too).
+
+Admin endpoints (``admin_router``), authenticated with
+``Authorization: Bearer $ADMIN_TOKEN`` and absent when it is unset:
+
+    POST   /admin/profile?seconds=30&interval_ms=5&sample=0.1   start
+    GET    /admin/profile                                        status, lag summary
+    GET    /admin/profile/stacks                                 folded stacks (download)
+    GET    /admin/profile/lag                                    lag samples as CSV
+    DELETE /admin/profile                                        stop early
+
+Profiling is per process: with pre-forked workers, the request reaches
+one of them.
+
+Metrics
+───────
+profiler_event_loop_lag_seconds    loop lag, recorded while a profile runs
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+import math
+import os
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from common import metrics
+from common.timeseries import RingSeries
+
+MAX_STACKS = 20000              # distinct stacks kept; the rest count as "[truncated]"
+LAG_INTERVAL = 0.05
+
+LAG = metrics.histogram("profiler_event_loop_lag_seconds",
+                        "Event loop lag, measured while a profile runs",
+                        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+
+
+class ProfilerBusy(Exception):
+    """A profile is already running."""
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({Path(code.co_filename).name}:{frame.f_lineno})"
+
+
+def _fold(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Profiler:
+    """One profile at a time per process. Start and stop from the event loop."""
+
+    def __init__(self) -> None:
+        self.active = False             # read by the middleware on every request
+        self.sample = 1.0               # share of requests profiled; 1.0 = window mode
+        self.interval = 0.005
+        self.started = self.ends = self.stopped = 0.0
+        self.samples = 0
+        self.stacks: dict[str, int] = {}
+        self.lag = RingSeries(1)
+        self._in_flight = 0             # sampled requests of this run running now
+        self._run_id = 0                # which run a sampled request belongs to
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lag_task: Optional[asyncio.Task] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    # ── control ──────────────────────────────────────────────────
+    def start(self, seconds: float, interval_ms: float = 5.0, sample: float = 1.0) -> dict:
+        if self.active:
+            raise ProfilerBusy(f"a profile is running until {self.ends:.0f}")
+        # read per profile: the apps import this module before loading .env
+        seconds = min(max(seconds, 0.1), float(os.getenv("PROFILE_MAX_SECONDS", "300")))
+        self.sample = min(max(sample, 0.0), 1.0)
+        self.interval = max(interval_ms, 1.0) / 1000
+        self.stacks, self.samples, self._in_flight = {}, 0, 0
+        self._run_id += 1
+        self.lag = RingSeries(int(seconds / LAG_INTERVAL) + 16)
+        self.started, self.ends, self.stopped = time.time(), time.time() + seconds, 0.0
+        self._stop = threading.Event()
+        self.active = True
+        self._thread = threading.Thread(target=self._run, args=(self._stop,),
+                                        name="profiler", daemon=True)
+        self._thread.start()
+        loop = asyncio.get_running_loop()
+        self._lag_task = loop.create_task(self._watch_lag())
+        self._timer = loop.call_later(seconds, self.stop)
+        return self.status()
+
+    def stop(self) -> dict:
+        if self.active:
+            self.active = False
+            self.stopped = time.time()
+            self._stop.set()
+            for handle in (self._lag_task, self._timer):
+                if handle is not None:
+                    handle.cancel()
+        return self.status()
+
+    # ── per-request sampling ─────────────────────────────────────
+    def begin_request(self) -> Optional[int]:
+        """
+        Decide whether this request is profiled. If so, returns the run it
+        belongs to, to be handed to ``end_request``.
+        """
+        if self.sample < 1.0 and random.random() < self.sample:
+            self._in_flight += 1
+            return self._run_id
+        return None
+
+    def end_request(self, run: int) -> None:
+        # a request of an earlier run was counted in that run, not this one
+        if run == self._run_id:
+            self._in_flight = max(self._in_flight - 1, 0)
+
+    # ── sampling ─────────────────────────────────────────────────
+    def _record(self, stack: str) -> None:
+        if stack not in self.stacks and len(self.stacks) >= MAX_STACKS:
+            stack = "[truncated]"
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def _run(self, stop: threading.Event) -> None:
+        own = threading.get_ident()
+        while not stop.wait(self.interval):
+            if self.sample < 1.0 and self._in_flight <= 0:
+                continue
+            names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident != own:
+                        self._record(f"thread:{names.get(ident, ident)};{_fold(frame)}")
+                self.samples += 1
+            del frames
+
+    async def _watch_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            before = loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            lag = max(0.0, loop.time() - before - LAG_INTERVAL)
+            self.lag.append(time.time(), lag)
+            LAG.observe(lag)
+
+    # ── results ──────────────────────────────────────────────────
+    def folded(self) -> str:
+        with self._lock:
+            counts = sorted(self.stacks.items(), key=lambda kv: kv[1], reverse=True)
+        return "".join(f"{stack} {count}\n" for stack, count in counts)
+
+    def lag_csv(self) -> str:
+        return "timestamp,lag_ms\n" + "".join(
+            f"{ts:.3f},{lag * 1000:.3f}\n" for ts, lag in self.lag.items())
+
+    def status(self) -> dict:
+        def ms(value: float) -> Optional[float]:
+            return None if math.isnan(value) else round(value * 1000, 2)
+        lags = [v for _, v in self.lag.items()]
+        return {
+            "active": self.active,
+            "mode": "window" if self.sample >= 1.0 else "requests",
+            "sample": self.sample,
+            "interval_ms": round(self.interval * 1000, 3),
+            "started": self.started or None,
+            "ends": self.ends if self.active else None,
+            "stopped": self.stopped or None,
+            "samples": self.samples,
+            "distinct_stacks": len(self.stacks),
+            "event_loop_lag_ms": {
+                "count": len(lags),
+                "p50": ms(self.lag.percentile(50)),
+                "p99": ms(self.lag.percentile(99)),
+                "max": ms(max(lags)) if lags else None,
+            },
+        }
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware for request-sampled profiles; a single check while idle."""
+
+    def __init__(self, app, profiler: Profiler = profiler) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send) -> None:
+        run = (self.profiler.begin_request()
+               if self.profiler.active and scope["type"] == "http" else None)
+        if run is None:
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.end_request(run)
+
+
+def admin_router(profiler: Profiler = profiler,
+                 token: Optional[str] = None) -> Optional[APIRouter]:
+    """The ``/admin/profile`` endpoints, or None when no admin token (``ADMIN_TOKEN``) is set."""
+    token = token or os.getenv("ADMIN_TOKEN")
+    if not token:
+        return None
+
+    def authorized(request: Request) -> None:
+        scheme, _, given = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(given.encode(), token.encode()):
+            raise HTTPException(status_code=401, detail="Admin token required",
+                                headers={"WWW-Authenticate": "Bearer"})
+
+    router = APIRouter(prefix="/admin/profile", dependencies=[Depends(authorized)],
+                       include_in_schema=False)
+
+    def download(body: str, name: str) -> PlainTextResponse:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(profiler.started or time.time()))
+        return PlainTextResponse(body, headers={
+            "Content-Disposition": f'attachment; filename="profile-{os.getpid()}-{stamp}.{name}"'})
+
+    @router.post("")
+    async def start(seconds: float = 30.0, interval_ms: float = 5.0, sample: float = 1.0) -> dict:
+        try:
+            return profiler.start(seconds, interval_ms, sample)
+        except ProfilerBusy as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+
+    @router.get("")
+    async def status() -> dict:
+        return profiler.status()
+
+    @router.delete("")
+    async def stop() -> dict:
+        return profiler.stop()
+
+    @router.get("/stacks")
+    async def stacks() -> PlainTextResponse:
+        return download(profiler.folded(), "folded")
+
+    @router.get("/lag")
+    async def lag() -> PlainTextResponse:
+        return download(profiler.lag_csv(), "lag.csv")
+
+    return router
@@ -0,0 +1,232 @@
+"""
+prompt_limit.py – bound prompt size in tokens before anything is sent
+
+Every prompt is counted before it reaches the gateway or watsonx, and
+prompts over the limit are handled by the ``PROMPT_OVERFLOW`` policy:
+
+  truncate    (default) keep the first third and the last two thirds of
+              the budget, with ``[…]`` in between: the instructions and
+              the question usually survive;
+  reject      raise ``PromptTooLong`` (413 over HTTP, a tool error over MCP);
+  summarize   keep the first and last sentences, then the sentences
+              that carry the most frequent words, in their original order,
+              up to the budget. This is an extractive summary computed
+              locally, so it costs no model call.
+
+The limit is ``PROMPT_MAX_TOKENS`` (default 4096, 0 = off). It is lowered
+to ``MODEL_CONTEXT_TOKENS`` minus the call's ``max_new_tokens`` when the
+context size is set.
+
+Counting uses the Hugging Face ``tokenizers`` library when
+``PROMPT_TOKENIZER`` points at a ``tokenizer.json`` (optional dependency).
+Otherwise it uses a fast estimate: word pieces and punctuation, scaled by
+a factor that starts conservative and is calibrated from the
+``input_token_count`` watsonx reports (``observe``). The text is counted
+in blocks of about 1 KiB cut at whitespace, and each block's count is kept
+in an LRU cache. Prompts built on the same template or conversation prefix
+therefore only count their new blocks.
+
+Metrics
+───────
+prompt_tokens                   counted prompt size, before enforcement
+prompt_limit_total{action}      ok | truncated | summarized | rejected
+prompt_token_cache_total{result}  hit | miss (blocks)
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import re
+import threading
+from collections import Counter as Frequencies, OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from common import metrics
+
+TOKENS = metrics.histogram("prompt_tokens", "Prompt size in tokens, before enforcement",
+                           buckets=(32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768))
+ACTIONS = metrics.counter("prompt_limit_total", "Prompts by enforcement action", ["action"])
+CACHE = metrics.counter("prompt_token_cache_total", "Token-count cache lookups per block",
+                        ["result"])
+
+POLICIES = ("truncate", "reject", "summarize")
+MARKER = "\n[…]\n"
+BLOCK_CHARS = 1024
+_PIECES = re.compile(r"\w+|[^\w\s]")
+_SENTENCES = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORDS = re.compile(r"\w{3,}")
+
+
+class PromptTooLong(ValueError):
+    """The prompt is over the token limit and the policy is ``reject``."""
+
+
+def _blocks(text: str, size: int = BLOCK_CHARS) -> list[str]:
+    """``text`` in pieces of about ``size`` characters, each ending after whitespace."""
+    blocks, start = [], 0
+    while len(text) - start > size:
+        cut = text.rfind(" ", start + size // 2, start + size)
+        cut = start + size if cut < 0 else cut + 1
+        blocks.append(text[start:cut])
+        start = cut
+    blocks.append(text[start:])
+    return blocks
+
+
+class TokenCounter:
+    """Token counts per block, from a tokenizer or an estimate, with an LRU cache."""
+
+    def __init__(self, tokenizer_path: Optional[str] = None, cache_entries: int = 4096) -> None:
+        self.tokenizer = None
+        if tokenizer_path:
+            from tokenizers import Tokenizer  # optional dependency, only with PROMPT_TOKENIZER
+            self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.kind = "tokenizer" if self.tokenizer is not None else "estimate"
+        # estimate → tokens; starts high so that an uncalibrated count errs long
+        self.scale = 1.0 if self.tokenizer is not None else 1.25
+        self.cache_entries = cache_entries
+        self._cache: OrderedDict[int, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _count_block(self, block: str) -> int:
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(block, add_special_tokens=False).ids)
+        # about one token per short word or symbol, one more per 6 letters beyond that
+        return sum(1 + (len(p) - 1) // 6 for p in _PIECES.findall(block))
+
+    def raw(self, text: str) -> int:
+        """Unscaled count, summed over cached blocks."""
+        total = 0
+        for block in _blocks(text):
+            key = hash(block)
+            with self._lock:
+                count = self._cache.get(key)
+                if count is not None:
+                    self._cache.move_to_end(key)
+            if count is None:
+                CACHE.inc(result="miss")
+                count = self._count_block(block)
+                with self._lock:
+                    self._cache[key] = count
+                    if len(self._cache) > self.cache_entries:
+                        self._cache.popitem(last=False)
+            else:
+                CACHE.inc(result="hit")
+            total += count
+        return total
+
+    def count(self, text: str) -> int:
+        return math.ceil(self.raw(text) * self.scale)
+
+    def calibrate(self, raw: int, actual: int) -> None:
+        """Move the estimate's scale toward what watsonx counted (no-op with a tokenizer)."""
+        if self.tokenizer is None and raw > 0 and actual > 0:
+            ratio = min(max(actual / raw, 0.5), 3.0)
+            # follow the observed ratio slowly, and keep 5 % in hand
+            self.scale = 0.9 * self.scale + 0.1 * ratio * 1.05
+
+
+@dataclass
+class Checked:
+    prompt: str
+    tokens: int           # of the prompt as it was given
+    action: str           # ok | truncated | summarized
+    raw: int = 0          # unscaled count, for ``PromptLimit.observe``
+
+
+class PromptLimit:
+    """The ``PROMPT_*`` policy for one process."""
+
+    def __init__(self, counter: TokenCounter, max_tokens: int, policy: str = "truncate",
+                 context_tokens: int = 0) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"PROMPT_OVERFLOW must be one of {', '.join(POLICIES)}, got {policy!r}")
+        self.counter = counter
+        self.max_tokens = max_tokens
+        self.policy = policy
+        self.context_tokens = context_tokens
+
+    @classmethod
+    def from_env(cls) -> "PromptLimit":
+        return cls(TokenCounter(os.getenv("PROMPT_TOKENIZER"),
+                                int(os.getenv("PROMPT_TOKEN_CACHE_ENTRIES", "4096"))),
+                   max_tokens=int(os.getenv("PROMPT_MAX_TOKENS", "4096")),
+                   policy=os.getenv("PROMPT_OVERFLOW", "truncate"),
+                   context_tokens=int(os.getenv("MODEL_CONTEXT_TOKENS", "0")))
+
+    def limit(self, max_new_tokens: int = 0) -> int:
+        """The prompt budget for a call; 0 = unlimited."""
+        limit = self.max_tokens
+        if self.context_tokens:
+            room = max(self.context_tokens - max_new_tokens, 1)
+            limit = min(limit, room) if limit else room
+        return limit
+
+    def apply(self, prompt: str, max_new_tokens: int = 0) -> Checked:
+        """Count ``prompt`` and enforce the policy. Raises ``PromptTooLong`` for ``reject``."""
+        limit = self.limit(max_new_tokens)
+        if not limit:
+            return Checked(prompt, 0, "ok")
+        raw = self.counter.raw(prompt)
+        tokens = math.ceil(raw * self.counter.scale)
+        TOKENS.observe(tokens)
+        if tokens <= limit:
+            ACTIONS.inc(action="ok")
+            return Checked(prompt, tokens, "ok", raw)
+        if self.policy == "reject":
+            ACTIONS.inc(action="rejected")
+            raise PromptTooLong(f"prompt has about {tokens} tokens; the limit is {limit}")
+        if self.policy == "summarize":
+            summary = self._summarize(prompt, limit)
+            if summary is not None:
+                ACTIONS.inc(action="summarized")
+                return Checked(summary, tokens, "summarized", raw)
+        ACTIONS.inc(action="truncated")
+        return Checked(self._truncate(prompt, tokens, limit), tokens, "truncated", raw)
+
+    def observe(self, checked: Checked, input_tokens: Optional[int]) -> None:
+        """Feed back watsonx's ``input_token_count`` for an untouched prompt."""
+        if checked.action == "ok" and input_tokens:
+            self.counter.calibrate(checked.raw, input_tokens)
+
+    # ── overflow ─────────────────────────────────────────────────
+    def _truncate(self, prompt: str, tokens: int, limit: int) -> str:
+        keep = len(prompt)
+        while True:
+            keep = int(keep * limit / max(tokens, 1) * 0.97)
+            if keep <= 0:
+                return ""
+            head = keep // 3
+            tail = len(prompt) - (keep - head)
+            # cut at whitespace where there is some nearby
+            space = prompt.rfind(" ", max(head - 40, 0), head)
+            head = space if space > 0 else head
+            space = prompt.find(" ", tail, tail + 40)
+            tail = space + 1 if space >= 0 else tail
+            text = prompt[:head] + MARKER + prompt[tail:]
+            tokens = self.counter.count(text)
+            if tokens <= limit:
+                return text
+
+    def _summarize(self, prompt: str, limit: int) -> Optional[str]:
+        sentences = [s for s in _SENTENCES.split(prompt) if s.strip()]
+        if len(sentences) < 3:
+            return None
+        counts = [self.counter.count(s) + 1 for s in sentences]
+        chosen = {0, len(sentences) - 1}
+        used = counts[0] + counts[-1]
+        if used > limit:
+            return None
+        freq = Frequencies(w.lower() for w in _WORDS.findall(prompt))
+
+        def score(i: int) -> float:
+            words = _WORDS.findall(sentences[i])
+            return sum(freq[w.lower()] for w in words) / (len(words) + 1)
+
+        for i in sorted(range(1, len(sentences) - 1), key=score, reverse=True):
+            if used + counts[i] <= limit:
+                chosen.add(i)
+                used += counts[i]
+        return " ".join(sentences[i] for i in sorted(chosen))
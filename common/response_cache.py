@@ -0,0 +1,238 @@
+"""
+response_cache.py – two-tier response cache with an optional disk tier
+
+• MemoryCache – per-process LRU with TTL, the fast front tier for the MCP
+  agents (main.py uses its SharedStore as the front tier instead).
+• DiskCache – SQLite (WAL) file that survives restarts and redeploys, with
+  TTL, size-based LRU eviction and incremental compaction.
+• ResponseCache – reads the front tier first, falls back to disk and
+  promotes hits; ``warm()`` preloads the front tier from disk at start-up.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, Optional, Protocol
+
+
+def make_key(*parts: object) -> str:
+    """Stable cache key for a model id, its parameters and a prompt."""
+    return hashlib.sha256("\0".join(map(str, parts)).encode()).hexdigest()
+
+
+class FrontTier(Protocol):
+    def get(self, key: str) -> Optional[str]: ...
+    def set(self, key: str, value: str, ttl: float) -> None: ...
+
+
+class MemoryCache:
+    """Thread-safe in-process LRU cache with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key      TEXT PRIMARY KEY,
+    value    TEXT NOT NULL,
+    size     INTEGER NOT NULL,
+    expires  REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed);
+CREATE INDEX IF NOT EXISTS responses_expires ON responses(expires);
+"""
+
+
+class DiskCache:
+    """
+    Persistent response store in one SQLite file.
+
+    Reads only refresh the LRU timestamp when it is older than
+    ``access_resolution`` seconds, so hot keys do not turn every read into
+    a write. Housekeeping (expiry, size eviction, incremental vacuum) runs
+    every ``housekeeping_every`` writes and from ``compact()``.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        access_resolution: float = 60.0,
+        housekeeping_every: int = 100,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.access_resolution = access_resolution
+        self.housekeeping_every = housekeeping_every
+        self._writes = 0
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            # auto_vacuum only takes effect before the first table is created
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.lookup(key)
+        return entry[0] if entry else None
+
+    def lookup(self, key: str) -> Optional[tuple[str, float]]:
+        """A live entry as ``(value, expires)``."""
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires, accessed FROM responses WHERE key = ? AND expires > ?",
+            (key, now),
+        ).fetchone()
+        if row is None:
+            return None
+        if now - row[2] > self.access_resolution:
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return row[0], row[1]
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO responses (key, value, size, expires, accessed)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(key) + len(value.encode()), now + ttl, now),
+        )
+        self._writes += 1
+        if self._writes % self.housekeeping_every == 0:
+            self.evict()
+
+    def recent(self, limit: int) -> Iterator[tuple[str, str, float]]:
+        """Most recently used live entries as ``(key, value, expires)``."""
+        yield from self._conn().execute(
+            "SELECT key, value, expires FROM responses WHERE expires > ?"
+            " ORDER BY accessed DESC LIMIT ?",
+            (time.time(), limit),
+        )
+
+    def total_bytes(self) -> int:
+        (total,) = self._conn().execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        return total
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones above ``max_bytes``."""
+        conn = self._conn()
+        removed = conn.execute(
+            "DELETE FROM responses WHERE expires <= ?", (time.time(),)
+        ).rowcount
+        excess = self.total_bytes() - self.max_bytes
+        if excess > 0:
+            # walk the LRU end until enough bytes are covered
+            victims, freed = [], 0
+            for key, size in conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed ASC"
+            ):
+                victims.append((key,))
+                freed += size
+                if freed >= excess:
+                    break
+            conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+            removed += len(victims)
+        return removed
+
+    def compact(self) -> int:
+        """Evict, hand free pages back to the OS and truncate the WAL."""
+        removed = self.evict()
+        conn = self._conn()
+        # execute() steps the pragma once, freeing a single page;
+        # executescript() runs it to completion
+        conn.executescript("PRAGMA incremental_vacuum;")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    def __len__(self) -> int:
+        (count,) = self._conn().execute("SELECT COUNT(*) FROM responses").fetchone()
+        return count
+
+
+class ResponseCache:
+    """Front tier backed by an optional persistent ``DiskCache``."""
+
+    def __init__(self, front: FrontTier, disk: Optional[DiskCache], ttl: float) -> None:
+        self.front = front
+        self.disk = disk
+        self.ttl = ttl
+        self.hits = {"front": 0, "disk": 0}
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        value = self.front.get(key)
+        if value is not None:
+            self.hits["front"] += 1
+            return value
+        if self.disk is not None:
+            entry = self.disk.lookup(key)
+            if entry is not None:
+                value, expires = entry
+                self.hits["disk"] += 1
+                # promoted for what is left of its TTL, not a fresh one
+                self.front.set(key, value, expires - time.time())
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        if not self.enabled:
+            return
+        self.front.set(key, value, self.ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, self.ttl)
+
+    def warm(self, limit: int) -> int:
+        """Load up to ``limit`` recently used disk entries into the front tier."""
+        if self.disk is None or not self.enabled or limit <= 0:
+            return 0
+        now, loaded = time.time(), 0
+        for key, value, expires in self.disk.recent(limit):
+            self.front.set(key, value, expires - now)
+            loaded += 1
+        return loaded
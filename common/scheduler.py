@@ -0,0 +1,210 @@
+"""
+scheduler.py – weighted fair queuing in front of model generation
+
+Requests wait here for one of ``concurrency`` generation slots instead of
+all hitting watsonx first-come-first-served.
+
+Priority classes are strict. A queued request of a higher class (listed
+first, ``interactive`` by default) is always dispatched before any lower
+one (``batch``), and ``reserved`` slots are only ever given to the top
+class. Running generations are never interrupted.
+
+Within a class, tenants share slots in proportion to their weights
+(start-time fair queuing). Each request gets a virtual finish tag
+``max(class clock, tenant's last tag) + cost / weight``, and the smallest tag
+goes next. A tenant with a burst of 500 requests therefore queues behind
+itself, not in front of everyone else. ``cost`` is the request's expected
+size, e.g. its profile's ``max_new_tokens``. Only the tenants named in
+``weights`` (``SCHEDULER_WEIGHTS``) get a queue of their own. Any other
+name, which comes from the client, is scheduled as ``default``, so a client
+cannot claim a fresh fair share or grow the scheduler's state by inventing
+tenants.
+
+    scheduler = FairScheduler.from_env()
+    async with scheduler.slot(tenant="team-a", priority="batch", cost=512):
+        ...generate...
+
+Metrics
+───────
+scheduler_wait_seconds{class}             time from arrival to dispatch
+scheduler_queue_depth{class}              requests waiting
+scheduler_running{class}                  slots in use
+scheduler_requests_total{class,outcome}   dispatched | rejected | cancelled
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Iterable, Optional
+
+from common import metrics
+
+WAIT = metrics.histogram("scheduler_wait_seconds", "Queue wait before generation", ["class"])
+DEPTH = metrics.gauge("scheduler_queue_depth", "Requests waiting for a generation slot", ["class"])
+RUNNING = metrics.gauge("scheduler_running", "Generation slots in use", ["class"])
+REQUESTS = metrics.counter("scheduler_requests_total", "Scheduler decisions", ["class", "outcome"])
+
+
+class QueueFull(Exception):
+    """Too many requests are already waiting."""
+
+
+class UnknownPriority(ValueError):
+    """The request named a priority class that is not configured."""
+
+
+@dataclass(order=True)
+class _Waiter:
+    finish: float
+    seq: int
+    start: float = field(compare=False)
+    priority: str = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+def parse_weights(spec: str) -> dict[str, float]:
+    """``"team-a=2,batch-jobs=0.5"`` → ``{"team-a": 2.0, "batch-jobs": 0.5}``."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        tenant, _, weight = item.partition("=")
+        weights[tenant.strip()] = float(weight)
+    return weights
+
+
+class FairScheduler:
+    """Per-process slot scheduler. Must be used from a single event loop."""
+
+    def __init__(self, concurrency: int, classes: Iterable[str] = ("interactive", "batch"),
+                 weights: Optional[dict[str, float]] = None, reserved: int = 0,
+                 max_queue: int = 1000) -> None:
+        self.concurrency = concurrency
+        self.classes = tuple(classes)
+        self.weights = weights or {}
+        self.reserved = min(reserved, max(concurrency - 1, 0))
+        self.max_queue = max_queue
+        self._queues: dict[str, list[_Waiter]] = {c: [] for c in self.classes}
+        self._clock = {c: 0.0 for c in self.classes}
+        self._last_finish: dict[tuple[str, str], float] = {}
+        self._depth = {c: 0 for c in self.classes}
+        self._running = {c: 0 for c in self.classes}
+        self._seq = itertools.count()
+
+    @classmethod
+    def from_env(cls, concurrency: int = 8) -> "FairScheduler":
+        """``SCHEDULER_CONCURRENCY``, ``SCHEDULER_CLASSES``, ``SCHEDULER_WEIGHTS``,
+        ``SCHEDULER_RESERVED`` and ``SCHEDULER_MAX_QUEUE``."""
+        return cls(
+            concurrency=int(os.getenv("SCHEDULER_CONCURRENCY", concurrency)),
+            classes=[c.strip() for c in os.getenv("SCHEDULER_CLASSES", "interactive,batch").split(",")
+                     if c.strip()],
+            weights=parse_weights(os.getenv("SCHEDULER_WEIGHTS", "")),
+            reserved=int(os.getenv("SCHEDULER_RESERVED", "0")),
+            max_queue=int(os.getenv("SCHEDULER_MAX_QUEUE", "1000")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.concurrency > 0
+
+    def priority(self, name: Optional[str]) -> str:
+        """Validate a requested class; ``None`` means the top class."""
+        if not name:
+            return self.classes[0]
+        if name not in self._queues:
+            raise UnknownPriority(f"unknown priority {name!r} (have: {', '.join(self.classes)})")
+        return name
+
+    def tenant(self, name: Optional[str]) -> str:
+        """A configured tenant, else ``default``."""
+        return name if name and name in self.weights else "default"
+
+    def _may_run(self, priority: str) -> bool:
+        busy = sum(self._running.values())
+        if priority == self.classes[0]:
+            return busy < self.concurrency
+        lower = busy - self._running[self.classes[0]]
+        return busy < self.concurrency and lower < self.concurrency - self.reserved
+
+    def _advance(self, priority: str, clock: float) -> None:
+        self._clock[priority] = clock
+        # a tag at or below the clock no longer counts: the tenant starts at the clock
+        for key in [k for k, finish in self._last_finish.items()
+                    if k[0] == priority and finish <= clock]:
+            del self._last_finish[key]
+
+    def _dispatch(self) -> None:
+        for priority in self.classes:
+            queue = self._queues[priority]
+            while queue and self._may_run(priority):
+                waiter = heapq.heappop(queue)
+                if waiter.cancelled:
+                    continue
+                self._advance(priority, waiter.start)
+                self._depth[priority] -= 1
+                self._running[priority] += 1
+                waiter.future.set_result(None)
+            DEPTH.set(self._depth[priority], **{"class": priority})
+            RUNNING.set(self._running[priority], **{"class": priority})
+            if self._depth[priority]:
+                return   # strict priority: nothing below a class that still waits
+
+    async def acquire(self, tenant: str, priority: str, cost: float = 1.0) -> float:
+        """Wait for a slot; returns the seconds spent waiting."""
+        labels = {"class": priority}
+        if sum(self._depth.values()) >= self.max_queue:
+            REQUESTS.inc(outcome="rejected", **labels)
+            raise QueueFull(f"{self.max_queue} requests already waiting")
+        arrived = time.perf_counter()
+        tenant = self.tenant(tenant)
+        key = (priority, tenant)
+        start = max(self._clock[priority], self._last_finish.get(key, 0.0))
+        finish = start + cost / self.weights.get(tenant, 1.0)
+        self._last_finish[key] = finish
+        waiter = _Waiter(finish, next(self._seq), start, priority,
+                         asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queues[priority], waiter)
+        self._depth[priority] += 1
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(priority)        # granted just as we were cancelled
+            else:
+                waiter.cancelled = True
+                self._depth[priority] -= 1
+                DEPTH.set(self._depth[priority], **labels)
+            REQUESTS.inc(outcome="cancelled", **labels)
+            raise
+        waited = time.perf_counter() - arrived
+        WAIT.observe(waited, **labels)
+        REQUESTS.inc(outcome="dispatched", **labels)
+        return waited
+
+    def release(self, priority: str) -> None:
+        self._running[priority] -= 1
+        self._dispatch()
+        RUNNING.set(self._running[priority], **{"class": priority})
+
+    @asynccontextmanager
+    async def slot(self, tenant: str, priority: str, cost: float = 1.0) -> AsyncIterator[float]:
+        """Hold a generation slot for the body; yields the queue wait in seconds."""
+        if not self.enabled:
+            yield 0.0
+            return
+        waited = await self.acquire(tenant, priority, cost)
+        try:
+            yield waited
+        finally:
+            self.release(priority)
+
+    def status(self) -> dict:
+        return {"concurrency": self.concurrency, "reserved": self.reserved,
+                "queued": dict(self._depth), "running": dict(self._running)}
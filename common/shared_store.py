@@ -0,0 +1,202 @@
+"""
+shared_store.py – host-local state shared by every worker process
+
+A small SQLite database (WAL mode) that all pre-forked workers of an agent
+open at the same path. By default it lives on tmpfs (``/dev/shm``), so it
+behaves like a shared-memory segment with transactions: a response cache,
+token-bucket rate limits and concurrency leases are seen identically by
+every worker instead of being split per process. The default file name
+carries a hash of the deployment (its app directory), so two agents on one
+host do not share a store by accident.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+
+def default_path(scope: Optional[str] = None, prefix: str = "watsonx-agent-state") -> str:
+    """
+    A file per ``scope`` (default: the working directory), on tmpfs if
+    possible so the store never touches a real disk.
+    """
+    shm = Path("/dev/shm")
+    base = shm if shm.is_dir() and os.access(shm, os.W_OK) else Path(tempfile.gettempdir())
+    digest = hashlib.sha1((scope or os.getcwd()).encode()).hexdigest()[:12]
+    return str(base / f"{prefix}-{digest}.db")
+
+
+def _pid_alive(pid: int) -> int:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return 0
+    except PermissionError:
+        return 1
+    return 1
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key     TEXT PRIMARY KEY,
+    value   TEXT NOT NULL,
+    created REAL NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_created ON cache(created);
+CREATE TABLE IF NOT EXISTS buckets (
+    name    TEXT PRIMARY KEY,
+    tokens  REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    name    TEXT NOT NULL,
+    pid     INTEGER NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS leases_name ON leases(name);
+"""
+
+
+class SharedStore:
+    """
+    Cache, rate-limit and concurrency state shared across processes.
+
+    Connections are opened lazily, one per thread. Every operation is a
+    single short transaction, so contention between workers stays in the
+    microsecond range.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_entries: int = 10_000,
+        busy_timeout: float = 1.0,
+    ) -> None:
+        self.path = path or default_path()
+        self.max_entries = max_entries
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+    # ------------------------------------------------------------------ #
+    # Connection handling
+    # ------------------------------------------------------------------ #
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.create_function("pid_alive", 1, _pid_alive, deterministic=False)
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------ #
+    # Response cache
+    # ------------------------------------------------------------------ #
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires > ?",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, created, expires) VALUES (?, ?, ?, ?)",
+            (key, value, now, now + ttl),
+        )
+        if random.random() < 0.01:  # amortised housekeeping
+            self.prune()
+
+    def prune(self) -> int:
+        """Drop expired entries and trim to ``max_entries`` (oldest first)."""
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),)).rowcount
+        removed += conn.execute(
+            "DELETE FROM cache WHERE key IN ("
+            " SELECT key FROM cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+        return removed
+
+    # ------------------------------------------------------------------ #
+    # Token-bucket rate limiting
+    # ------------------------------------------------------------------ #
+    def take_token(self, name: str, rate: float, burst: float) -> bool:
+        """Take one token from bucket ``name`` refilled at ``rate`` per second."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE name = ?", (name,)
+            ).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (name, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed
+
+    # ------------------------------------------------------------------ #
+    # Concurrency leases
+    # ------------------------------------------------------------------ #
+    def acquire(self, name: str, limit: int, lease_ttl: float = 300.0) -> Optional[int]:
+        """
+        Take one of ``limit`` concurrent slots. Returns a lease id, or None
+        when the budget is exhausted. Leases held by dead processes or older
+        than ``lease_ttl`` are reclaimed first.
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM leases WHERE name = ? AND (expires <= ? OR pid_alive(pid) = 0)",
+                (name, now),
+            )
+            (in_use,) = conn.execute(
+                "SELECT COUNT(*) FROM leases WHERE name = ?", (name,)
+            ).fetchone()
+            lease_id = None
+            if in_use < limit:
+                lease_id = conn.execute(
+                    "INSERT INTO leases (name, pid, expires) VALUES (?, ?, ?)",
+                    (name, os.getpid(), now + lease_ttl),
+                ).lastrowid
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return lease_id
+
+    def release(self, lease_id: int) -> None:
+        self._conn().execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+
+    def in_use(self, name: str) -> int:
+        (count,) = self._conn().execute(
+            "SELECT COUNT(*) FROM leases WHERE name = ?", (name,)
+        ).fetchone()
+        return count
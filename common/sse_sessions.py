@@ -0,0 +1,273 @@
+"""
+sse_sessions.py – session limits and idle eviction for MCP over SSE
+
+Every client of an SSE agent holds an open ``GET /sse`` stream, a file
+descriptor and the session's streams and tasks for as long as it stays
+connected, whether it calls tools or not. ``SessionLimitMiddleware`` bounds
+that:
+
+  • at ``SSE_MAX_SESSIONS`` open sessions (default 256, 0 = no limit), or
+    with the process RSS over ``SSE_MAX_RSS_MB`` (0 = off), a new session
+    gets 503 with ``Retry-After: SSE_RETRY_AFTER_SECONDS`` (default 5);
+  • a session with no traffic for ``SSE_IDLE_SECONDS`` (default 600,
+    0 = never) is closed. Traffic is a message the client posts or an
+    event the server sends; keep-alive pings do not count. The session is
+    told its client disconnected and ends as it would on a real
+    disconnect. MCP clients reconnect when they next need the agent.
+
+Memory per session is estimated from the process RSS: its growth since the
+process last had no open session, divided by the sessions open now. The
+estimate is coarse (the allocator does not give memory back at once), but
+it shows the trend. ``status()`` has the numbers for ``/readyz``.
+
+    app = mcp.sse_app()
+    app.add_middleware(SessionLimitMiddleware, sessions=sessions)
+
+Metrics
+───────
+sse_sessions_open                open SSE sessions
+sse_sessions_rejected_total{reason}  capacity | memory
+sse_sessions_evicted_total       closed after SSE_IDLE_SECONDS without traffic
+sse_session_seconds              session lifetime
+sse_session_memory_bytes         estimated RSS per open session
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from typing import Optional
+from urllib.parse import parse_qs
+
+import anyio
+
+from common import metrics
+
+logger = logging.getLogger("sse-sessions")
+
+OPEN = metrics.gauge("sse_sessions_open", "Open SSE sessions")
+REJECTED = metrics.counter("sse_sessions_rejected_total", "New sessions refused", ["reason"])
+EVICTED = metrics.counter("sse_sessions_evicted_total", "Sessions closed for being idle")
+LIFETIME = metrics.histogram("sse_session_seconds", "SSE session lifetime",
+                             buckets=(1, 10, 60, 300, 900, 1800, 3600, 4 * 3600, 24 * 3600))
+MEMORY = metrics.gauge("sse_session_memory_bytes", "Estimated RSS per open session")
+
+_SESSION_ID = re.compile(rb"session_id=([0-9a-f]{32})")
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux /proc), or None elsewhere."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as fh:
+            return int(fh.read().split()[1]) * _PAGE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class Session:
+    __slots__ = ("id", "opened", "last_seen", "events", "posts", "sent_bytes", "evicted")
+
+    def __init__(self) -> None:
+        self.id: Optional[str] = None       # known once the endpoint event is sent
+        self.opened = self.last_seen = time.monotonic()
+        self.events = self.posts = self.sent_bytes = 0
+        self.evicted = anyio.Event()
+
+
+class Sessions:
+    """
+    Open SSE sessions of one process. Use from the event loop thread. Limits
+    not given default to the ``SSE_*`` settings, read here (after the app
+    has loaded its .env).
+    """
+
+    def __init__(self, max_sessions: Optional[int] = None, idle_seconds: Optional[float] = None,
+                 max_rss_mb: Optional[float] = None, retry_after: Optional[int] = None) -> None:
+        def setting(given, name: str, default: str, kind):
+            return given if given is not None else kind(os.getenv(name, default))
+
+        self.max_sessions = setting(max_sessions, "SSE_MAX_SESSIONS", "256", int)
+        self.idle_seconds = setting(idle_seconds, "SSE_IDLE_SECONDS", "600", float)
+        self.max_rss = int(setting(max_rss_mb, "SSE_MAX_RSS_MB", "0", float) * 1024 * 1024)
+        self.retry_after = setting(retry_after, "SSE_RETRY_AFTER_SECONDS", "5", int)
+        self.open: set[Session] = set()
+        self.by_id: dict[str, Session] = {}
+        self.evicted = 0
+        self.rss_idle = rss_bytes()       # RSS with no session open
+        self._reaper: Optional[asyncio.Task] = None
+
+    # ── admission ────────────────────────────────────────────────
+    def refuse_reason(self) -> Optional[str]:
+        if self.max_sessions and len(self.open) >= self.max_sessions:
+            return "capacity"
+        if self.max_rss and (rss_bytes() or 0) > self.max_rss:
+            return "memory"
+        return None
+
+    def add(self) -> Session:
+        if not self.open:
+            self.rss_idle = rss_bytes()
+        session = Session()
+        self.open.add(session)
+        OPEN.set(len(self.open))
+        if self._reaper is None and self.idle_seconds > 0:
+            self._reaper = asyncio.ensure_future(self._reap())
+        return session
+
+    def remove(self, session: Session) -> None:
+        self.open.discard(session)
+        if session.id is not None:
+            self.by_id.pop(session.id, None)
+        OPEN.set(len(self.open))
+        LIFETIME.observe(time.monotonic() - session.opened)
+
+    def seen(self, session_id: str) -> None:
+        """The client posted a message to the session."""
+        session = self.by_id.get(session_id)
+        if session is not None:
+            session.posts += 1
+            session.last_seen = time.monotonic()
+
+    # ── idle eviction and memory ─────────────────────────────────
+    async def _reap(self) -> None:
+        interval = min(max(self.idle_seconds / 4, 1.0), 30.0)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.sweep()
+            except Exception:  # never let the reaper die
+                logger.exception("Session sweep failed")
+
+    def sweep(self) -> int:
+        """Evict idle sessions and refresh the memory estimate. Returns the sessions evicted."""
+        now, evicted = time.monotonic(), 0
+        if self.idle_seconds > 0:
+            for session in list(self.open):
+                if now - session.last_seen >= self.idle_seconds and not session.evicted.is_set():
+                    session.evicted.set()
+                    evicted += 1
+            if evicted:
+                self.evicted += evicted
+                EVICTED.inc(evicted)
+                logger.info("Closed %d idle session(s) (%d open)", evicted, len(self.open))
+        per_session = self.memory_per_session()
+        if per_session is not None:
+            MEMORY.set(per_session)
+        return evicted
+
+    def memory_per_session(self) -> Optional[float]:
+        rss = rss_bytes()
+        if not self.open or rss is None or self.rss_idle is None:
+            return None
+        return max(rss - self.rss_idle, 0) / len(self.open)
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        per_session = self.memory_per_session()
+        rss = rss_bytes()
+        return {"open": len(self.open), "max": self.max_sessions,
+                "idle_seconds": self.idle_seconds, "evicted": self.evicted,
+                "oldest_idle_s": round(max((now - s.last_seen for s in self.open), default=0), 1),
+                "rss_mb": round(rss / 1048576, 1) if rss is not None else None,
+                "per_session_kb": round(per_session / 1024, 1) if per_session is not None else None}
+
+
+class SessionLimitMiddleware:
+    """
+    ASGI middleware for an ``mcp.sse_app()``: admits, tracks and evicts the
+    ``GET sse_path`` streams, and notes posts to ``message_path`` as traffic.
+    """
+
+    def __init__(self, app, sessions: Sessions, sse_path: str = "/sse",
+                 message_path: str = "/messages/") -> None:
+        self.app = app
+        self.sessions = sessions
+        self.sse_path = sse_path
+        self.message_path = message_path
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if scope["path"].startswith(self.message_path):
+            ids = parse_qs(scope.get("query_string", b"").decode()).get("session_id")
+            if ids:
+                self.sessions.seen(ids[0])
+            return await self.app(scope, receive, send)
+        if scope["path"] != self.sse_path or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+
+        reason = self.sessions.refuse_reason()
+        if reason is not None:
+            REJECTED.inc(reason=reason)
+            return await _refuse(send, reason, self.sessions.retry_after)
+
+        sessions = self.sessions
+        session = sessions.add()
+        started = finished = False
+
+        async def send_tracked(message) -> None:
+            nonlocal started, finished
+            if message["type"] == "http.response.start":
+                if started:
+                    # FastMCP answers an ended stream with an empty Response(); after a real
+                    # disconnect the server drops it, after an eviction we do
+                    return
+                started = True
+            elif finished or (session.evicted.is_set() and not message.get("body")):
+                return
+            if message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                finished = not message.get("more_body", False)
+                if body and not body.startswith(b":"):       # ": ping" comments are not traffic
+                    session.events += 1
+                    session.sent_bytes += len(body)
+                    session.last_seen = time.monotonic()
+                    if session.id is None:
+                        match = _SESSION_ID.search(body)
+                        if match:
+                            session.id = match.group(1).decode()
+                            sessions.by_id[session.id] = session
+            await send(message)
+
+        async def receive_or_evict():
+            # sse-starlette waits here for the disconnect; eviction is one
+            if session.evicted.is_set():
+                return {"type": "http.disconnect"}
+            received = {}
+            async with anyio.create_task_group() as tg:
+                async def from_client() -> None:
+                    received["message"] = await receive()
+                    tg.cancel_scope.cancel()
+
+                async def on_evict() -> None:
+                    await session.evicted.wait()
+                    tg.cancel_scope.cancel()
+
+                tg.start_soon(from_client)
+                tg.start_soon(on_evict)
+            return received.get("message", {"type": "http.disconnect"})
+
+        try:
+            await self.app(scope, receive_or_evict, send_tracked)
+            if session.evicted.is_set() and started and not finished:
+                # end the chunked response, so the client sees the stream close
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            sessions.remove(session)
+
+
+async def _refuse(send, reason: str, retry_after: int) -> None:
+    detail = ("At capacity: too many open sessions" if reason == "capacity"
+              else "At capacity: memory limit reached")
+    body = json.dumps({"detail": f"{detail}, retry later"}).encode()
+    await send({"type": "http.response.start", "status": 503,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode()),
+                            (b"retry-after", str(retry_after).encode()),
+                            (b"connection", b"close")]})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,108 @@
+"""
+DrainMiddleware at the ASGI level: after SIGTERM the request in flight
+finishes, new ones get 503 and probes keep answering.
+
+    python -m pytest common/test
+"""
+import asyncio
+import signal
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common.drain import Drain, DrainMiddleware  # noqa: E402
+
+
+class SlowApp:
+    """Answers 200, but only once ``release`` is set."""
+
+    def __init__(self) -> None:
+        self.release = asyncio.Event()
+        self.started = asyncio.Event()
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["path"] == "/work":
+            self.started.set()
+            await self.release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def request(app, path: str) -> tuple[int, dict]:
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message) -> None:
+        messages.append(message)
+
+    await app({"type": "http", "method": "GET", "path": path, "headers": []}, receive, send)
+    return messages[0]["status"], dict(messages[0]["headers"])
+
+
+def test_in_flight_request_is_drained_and_new_ones_refused():
+    stopped = []
+
+    async def run() -> None:
+        drain = Drain(grace=5, notice=0)
+        inner = SlowApp()
+        app = DrainMiddleware(inner, drain)
+
+        in_flight = asyncio.ensure_future(request(app, "/work"))
+        await inner.started.wait()
+        drain._on_stop(signal.SIGTERM, lambda sig, frame: stopped.append(sig))
+        assert drain.draining and drain.in_flight == 1
+
+        status, headers = await request(app, "/work")
+        assert status == 503
+        assert headers[b"retry-after"] == b"1" and headers[b"connection"] == b"close"
+        assert (await request(app, "/readyz"))[0] == 200     # probes pass through
+
+        await asyncio.sleep(0.05)
+        assert not stopped                                  # still waiting for /work
+        inner.release.set()
+        assert (await in_flight)[0] == 200
+        await asyncio.wait_for(drain._task, timeout=1)
+        assert drain.in_flight == 0
+
+    asyncio.run(run())
+    assert stopped == [signal.SIGTERM]                      # then handed on to uvicorn
+
+
+def test_grace_period_caps_the_wait():
+    stopped = []
+
+    async def run() -> None:
+        drain = Drain(grace=0.1, notice=0)
+        inner = SlowApp()
+        app = DrainMiddleware(inner, drain)
+        in_flight = asyncio.ensure_future(request(app, "/work"))
+        await inner.started.wait()
+        drain._on_stop(signal.SIGTERM, lambda sig, frame: stopped.append(sig))
+        await asyncio.wait_for(drain._task, timeout=1)
+        assert stopped == [signal.SIGTERM] and drain.in_flight == 1
+        inner.release.set()
+        await in_flight
+
+    asyncio.run(run())
+
+
+def test_second_signal_skips_the_wait():
+    stopped = []
+
+    async def run() -> None:
+        drain = Drain(grace=5, notice=0)
+        inner = SlowApp()
+        app = DrainMiddleware(inner, drain)
+        in_flight = asyncio.ensure_future(request(app, "/work"))
+        await inner.started.wait()
+        handler = lambda sig, frame: stopped.append(sig)  # noqa: E731
+        drain._on_stop(signal.SIGTERM, handler)
+        drain._on_stop(signal.SIGTERM, handler)
+        assert stopped == [signal.SIGTERM]
+        drain._task.cancel()
+        inner.release.set()
+        await in_flight
+
+    asyncio.run(run())
@@ -0,0 +1,202 @@
+"""
+PromptLimit: each overflow action at the limit, the per-block count cache,
+and counting with the estimate or a tokenizer.
+
+    python -m pytest common/test
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common.prompt_limit import (  # noqa: E402
+    BLOCK_CHARS, MARKER, PromptLimit, PromptTooLong, TokenCounter, _blocks,
+)
+
+WORDS = " ".join(f"w{i}" for i in range(200))                 # 200 tokens by the estimate
+
+
+class WhitespaceTokenizer:
+    """Stands in for tokenizers.Tokenizer: one token per whitespace-separated word."""
+
+    class Encoding:
+        def __init__(self, ids: list[int]) -> None:
+            self.ids = ids
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> "WhitespaceTokenizer.Encoding":
+        return self.Encoding(list(range(len(text.split()))))
+
+
+def exact_counter(**kw) -> TokenCounter:
+    """The estimate without its safety margin, so counts are easy to reason about."""
+    counter = TokenCounter(**kw)
+    counter.scale = 1.0
+    return counter
+
+
+def limit(policy: str, max_tokens: int) -> PromptLimit:
+    return PromptLimit(exact_counter(), max_tokens=max_tokens, policy=policy)
+
+
+# ── actions at the boundary ──────────────────────────────────────
+@pytest.mark.parametrize("policy", ["truncate", "reject", "summarize"])
+def test_prompt_at_the_limit_is_untouched(policy):
+    checked = limit(policy, 200).apply(WORDS)
+    assert (checked.prompt, checked.tokens, checked.action) == (WORDS, 200, "ok")
+
+
+def test_reject_one_token_over():
+    with pytest.raises(PromptTooLong, match="200 tokens; the limit is 199"):
+        limit("reject", 199).apply(WORDS)
+
+
+def test_truncate_one_token_over_keeps_both_ends():
+    policy = limit("truncate", 199)
+    checked = policy.apply(WORDS)
+    assert checked.action == "truncated" and checked.tokens == 200
+    assert MARKER in checked.prompt
+    assert checked.prompt.startswith("w0 ") and checked.prompt.endswith(" w199")
+    assert policy.counter.count(checked.prompt) <= 199
+
+
+def test_truncate_keeps_a_third_at_the_head():
+    checked = limit("truncate", 60).apply(WORDS)
+    head, tail = checked.prompt.split(MARKER)
+    assert 0 < len(head.split()) < len(tail.split())
+
+
+def test_summarize_keeps_first_and_last_sentences_in_order():
+    sentences = ["The task is to review the parser."]
+    sentences += [f"Aside{i} on item{i}." for i in range(20)]
+    sentences[7] = "The parser review covers the parser tokens and the parser errors."
+    sentences.append("What does the parser get wrong?")
+    prompt = " ".join(sentences)
+    policy = limit("summarize", 40)
+    tokens = policy.counter.count(prompt)
+
+    checked = policy.apply(prompt)
+    assert checked.action == "summarized" and checked.tokens == tokens > 40
+    kept = [s for s in sentences if s in checked.prompt]
+    assert kept[0] == sentences[0] and kept[-1] == sentences[-1]
+    assert sentences[7] in kept                   # carries the most frequent words
+    assert checked.prompt == " ".join(kept)
+    assert policy.counter.count(checked.prompt) <= 40
+
+
+def test_summarize_falls_back_to_truncate():
+    # one long sentence: nothing to choose between
+    checked = limit("summarize", 50).apply(WORDS)
+    assert checked.action == "truncated" and MARKER in checked.prompt
+
+
+def test_context_size_lowers_the_limit():
+    policy = PromptLimit(exact_counter(), max_tokens=4096, context_tokens=1000)
+    assert policy.limit(max_new_tokens=800) == 200
+    assert policy.apply(WORDS, max_new_tokens=800).action == "ok"
+    assert policy.apply(WORDS, max_new_tokens=801).action == "truncated"
+    assert PromptLimit(exact_counter(), max_tokens=0, context_tokens=1000).limit(200) == 800
+
+
+def test_zero_limit_is_off():
+    checked = PromptLimit(exact_counter(), max_tokens=0).apply(WORDS * 100)
+    assert (checked.action, checked.tokens) == ("ok", 0)
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("PROMPT_MAX_TOKENS", "100")
+    monkeypatch.setenv("PROMPT_OVERFLOW", "reject")
+    monkeypatch.setenv("MODEL_CONTEXT_TOKENS", "0")
+    monkeypatch.delenv("PROMPT_TOKENIZER", raising=False)
+    policy = PromptLimit.from_env()
+    assert (policy.max_tokens, policy.policy, policy.counter.kind) == (100, "reject", "estimate")
+    monkeypatch.setenv("PROMPT_OVERFLOW", "drop")
+    with pytest.raises(ValueError, match="PROMPT_OVERFLOW"):
+        PromptLimit.from_env()
+
+
+# ── block cache ──────────────────────────────────────────────────
+def counting(counter: TokenCounter) -> list[str]:
+    """Record each block the counter actually counts (a cache miss)."""
+    counted: list[str] = []
+    count_block = counter._count_block
+    counter._count_block = lambda block: counted.append(block) or count_block(block)
+    return counted
+
+
+def test_blocks_are_cut_at_whitespace():
+    text = WORDS * 20
+    blocks = _blocks(text)
+    assert "".join(blocks) == text and len(blocks) > 1
+    assert all(b.endswith(" ") and len(b) <= BLOCK_CHARS for b in blocks[:-1])
+
+
+def test_shared_prefix_only_counts_new_blocks():
+    counter = exact_counter()
+    counted = counting(counter)
+    template = WORDS * 20
+    first = counter.raw(template + " question one")
+    blocks = len(counted)
+    assert counter.raw(template + " question one") == first
+    assert len(counted) == blocks                 # all hits
+    counter.raw(template + " another question")
+    assert len(counted) == blocks + 1             # only the last block is new
+    assert set(counter._cache) >= {hash(b) for b in _blocks(template)[:-1]}
+
+
+def test_block_cache_is_lru():
+    counter = exact_counter(cache_entries=2)
+    counted = counting(counter)
+    for text in ("a", "b", "a", "c", "a", "b"):
+        counter.raw(text)
+    # "b" was the least recently used when "c" came in; "a" never left
+    assert counted == ["a", "b", "c", "b"]
+    assert list(counter._cache) == [hash("a"), hash("b")]
+
+
+# ── estimate vs tokenizer ────────────────────────────────────────
+def test_estimate_errs_long_until_calibrated():
+    counter = TokenCounter()
+    assert counter.kind == "estimate"
+    assert counter.raw(WORDS) == 200 and counter.count(WORDS) == 250
+    policy = PromptLimit(counter, max_tokens=1000)
+    checked = policy.apply(WORDS)
+    for _ in range(50):
+        policy.observe(checked, 160)              # watsonx counts fewer than we do
+    assert 0.8 * 1.05 <= counter.scale < 0.85
+    assert counter.count(WORDS) <= 170
+
+
+def test_only_untouched_prompts_calibrate():
+    counter = TokenCounter()
+    policy = PromptLimit(counter, max_tokens=10)
+    policy.observe(policy.apply(WORDS), 1000)
+    assert counter.scale == 1.25
+
+
+def test_estimate_counts_long_words_as_several_tokens():
+    counter = exact_counter()
+    assert counter.raw("a, b.") == 4
+    assert counter.raw("internationalization") == 1 + 19 // 6
+
+
+def test_tokenizer_counts_are_exact_and_not_calibrated():
+    counter = TokenCounter()
+    counter.tokenizer, counter.kind, counter.scale = WhitespaceTokenizer(), "tokenizer", 1.0
+    assert counter.count("internationalization, really") == 2
+    counter.calibrate(2, 10)
+    assert counter.scale == 1.0
+
+
+def test_tokenizer_from_file(tmp_path):
+    tokenizers = pytest.importorskip("tokenizers")
+    vocab = {"[UNK]": 0, **{f"w{i}": i + 1 for i in range(200)}}
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    path = tmp_path / "tokenizer.json"
+    tokenizer.save(str(path))
+
+    counter = TokenCounter(str(path))
+    assert (counter.kind, counter.scale) == ("tokenizer", 1.0)
+    assert counter.count(WORDS) == 200
+    assert PromptLimit(counter, max_tokens=200).apply(WORDS).action == "ok"
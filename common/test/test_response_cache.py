@@ -0,0 +1,107 @@
+"""
+ResponseCache and its DiskCache tier: LRU eviction by bytes, compaction
+and how entries move from disk to the front tier.
+
+    python -m pytest common/test
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common import response_cache  # noqa: E402
+from common.response_cache import DiskCache, MemoryCache, ResponseCache  # noqa: E402
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+class RecordingFront(MemoryCache):
+    """A memory tier that remembers the TTL each entry was given."""
+
+    def __init__(self) -> None:
+        super().__init__(100)
+        self.ttls: dict[str, float] = {}
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self.ttls[key] = ttl
+        super().set(key, value, ttl)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(response_cache, "time", clock)
+    return clock
+
+
+def test_evict_drops_least_recently_used_until_under_max_bytes(tmp_path, clock):
+    value = "x" * 98                        # 100 bytes per entry with its 2-char key
+    disk = DiskCache(str(tmp_path / "cache.db"), max_bytes=300, access_resolution=0)
+    for i in range(5):
+        disk.set(f"k{i}", value, ttl=3600)
+        clock.now += 1
+    assert disk.get("k0") == value          # k0 is now the most recently used
+    assert disk.evict() == 2
+    assert disk.total_bytes() <= 300
+    assert [disk.get(f"k{i}") is not None for i in range(5)] == [True, False, False, True, True]
+
+
+def test_evict_drops_expired_entries_first(tmp_path, clock):
+    disk = DiskCache(str(tmp_path / "cache.db"), max_bytes=10_000)
+    disk.set("short", "v", ttl=1)
+    disk.set("long", "v", ttl=3600)
+    clock.now += 2
+    assert disk.evict() == 1
+    assert len(disk) == 1 and disk.get("long") == "v"
+
+
+def test_compact_returns_freed_pages_to_the_os(tmp_path):
+    path = str(tmp_path / "cache.db")
+    disk = DiskCache(path, max_bytes=1 << 30)
+    for i in range(400):
+        disk.set(f"k{i}", "x" * 8192, ttl=3600)
+    disk.compact()                          # checkpoint: the pages are in the main file now
+    full = os.path.getsize(path)
+    disk.max_bytes = 100_000
+    disk.compact()
+    assert disk.total_bytes() <= 100_000
+    # every free page goes back, not one per compact() (execute() vs executescript())
+    assert os.path.getsize(path) < full / 10
+
+
+def test_warm_keeps_the_remaining_ttl(tmp_path, clock):
+    disk = DiskCache(str(tmp_path / "cache.db"))
+    ResponseCache(MemoryCache(100), disk, ttl=100).set("key", "value")
+    clock.now += 40
+
+    front = RecordingFront()
+    assert ResponseCache(front, disk, ttl=100).warm(10) == 1
+    assert front.ttls["key"] == pytest.approx(60)
+
+
+def test_disk_hit_is_promoted_with_the_remaining_ttl(tmp_path, clock):
+    disk = DiskCache(str(tmp_path / "cache.db"))
+    ResponseCache(MemoryCache(100), disk, ttl=100).set("key", "value")
+    clock.now += 70
+
+    front = RecordingFront()
+    cache = ResponseCache(front, disk, ttl=100)
+    assert cache.get("key") == "value"
+    assert cache.hits == {"front": 0, "disk": 1}
+    assert front.ttls["key"] == pytest.approx(30)
+    assert cache.get("key") == "value" and cache.hits["front"] == 1
+
+
+def test_expired_disk_entries_are_not_warmed(tmp_path, clock):
+    disk = DiskCache(str(tmp_path / "cache.db"))
+    ResponseCache(MemoryCache(100), disk, ttl=10).set("key", "value")
+    clock.now += 11
+    assert ResponseCache(RecordingFront(), disk, ttl=10).warm(10) == 0
@@ -0,0 +1,92 @@
+"""
+SharedStore: token buckets, cross-process leases and cache pruning.
+
+    python -m pytest common/test
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common import shared_store  # noqa: E402
+from common.shared_store import SharedStore  # noqa: E402
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(shared_store, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def store(tmp_path) -> SharedStore:
+    return SharedStore(str(tmp_path / "state.db"), max_entries=3)
+
+
+def dead_pid() -> int:
+    """The pid of a process that has already exited."""
+    out = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                         capture_output=True, text=True, check=True)
+    return int(out.stdout)
+
+
+def test_bucket_allows_a_burst_then_refills_at_rate(store, clock):
+    assert [store.take_token("rps", rate=2, burst=3) for _ in range(4)] == [True] * 3 + [False]
+    clock.now += 0.25                                   # half a token
+    assert not store.take_token("rps", rate=2, burst=3)
+    clock.now += 0.25
+    assert store.take_token("rps", rate=2, burst=3)
+    assert not store.take_token("rps", rate=2, burst=3)
+
+
+def test_bucket_refill_is_capped_at_burst(store, clock):
+    store.take_token("rps", rate=10, burst=2)
+    clock.now += 60
+    assert [store.take_token("rps", rate=10, burst=2) for _ in range(3)] == [True, True, False]
+
+
+def test_acquire_respects_limit_and_release(store):
+    first, second = store.acquire("gen", 2), store.acquire("gen", 2)
+    assert first is not None and second is not None
+    assert store.acquire("gen", 2) is None
+    store.release(first)
+    assert store.acquire("gen", 2) is not None
+    assert store.in_use("gen") == 2
+
+
+def test_lease_of_a_dead_process_is_reclaimed(store):
+    store._conn().execute("INSERT INTO leases (name, pid, expires) VALUES (?, ?, ?)",
+                          ("gen", dead_pid(), 9e18))
+    assert store.in_use("gen") == 1
+    assert store.acquire("gen", 1) is not None          # the dead lease made room
+    assert store.in_use("gen") == 1
+
+
+def test_expired_lease_is_reclaimed(store, clock):
+    assert store.acquire("gen", 1, lease_ttl=5) is not None
+    assert store.acquire("gen", 1) is None
+    clock.now += 6
+    assert store.acquire("gen", 1) is not None
+
+
+def test_prune_keeps_the_newest_max_entries(store, clock, monkeypatch):
+    monkeypatch.setattr(shared_store.random, "random", lambda: 1.0)   # no prune inside set()
+    for i in range(5):
+        store.set(f"k{i}", f"v{i}", ttl=60)
+        clock.now += 1
+    store.set("old", "gone", ttl=1)
+    clock.now += 2
+    assert store.prune() == 3                           # "old" expired, k0 and k1 over the cap
+    assert [store.get(f"k{i}") for i in range(5)] == [None, None, "v2", "v3", "v4"]
+    assert store.get("old") is None
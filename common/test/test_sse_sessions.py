@@ -0,0 +1,143 @@
+"""
+SessionLimitMiddleware at the ASGI level: the session cap answers 503, an
+idle session is evicted and its stream ends, and posts count as traffic.
+
+    python -m pytest common/test
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common.sse_sessions import SessionLimitMiddleware, Sessions  # noqa: E402
+
+
+class SseApp:
+    """Like mcp.sse_app(): sends the endpoint event, then waits for the disconnect."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["path"].startswith("/messages/"):
+            await send({"type": "http.response.start", "status": 202, "headers": []})
+            await send({"type": "http.response.body", "body": b"Accepted"})
+            return
+        self.count += 1
+        session_id = f"{self.count:032x}"
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream")]})
+        await send({"type": "http.response.body", "more_body": True,
+                    "body": f"event: endpoint\r\ndata: /messages/?session_id={session_id}\r\n\r\n"
+                    .encode()})
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+
+class Client:
+    """One GET /sse stream, kept open until the server ends it."""
+
+    def __init__(self, app) -> None:
+        self.messages: list[dict] = []
+        self.disconnected = asyncio.Event()
+        self.task = asyncio.ensure_future(app(
+            {"type": "http", "method": "GET", "path": "/sse", "query_string": b"",
+             "headers": []}, self.receive, self.send))
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message) -> None:
+        self.messages.append(message)
+
+    @property
+    def status(self) -> int:
+        return self.messages[0]["status"]
+
+    @property
+    def ended(self) -> bool:
+        return any(m["type"] == "http.response.body" and not m.get("more_body")
+                   for m in self.messages)
+
+
+async def post(app, session_id: str) -> None:
+    async def receive():
+        return {"type": "http.request", "body": b"{}", "more_body": False}
+
+    async def send(message) -> None:
+        pass
+
+    await app({"type": "http", "method": "POST", "path": "/messages/",
+               "query_string": f"session_id={session_id}".encode(), "headers": []},
+              receive, send)
+
+
+def make_app(max_sessions: int) -> tuple[SessionLimitMiddleware, Sessions]:
+    sessions = Sessions(max_sessions=max_sessions, idle_seconds=60, max_rss_mb=0, retry_after=7)
+    return SessionLimitMiddleware(SseApp(), sessions), sessions
+
+
+def test_cap_refuses_new_sessions_with_503():
+    async def run() -> None:
+        app, sessions = make_app(max_sessions=2)
+        first, second = Client(app), Client(app)
+        await asyncio.sleep(0.01)
+        third = Client(app)
+        await asyncio.wait_for(third.task, timeout=1)
+        assert (first.status, second.status, third.status) == (200, 200, 503)
+        assert dict(third.messages[0]["headers"])[b"retry-after"] == b"7"
+        assert len(sessions.open) == 2
+
+        first.disconnected.set()                    # a real disconnect frees a place
+        await asyncio.wait_for(first.task, timeout=1)
+        fourth = Client(app)
+        await asyncio.sleep(0.01)
+        assert fourth.status == 200 and len(sessions.open) == 2
+        second.disconnected.set()
+        fourth.disconnected.set()
+        await asyncio.gather(second.task, fourth.task)
+
+    asyncio.run(run())
+
+
+def test_idle_session_is_evicted_and_makes_room():
+    async def run() -> None:
+        app, sessions = make_app(max_sessions=1)
+        idle = Client(app)
+        await asyncio.sleep(0.01)
+        refused = Client(app)
+        await asyncio.wait_for(refused.task, timeout=1)
+        assert refused.status == 503
+
+        (session,) = sessions.open
+        session.last_seen -= 61
+        assert sessions.sweep() == 1
+        await asyncio.wait_for(idle.task, timeout=1)    # ended without a client disconnect
+        assert idle.ended and sessions.evicted == 1 and not sessions.open
+
+        fresh = Client(app)
+        await asyncio.sleep(0.01)
+        assert fresh.status == 200
+        fresh.disconnected.set()
+        await fresh.task
+
+    asyncio.run(run())
+
+
+def test_posts_keep_a_session_alive():
+    async def run() -> None:
+        app, sessions = make_app(max_sessions=1)
+        client = Client(app)
+        await asyncio.sleep(0.01)
+        (session,) = sessions.open
+        assert session.id == f"{1:032x}"
+
+        session.last_seen -= 61
+        await post(app, session.id)
+        assert session.posts == 1
+        assert sessions.sweep() == 0 and not client.task.done()
+        client.disconnected.set()
+        await client.task
+
+    asyncio.run(run())
@@ -0,0 +1,70 @@
+"""
+timeseries.py – fixed-memory time series
+
+``RingSeries`` keeps the last ``capacity`` (timestamp, value) samples in two
+preallocated ``array('d')`` buffers. Memory stays at 16 bytes per slot no
+matter how long the process runs. The oldest sample is overwritten once the
+buffer is full.
+"""
+
+from __future__ import annotations
+
+import math
+from array import array
+from typing import Iterator, Optional
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Linear-interpolated percentile (q in 0–100) of an already sorted list."""
+    if not sorted_values:
+        return math.nan
+    k = (len(sorted_values) - 1) * q / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    if lo == hi:
+        return sorted_values[int(k)]
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class RingSeries:
+    """Circular buffer of (timestamp, value) pairs."""
+
+    __slots__ = ("capacity", "_ts", "_values", "_next", "_size")
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._ts = array("d", bytes(8 * capacity))
+        self._values = array("d", bytes(8 * capacity))
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, ts: float, value: float) -> None:
+        self._ts[self._next] = ts
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def items(self) -> Iterator[tuple[float, float]]:
+        """Samples oldest first."""
+        start = (self._next - self._size) % self.capacity
+        for i in range(self._size):
+            j = (start + i) % self.capacity
+            yield self._ts[j], self._values[j]
+
+    def since(self, ts: float) -> list[float]:
+        """Values recorded at or after ``ts`` (NaN samples skipped)."""
+        return [v for t, v in self.items() if t >= ts and not math.isnan(v)]
+
+    def last(self) -> Optional[float]:
+        if not self._size:
+            return None
+        return self._values[(self._next - 1) % self.capacity]
+
+    def percentile(self, q: float, since: float = 0.0) -> float:
+        return percentile(sorted(self.since(since)), q)
+
+    def mean(self, since: float = 0.0) -> float:
+        values = self.since(since)
+        return sum(values) / len(values) if values else math.nan
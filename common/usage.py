@@ -0,0 +1,233 @@
+"""
+usage.py – token usage and cost accounting for the watsonx agents
+
+Every finished generation is recorded once, with the token counts watsonx
+reports on its raw response (``input_token_count``, ``generated_token_count``,
+``stop_reason``) and the generation time without queueing:
+
+    ledger = UsageLedger.from_env("watsonx-agent-sse")
+    ledger.record(MODEL_ID, tenant, profile.name, usage, seconds)
+
+``record`` only adds numbers to a dictionary under a lock. Every
+``USAGE_FLUSH_SECONDS`` (default 60) a daemon thread takes the window's
+totals per (agent, model, tenant, profile), adds them to the metrics below
+and appends one compact JSON line per key to ``USAGE_LOG_PATH``, if set:
+
+    {"ts":1760860800,"win":60.0,"pid":4242,"agent":"watsonx-agent-sse",
+     "model":"ibm/granite-3-3-8b-instruct","tenant":"ui","profile":"balanced",
+     "n":42,"in":9120,"out":6300,"s":118.4,"tps":53.2,"max_out":400,
+     "max_s":7.9,"runaway":3,"cost":0.0031}
+
+``tps`` is output tokens per generation second over the window, so latency
+can be read against token volume. The log rolls over to ``<path>.1`` at
+``USAGE_LOG_MAX_MB``. ``cost`` is only present for models with a price in
+``USAGE_PRICES`` (``model=input/output`` per million tokens, comma
+separated, e.g. ``ibm/granite-3-3-8b-instruct=0.20/0.20``).
+
+A generation is a runaway when watsonx stopped it at a limit
+(``max_tokens``, ``token_limit`` or ``time_limit``) rather than at an end
+of sequence or stop sequence. Runaways are counted and logged as warnings,
+once per key and window.
+
+Replies served from the model daemon's cache carry the original usage
+with ``cached`` set and are not counted: no tokens were spent on them.
+
+Metrics (updated at each flush)
+───────────────────────────────
+usage_generations_total{agent,model,tenant,profile}
+usage_tokens_total{agent,model,tenant,profile,kind}            input | output
+usage_generation_seconds_total{agent,model,tenant,profile}
+usage_runaway_generations_total{agent,model,tenant,profile}
+usage_cost_total{agent,model,tenant,profile}                   with USAGE_PRICES
+usage_tokens_per_second{agent,model,profile}                   last window
+
+Tenant names become label values: keep them to a bounded set. The agents
+pass them through ``FairScheduler.tenant`` first, which maps every name
+not configured in ``SCHEDULER_WEIGHTS`` to ``default``.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Mapping, Optional
+
+from common import metrics
+
+logger = logging.getLogger("usage")
+
+LABELS = ["agent", "model", "tenant", "profile"]
+GENERATIONS = metrics.counter("usage_generations_total", "Recorded generations", LABELS)
+TOKENS = metrics.counter("usage_tokens_total", "Tokens by kind (input | output)",
+                         LABELS + ["kind"])
+SECONDS = metrics.counter("usage_generation_seconds_total",
+                          "Generation time, without queue waits", LABELS)
+RUNAWAYS = metrics.counter("usage_runaway_generations_total",
+                           "Generations stopped at a token or time limit", LABELS)
+COST = metrics.counter("usage_cost_total", "Cost at USAGE_PRICES", LABELS)
+THROUGHPUT = metrics.gauge("usage_tokens_per_second",
+                           "Output tokens per generation second, last flush window",
+                           ["agent", "model", "profile"])
+
+RUNAWAY_STOPS = ("max_tokens", "token_limit", "time_limit")
+
+
+def parse_prices(spec: str) -> dict[str, tuple[float, float]]:
+    """``model=in/out,…`` (per million tokens) → {model: (in, out) per token}."""
+    prices = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, pair = entry.rpartition("=")
+        given, _, taken = pair.partition("/")
+        try:
+            if not model:
+                raise ValueError
+            prices[model] = (float(given) / 1e6, float(taken or given) / 1e6)
+        except ValueError:
+            raise ValueError(f"USAGE_PRICES: expected model=input/output, got {entry!r}") from None
+    return prices
+
+
+@dataclass
+class Window:
+    """Totals for one (agent, model, tenant, profile) since the last flush."""
+
+    n: int = 0
+    input: int = 0
+    output: int = 0
+    seconds: float = 0.0
+    max_output: int = 0
+    max_seconds: float = 0.0
+    runaway: int = 0
+
+
+class UsageLedger:
+    """Per-process usage totals, flushed to metrics and the usage log."""
+
+    def __init__(self, agent: str, log_path: Optional[str] = None,
+                 flush_seconds: float = 60.0, log_max_bytes: int = 16 * 1024 * 1024,
+                 prices: Optional[Mapping[str, tuple[float, float]]] = None) -> None:
+        self.agent = agent
+        self.log_path = Path(log_path) if log_path else None
+        self.flush_seconds = flush_seconds
+        self.log_max_bytes = log_max_bytes
+        self.prices = dict(prices or {})
+        self._windows: dict[tuple, Window] = {}
+        self._window_start = time.time()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, agent: str) -> "UsageLedger":
+        """Built from ``USAGE_*`` settings; ``USAGE_AGENT`` overrides the agent name."""
+        ledger = cls(
+            os.getenv("USAGE_AGENT", agent),
+            log_path=os.getenv("USAGE_LOG_PATH"),
+            flush_seconds=float(os.getenv("USAGE_FLUSH_SECONDS", "60")),
+            log_max_bytes=int(float(os.getenv("USAGE_LOG_MAX_MB", "16")) * 1024 * 1024),
+            prices=parse_prices(os.getenv("USAGE_PRICES", "")),
+        )
+        ledger.start()
+        return ledger
+
+    # ── recording ────────────────────────────────────────────────
+    def record(self, model: str, tenant: Optional[str], profile: str,
+               usage: Mapping, seconds: float) -> None:
+        """One finished generation; ``usage`` as returned by ``collect_stream``."""
+        if usage.get("cached"):
+            return
+        output = int(usage.get("generated_tokens") or 0)
+        runaway = usage.get("stop_reason") in RUNAWAY_STOPS
+        key = (model, tenant or "default", profile)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = Window()
+            window.n += 1
+            window.input += int(usage.get("input_tokens") or 0)
+            window.output += output
+            window.seconds += seconds
+            window.max_output = max(window.max_output, output)
+            window.max_seconds = max(window.max_seconds, seconds)
+            window.runaway += runaway
+            first_runaway = runaway and window.runaway == 1
+        if first_runaway:
+            logger.warning("Runaway generation (%s/%s/%s): stopped at %s after %d tokens in %.1fs",
+                           model, key[1], profile, usage.get("stop_reason"), output, seconds)
+
+    # ── flushing ─────────────────────────────────────────────────
+    def start(self) -> None:
+        """Flush every ``flush_seconds`` (0 = only at exit) in a daemon thread, and at exit."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="usage-flush", daemon=True)
+        if self.flush_seconds > 0:
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception:  # never let the flusher die
+                logger.exception("Usage flush failed")
+
+    def close(self) -> None:
+        self._stop.set()
+        self.flush()
+
+    def flush(self) -> int:
+        """Move the window's totals to metrics and the log. Returns the keys written."""
+        with self._flush_lock:
+            now = time.time()
+            with self._lock:
+                windows, self._windows = self._windows, {}
+                span, self._window_start = now - self._window_start, now
+            lines = []
+            for (model, tenant, profile), w in windows.items():
+                labels = {"agent": self.agent, "model": model, "tenant": tenant,
+                          "profile": profile}
+                GENERATIONS.inc(w.n, **labels)
+                TOKENS.inc(w.input, kind="input", **labels)
+                TOKENS.inc(w.output, kind="output", **labels)
+                SECONDS.inc(w.seconds, **labels)
+                if w.runaway:
+                    RUNAWAYS.inc(w.runaway, **labels)
+                tps = w.output / w.seconds if w.seconds else None
+                if tps is not None:
+                    THROUGHPUT.set(tps, agent=self.agent, model=model, profile=profile)
+                line = {"ts": int(now), "win": round(span, 1), "pid": os.getpid(), **labels,
+                        "n": w.n, "in": w.input, "out": w.output, "s": round(w.seconds, 3),
+                        "tps": round(tps, 1) if tps is not None else None,
+                        "max_out": w.max_output, "max_s": round(w.max_seconds, 3),
+                        "runaway": w.runaway}
+                price = self.prices.get(model)
+                if price is not None:
+                    cost = w.input * price[0] + w.output * price[1]
+                    COST.inc(cost, **labels)
+                    line["cost"] = round(cost, 6)
+                lines.append(json.dumps(line, separators=(",", ":")) + "\n")
+            if lines and self.log_path is not None:
+                self._append("".join(lines))
+            return len(lines)
+
+    def _append(self, text: str) -> None:
+        try:
+            if self.log_path.exists() and self.log_path.stat().st_size >= self.log_max_bytes:
+                os.replace(self.log_path, self.log_path.with_name(self.log_path.name + ".1"))
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            # one write per flush on an O_APPEND file: workers do not interleave lines
+            fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, text.encode("utf-8"))
+            finally:
+                os.close(fd)
+        except OSError as exc:
+            logger.warning("Writing the usage log %s failed: %s", self.log_path, exc)
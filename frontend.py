@@ -14,13 +14,16 @@ from contextlib import asynccontextmanager     # FIX: use contextlib for lifespa
 import httpx
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles # 1. IMPORT THIS
+from fastapi import FastAPI, HTTPException, Request
 
 
 from pydantic import BaseModel
 
+# Shared helpers live in ./common
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from common.logsetup import configure_logging  # noqa: E402
+from common.static_assets import StaticAssets  # noqa: E402
+
 # ─────────────────── config & logging ────────────────────
 load_dotenv()
 GATEWAY_RPC     = os.getenv("GATEWAY_RPC",     "http://localhost:4444/rpc")
@@ -32,7 +35,8 @@ BASIC_AUTH_PASS = (
 )
 JWT_SECRET_KEY  = os.getenv("JWT_SECRET_KEY",  "my-test-key")
 
-logging.basicConfig(
+# LOG_MODE=async moves formatting and I/O off the request path (see common/logsetup.py)
+configure_logging(
     level=logging.DEBUG,
     format="%(asctime)s %(levelname)s %(name)s: %(message)s",
 )
@@ -83,17 +87,24 @@ async def lifespan(app: FastAPI):
 
 app = FastAPI(title="Chatbot Frontend", lifespan=lifespan)
 
-STATIC_DIR = os.path.join(FRONTEND_DIR, "static")
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
-
+# Static files and the page are loaded into memory once
+assets     = StaticAssets(FRONTEND_DIR / "static")
+INDEX_PAGE = assets.page(INDEX_HTML)
 
 
 @app.get("/", include_in_schema=False)
-async def root():
-    return FileResponse(INDEX_HTML) if INDEX_HTML.exists() else {
+async def root(request: Request):
+    return assets.respond(request, INDEX_PAGE) if INDEX_PAGE else {
         "detail": "index.html missing in ./frontend/"
     }
 
+@app.get("/static/{path:path}", include_in_schema=False)
+async def static(request: Request, path: str):
+    found = assets.lookup(path)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return assets.respond(request, *found)
+
 @app.post("/call", response_model=ChatResponse)
 async def call_tool(req: ChatRequest):
     tool   = req.tool.replace("/", "-")
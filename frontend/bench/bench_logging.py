@@ -0,0 +1,106 @@
+# bench/bench_logging.py
+"""
+Request-path cost of logging a prompt and a reply, per logging mode.
+
+Simulates the two INFO lines `ui.py` writes per chat ("💬 Prompt",
+"💡 Reply") with realistic payload sizes. Each mode is run twice: once
+against a fast local file, and once against a sink that blocks for
+--io-latency-us per write, like a full pipe, journald under pressure or a
+network disk. The figure reported is the time spent on the calling thread
+(the latency a request pays), plus the bytes that reach the sink.
+
+Run
+───
+
+python bench/bench_logging.py
+python bench/bench_logging.py --requests 50000 --prompt-chars 4000 --io-latency-us 500
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common import logsetup  # noqa: E402
+
+MODES = {
+    "sync, full text (today)": {"LOG_MODE": "sync"},
+    "sync, truncated 256": {"LOG_MODE": "sync", "LOG_MAX_CHARS": "256"},
+    "async json, truncated": {"LOG_MODE": "async", "LOG_SAMPLE_RPS": "0"},
+    "async json, trunc+sampled": {"LOG_MODE": "async"},
+}
+KNOBS = ("LOG_MODE", "LOG_MAX_CHARS", "LOG_SAMPLE_RPS", "LOG_SAMPLE_RATE", "LOG_FORMAT")
+
+
+class BlockingSink:
+    """File wrapper whose writes block for a fixed time (GIL released)."""
+
+    def __init__(self, fh, latency_s: float) -> None:
+        self.fh = fh
+        self.latency_s = latency_s
+
+    def write(self, data: str) -> int:
+        time.sleep(self.latency_s)
+        return self.fh.write(data)
+
+    def flush(self) -> None:
+        self.fh.flush()
+
+
+def run_mode(env: dict, requests: int, prompt: str, reply: str,
+             io_latency_s: float) -> tuple[float, int]:
+    for knob in KNOBS:
+        os.environ.pop(knob, None)
+    os.environ.update(env)
+    fd, path = tempfile.mkstemp(suffix=".log")
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        logsetup.configure_logging(
+            level=logging.INFO,
+            format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+            stream=BlockingSink(fh, io_latency_s) if io_latency_s else fh,
+        )
+        log = logging.getLogger("frontend")
+        start = time.perf_counter()
+        for i in range(requests):
+            log.info("🎯 Agent: %s | 💬 Prompt: %s", "watsonx-agent", prompt)
+            log.info("💡 Reply: %s", reply)
+        elapsed = time.perf_counter() - start
+        # stop the writer thread so every queued record reaches the file
+        logsetup.configure_logging(stream=sys.stderr)
+        fh.flush()
+    size = os.path.getsize(path)
+    os.unlink(path)
+    return elapsed, size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Logging overhead on the request path")
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--prompt-chars", type=int, default=2_000)
+    parser.add_argument("--reply-chars", type=int, default=4_000)
+    parser.add_argument("--io-latency-us", type=float, default=200.0,
+                        help="blocking time per write for the slow-sink run")
+    opts = parser.parse_args()
+
+    prompt = ("Tell me about the MCP gateway. " * 100)[: opts.prompt_chars]
+    reply = ("The gateway federates agents. " * 300)[: opts.reply_chars]
+
+    for sink, latency_s in (("local file", 0.0),
+                            (f"sink blocking {opts.io_latency_us:.0f} µs/write",
+                             opts.io_latency_us / 1e6)):
+        baseline = None
+        print(f"\n{sink}")
+        print(f"{'mode':<28}{'µs/request':>12}{'MB written':>12}{'vs today':>10}")
+        for name, env in MODES.items():
+            elapsed, size = run_mode(env, opts.requests, prompt, reply, latency_s)
+            per_req = elapsed / opts.requests * 1e6
+            baseline = baseline or per_req
+            print(f"{name:<28}{per_req:>12.1f}{size / 1e6:>12.1f}{per_req / baseline:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
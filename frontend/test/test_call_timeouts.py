@@ -0,0 +1,73 @@
+"""
+Adaptive timeouts of /call: only timeouts at the adaptive limit are samples,
+and the agent is told the browser's budget, not the adaptive limit.
+
+    python -m pytest frontend/test
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import ui  # noqa: E402
+from common.adaptive_timeout import AdaptiveTimeouts  # noqa: E402
+
+AGENT = "slow-agent"
+sent: list[dict] = []
+headers: list[httpx.Headers] = []
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """The frontend, with a gateway that takes a second to answer."""
+    async def slow_gateway(request: httpx.Request) -> httpx.Response:
+        sent.append(json.loads(request.content))
+        headers.append(request.headers)
+        await asyncio.sleep(1)
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": 1, "result": {}})
+
+    sent.clear()
+    headers.clear()
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(ui.httpx, "AsyncClient",
+                        lambda **kw: real_client(transport=httpx.MockTransport(slow_gateway), **kw))
+    monkeypatch.setattr(ui, "mint_jwt", lambda: "token")
+    monkeypatch.setattr(ui, "agent_timeouts", AdaptiveTimeouts(floor=0.05, ceiling=0.3,
+                                                               min_samples=3))
+    return TestClient(ui.app)
+
+
+def call(client, headers=None):
+    return client.post("/call", json={"tool": AGENT, "args": {"prompt": "hi"}},
+                       headers=headers or {})
+
+
+def test_short_client_budget_is_not_a_sample(client):
+    before = ui.agent_timeouts.timeout(AGENT, "chat")
+    for _ in range(5):
+        assert call(client, {"X-Request-Timeout-Ms": "100"}).status_code == 504
+    assert ui.agent_timeouts.timeout(AGENT, "chat") == before
+    assert ui.agent_timeouts.snapshot()[f"{AGENT}/chat"]["samples"] == 0
+
+
+def test_timeout_at_the_adaptive_limit_is_a_sample(client):
+    assert call(client).status_code == 504
+    assert ui.agent_timeouts.snapshot()[f"{AGENT}/chat"]["samples"] == 1
+
+
+def test_agent_gets_the_client_budget(client, monkeypatch):
+    monkeypatch.setattr(ui, "DEADLINE_PARAM", "timeout_ms")
+    call(client, {"X-Request-Timeout-Ms": "2000"})
+    # the adaptive limit (0.3 s) cuts the call short, but is not passed on
+    assert 1000 < sent[0]["params"]["timeout_ms"] <= 1500
+
+
+def test_budget_is_not_a_tool_argument_by_default(client):
+    call(client, {"X-Request-Timeout-Ms": "2000"})
+    assert sent[0]["params"] == {"query": "hi"}
+    assert 1000 < int(headers[0]["x-request-timeout-ms"]) <= 1500
@@ -8,6 +8,7 @@ import sys
 import subprocess
 import logging
 import re
+import time
 from pathlib import Path
 from typing import List
 from contextlib import asynccontextmanager
@@ -15,16 +16,29 @@ from contextlib import asynccontextmanager
 import httpx
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel
 
-# ─────────────────── config & logging ────────────────────
-# Load .env file from the parent directory (project root)
+# Load .env file from the parent directory (project root), before the shared
+# helpers: some of them read settings at import
 dotenv_path = Path(__file__).parent.parent / '.env'
 load_dotenv(dotenv_path=dotenv_path)
 
+# Shared helpers live in <repo>/common
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import metrics  # noqa: E402
+from common.adaptive_timeout import AdaptiveTimeouts, hedged  # noqa: E402
+from common.deadline import (  # noqa: E402
+    ClientDisconnected, Deadline, DeadlineExceeded, WorkTracker, run_guarded,
+)
+from common.drain import CLOSE_SECONDS, PROBE_PATHS, Drain, DrainMiddleware  # noqa: E402
+from common.logsetup import configure_logging  # noqa: E402
+from common.profiling import ProfilingMiddleware, admin_router  # noqa: E402
+from common.prompt_limit import PromptLimit, PromptTooLong  # noqa: E402
+from common.static_assets import StaticAssets  # noqa: E402
+
+# ─────────────────── config & logging ────────────────────
 GATEWAY_URL = os.getenv("GATEWAY_URL", "http://localhost:4444")
 GATEWAY_RPC = f"{GATEWAY_URL}/rpc"
 BASIC_AUTH_USER = os.getenv("BASIC_AUTH_USER", "admin")
@@ -36,7 +50,21 @@ BASIC_AUTH_PASS = (
 )
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "my-test-key")
 
-logging.basicConfig(
+# Default budgets when the browser sends no X-Request-Timeout-Ms header.
+# The remaining budget is passed on in the X-Request-Timeout-Ms header, and
+# also as the tool argument DEADLINE_PARAM if set (e.g. timeout_ms for
+# server_sse.py). That is off by default: agents whose tools do not declare
+# the argument would reject the call.
+# Agent calls get at most their adaptive timeout, CALL_TIMEOUT_SECONDS by default;
+# that cap is ours and is not passed on.
+AGENTS_TIMEOUT_SECONDS = float(os.getenv("AGENTS_TIMEOUT_SECONDS", "10"))
+CALL_TIMEOUT_SECONDS = float(os.getenv("CALL_TIMEOUT_SECONDS", "60"))
+MAX_TIMEOUT_SECONDS = float(os.getenv("MAX_TIMEOUT_SECONDS", "300"))
+DEADLINE_PARAM = os.getenv("DEADLINE_PARAM", "")
+HOP_RESERVE_SECONDS = 0.5   # kept back so our own 504 beats the agent's
+
+# LOG_MODE=async moves formatting and I/O off the request path (see common/logsetup.py)
+configure_logging(
     level=logging.DEBUG,
     format="%(asctime)s %(levelname)s %(name)s: %(message)s",
 )
@@ -48,6 +76,41 @@ logging.getLogger("httpcore").setLevel(logging.WARNING)
 FRONTEND_DIR = Path(__file__).parent
 INDEX_HTML = FRONTEND_DIR / "main.html"
 
+gateway_work = WorkTracker("gateway")
+
+# Per-agent call timeouts from observed latency, CALL_TIMEOUT_SECONDS until
+# there are enough samples; optional hedging (TIMEOUT_*, HEDGE_*; common/adaptive_timeout.py)
+agent_timeouts = AdaptiveTimeouts.from_env(CALL_TIMEOUT_SECONDS)
+
+# Oversized prompts are truncated, rejected (413) or summarized here, before
+# the gateway round trip (PROMPT_MAX_TOKENS, PROMPT_OVERFLOW; common/prompt_limit.py)
+prompt_limit = PromptLimit.from_env()
+
+# SIGTERM drains before exiting, SIGHUP reloads the settings above (common/drain.py)
+drain = Drain()
+
+def reload_config() -> None:
+    """SIGHUP: gateway URL, credentials and budgets from the .env file or environment."""
+    global GATEWAY_URL, GATEWAY_RPC, BASIC_AUTH_USER, BASIC_AUTH_PASS, JWT_SECRET_KEY
+    global AGENTS_TIMEOUT_SECONDS, CALL_TIMEOUT_SECONDS, MAX_TIMEOUT_SECONDS, DEADLINE_PARAM
+    global agent_timeouts
+    load_dotenv(dotenv_path=dotenv_path, override=True)
+    timeouts = [float(os.getenv(name, default)) for name, default in (
+        ("AGENTS_TIMEOUT_SECONDS", "10"), ("CALL_TIMEOUT_SECONDS", "60"),
+        ("MAX_TIMEOUT_SECONDS", "300"))]
+    AGENTS_TIMEOUT_SECONDS, CALL_TIMEOUT_SECONDS, MAX_TIMEOUT_SECONDS = timeouts
+    # built before the swap, so bad TIMEOUT_LIMITS keep the old settings; latency is learnt again
+    agent_timeouts = AdaptiveTimeouts.from_env(CALL_TIMEOUT_SECONDS)
+    GATEWAY_URL = os.getenv("GATEWAY_URL", "http://localhost:4444")
+    GATEWAY_RPC = f"{GATEWAY_URL}/rpc"
+    BASIC_AUTH_USER = os.getenv("BASIC_AUTH_USER", "admin")
+    BASIC_AUTH_PASS = os.getenv("BASIC_AUTH_PASS") or os.getenv("BASIC_AUTH_PASSWORD") or "adminpw"
+    JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "my-test-key")
+    DEADLINE_PARAM = os.getenv("DEADLINE_PARAM", "")
+    logger.info("Settings reloaded; gateway at %s", GATEWAY_URL)
+
+drain.on_reload(reload_config)
+
 # ─────────────────── pydantic models ─────────────────────
 class ChatArgs(BaseModel):
     prompt: str
@@ -96,35 +159,70 @@ async def lifespan(app: FastAPI):
 
 app = FastAPI(title="Dynamic Chatbot Frontend", lifespan=lifespan)
 
-# Mount static files directory (for images, css, etc.)
+# On-demand profiling under /admin/profile, only when ADMIN_TOKEN is set
+app.add_middleware(ProfilingMiddleware)
+admin = admin_router()
+if admin is not None:
+    app.include_router(admin)
+
+# Outermost: while draining, new requests get 503 and probes still answer
+app.add_middleware(DrainMiddleware, drain=drain, passthrough=PROBE_PATHS + ("/admin/",))
+
+# Static files (images, css, etc.) and the page are held in memory
 STATIC_DIR = FRONTEND_DIR / "static"
-if STATIC_DIR.is_dir():
-    app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
-    logger.info("Serving static files from: %s", STATIC_DIR)
+assets = StaticAssets(STATIC_DIR)
+INDEX_PAGE = assets.page(INDEX_HTML)
+logger.info("Loaded %d static files from: %s", len(assets), STATIC_DIR)
 
 # ─────────────────── API endpoints ───────────────────────
 @app.get("/", include_in_schema=False)
-async def root():
+async def root(request: Request):
     """Serves the main index.html file."""
-    if not INDEX_HTML.is_file():
+    if INDEX_PAGE is None:
         return JSONResponse(
             status_code=404,
             content={"detail": "main.html not found in this directory."}
         )
-    return FileResponse(INDEX_HTML)
+    return assets.respond(request, INDEX_PAGE)
+
+@app.get("/static/{path:path}", include_in_schema=False)
+async def static(request: Request, path: str):
+    """Serves a preloaded static file; fingerprinted names are immutable."""
+    found = assets.lookup(path)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return assets.respond(request, *found)
+
+@app.get("/livez", include_in_schema=False)
+async def livez():
+    """The process is up and its event loop answers."""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """503 while the frontend drains, so the load balancer sends traffic elsewhere."""
+    return JSONResponse(status_code=503 if drain.draining else 200,
+                        content={"status": "not ready" if drain.draining else "ready",
+                                 "drain": drain.status()})
+
+@app.get("/metrics", include_in_schema=False, response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    """Prometheus metrics, including cancelled gateway calls, time saved and agent timeouts."""
+    return metrics.render()
 
 @app.get("/agents", response_model=List[Agent])
-async def get_agents():
+async def get_agents(request: Request):
     """Fetches the list of active agents (servers) from the MCP Gateway."""
     logger.info("Fetching list of active agents from gateway...")
+    deadline = Deadline.from_headers(request.headers, AGENTS_TIMEOUT_SECONDS, MAX_TIMEOUT_SECONDS)
     try:
         jwt_token = mint_jwt()
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    headers = {"Authorization": f"Bearer {jwt_token}"}
+    headers = {"Authorization": f"Bearer {jwt_token}", **deadline.header()}
     
-    async with httpx.AsyncClient(timeout=10) as client:
+    async with httpx.AsyncClient(timeout=deadline.remaining()) as client:
         try:
             resp = await client.get(f"{GATEWAY_URL}/servers", headers=headers)
             resp.raise_for_status()
@@ -141,13 +239,29 @@ async def get_agents():
             raise HTTPException(status_code=e.response.status_code, detail="Error fetching agents from gateway.")
 
 @app.post("/call", response_model=ChatResponse)
-async def call_tool(req: ChatRequest):
-    """Calls a specific tool on the MCP Gateway."""
+async def call_tool(req: ChatRequest, request: Request):
+    """
+    Calls a specific tool on the MCP Gateway. The gateway call is cancelled
+    when the browser disconnects or the request's deadline passes: the
+    browser's budget, capped at the agent's adaptive timeout.
+    """
     # FIX: The method for the gateway is the agent name plus '/chat'
     agent_name = req.tool
     method = f"{agent_name}/chat"
-    prompt = req.args.prompt
-    logger.info("🎯 Agent: %s | 💬 Prompt: %s", agent_name, prompt)
+    timeouts = agent_timeouts
+    limit = min(timeouts.timeout(agent_name, "chat"), MAX_TIMEOUT_SECONDS)
+    budget = Deadline.from_headers(request.headers, CALL_TIMEOUT_SECONDS, MAX_TIMEOUT_SECONDS)
+    # Only a timeout at the adaptive limit says something about the agent
+    adaptive = limit <= budget.remaining()
+    deadline = Deadline(limit) if adaptive else budget
+    try:
+        checked = prompt_limit.apply(req.args.prompt)
+    except PromptTooLong as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    prompt = checked.prompt
+    # the text only at DEBUG, and capped: it is the longest thing logged per call
+    logger.info("🎯 Agent: %s | 💬 Prompt: ~%d tokens (%s)", agent_name, checked.tokens, checked.action)
+    logger.debug("Prompt text: %.200s", prompt)
 
     # FIX: The JSON-RPC payload requires the 'method' field to be correctly formatted.
     payload = {
@@ -162,22 +276,48 @@ async def call_tool(req: ChatRequest):
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    headers = {"Authorization": f"Bearer {jwt_token}"}
-
-    async with httpx.AsyncClient(timeout=60) as client:
-        try:
+    async def send() -> httpx.Response:
+        # Budgets are computed at send time, after the JWT has been minted. The
+        # agent gets the browser's budget: it picks a generation profile by it,
+        # and the adaptive limit would make a slow agent pick ever faster ones
+        if DEADLINE_PARAM:
+            payload["params"][DEADLINE_PARAM] = budget.timeout_ms(HOP_RESERVE_SECONDS)
+        headers = {"Authorization": f"Bearer {jwt_token}", **budget.header(HOP_RESERVE_SECONDS)}
+        async with httpx.AsyncClient(timeout=deadline.remaining()) as client:
             resp = await client.post(GATEWAY_RPC, json=payload, headers=headers)
             resp.raise_for_status()
-        except httpx.HTTPStatusError as exc:
-            logger.error("Gateway error body: %s", exc.response.text)
-            raise HTTPException(
-                status_code=exc.response.status_code,
-                detail=f"Gateway error: {exc.response.text}"
-            )
-        except Exception as exc:
-            logger.exception("Gateway connection failed")
-            raise HTTPException(status_code=502, detail=str(exc))
+            return resp
+
+    async def forward() -> httpx.Response:
+        resp, winner = await hedged(send, timeouts.hedge_delay(agent_name, "chat"))
+        if winner:
+            timeouts.hedged(agent_name, "chat", winner)
+        return resp
+
+    started = time.monotonic()
+    try:
+        resp = await run_guarded(forward, deadline, gateway_work, request.is_disconnected)
+    except ClientDisconnected:
+        logger.info("Client disconnected; cancelled gateway call to %s", agent_name)
+        return Response(status_code=499)
+    except (DeadlineExceeded, httpx.TimeoutException):
+        # counted at the time it hit, so a timeout set too tight grows back;
+        # a shorter budget from the browser is not the agent being slow
+        if adaptive:
+            timeouts.observe(agent_name, "chat", time.monotonic() - started)
+        logger.warning("Deadline exceeded waiting for %s", agent_name)
+        raise HTTPException(status_code=504, detail="The agent did not answer in time.")
+    except httpx.HTTPStatusError as exc:
+        logger.error("Gateway error body: %s", exc.response.text)
+        raise HTTPException(
+            status_code=exc.response.status_code,
+            detail=f"Gateway error: {exc.response.text}"
+        )
+    except Exception as exc:
+        logger.exception("Gateway connection failed")
+        raise HTTPException(status_code=502, detail=str(exc))
 
+    timeouts.observe(agent_name, "chat", time.monotonic() - started)
     data = resp.json()
     
     # Check for RPC error in the response first
@@ -206,4 +346,5 @@ async def call_tool(req: ChatRequest):
 
 # ─────────────────── entrypoint ──────────────────────────
 if __name__ == "__main__":
-    uvicorn.run("ui:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("ui:app", host="0.0.0.0", port=8000, reload=True,
+                timeout_graceful_shutdown=CLOSE_SECONDS)
\ No newline at end of file
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+monitor.py – monitoring daemon for the MCP Gateway, frontends and agents
+
+Every --interval seconds, each target gets:
+  • a synthetic probe: an HTTP GET, or a JSON-RPC call through the gateway's
+    /rpc with an admin JWT. Latency and success are recorded;
+  • CPU % and RSS summed over the processes whose command line matches the
+    target's `process` pattern (read from /proc, no pgrep/ss).
+
+Samples go into fixed-size ring buffers (common/timeseries.py). --history
+slots per metric, so memory is bounded however long the daemon runs. The
+history is served over HTTP:
+
+  GET /summary                     p50/p95, error rate, CPU, RSS, drift per target
+  GET /series?target=…&metric=…    raw samples (latency_ms, error, cpu_pct, rss_mb)
+  GET /metrics                     Prometheus text format
+
+--export FILE appends one JSON line per target per tick, for offline
+analysis. `drift` is the recent p95 divided by the p95 over the whole
+window. A warning is logged when it exceeds --drift-alert.
+
+Run
+───
+python monitor.py                                   # built-in local targets
+python monitor.py --config monitor.example.json --interval 5 --port 9100
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import httpx
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+
+# Shared helpers live in ./common
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from common.logsetup import configure_logging  # noqa: E402
+from common.timeseries import RingSeries  # noqa: E402
+
+# ─────────────────── config & logging ────────────────────
+load_dotenv()
+GATEWAY_URL     = os.getenv("GATEWAY_URL",     "http://localhost:4444")
+BASIC_AUTH_USER = os.getenv("BASIC_AUTH_USER", "admin")
+JWT_SECRET_KEY  = os.getenv("JWT_SECRET_KEY",  "my-test-key")
+TOKEN_TTL_MIN   = 60
+
+configure_logging(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+logger = logging.getLogger("monitor")
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+METRICS = ("latency_ms", "error", "cpu_pct", "rss_mb")
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+DEFAULT_TARGETS = [
+    {"name": "gateway", "rpc": {"method": "tools/list"}, "process": r"mcpgateway"},
+    {"name": "frontend", "url": "http://localhost:8000/", "process": r"ui:app|frontend\.py"},
+    {"name": "watsonx-http-agent", "url": "http://localhost:8082/readyz",
+     "process": r"main:app|python_watsonx_agent/main\.py"},
+]
+
+
+# ─────────────────── targets & samples ───────────────────
+@dataclass
+class Target:
+    name: str
+    url: Optional[str] = None         # HTTP GET probe
+    rpc: Optional[dict] = None        # {"method": …, "params": {…}} sent to GATEWAY_URL/rpc
+    process: Optional[str] = None     # regex over /proc/<pid>/cmdline
+    every: int = 1                    # probe on every Nth tick (expensive chat probes)
+    timeout: float = 10.0
+    series: dict[str, RingSeries] = field(default_factory=dict)
+    _cpu_prev: dict[int, tuple[float, float]] = field(default_factory=dict)
+
+    def record(self, ts: float, metric: str, value: float) -> None:
+        self.series[metric].append(ts, value)
+
+
+def load_targets(path: Optional[Path], history: int) -> list[Target]:
+    specs = json.loads(path.read_text()) if path else DEFAULT_TARGETS
+    targets = []
+    for spec in specs:
+        target = Target(**spec)
+        target.series = {m: RingSeries(history) for m in METRICS}
+        targets.append(target)
+    return targets
+
+
+class TokenSource:
+    """Admin JWT for /rpc probes, re-minted before it expires."""
+
+    def __init__(self) -> None:
+        self._token: Optional[str] = os.getenv("ADMIN_TOKEN")
+        self._static = self._token is not None
+        self._minted = 0.0
+
+    def get(self) -> str:
+        if not self._static and time.time() - self._minted > (TOKEN_TTL_MIN - 5) * 60:
+            cmd = [sys.executable, "-m", "mcpgateway.utils.create_jwt_token",
+                   "--username", BASIC_AUTH_USER, "--secret", JWT_SECRET_KEY,
+                   "--exp", str(TOKEN_TTL_MIN)]
+            self._token = subprocess.check_output(cmd, text=True, stderr=subprocess.PIPE).strip()
+            self._minted = time.time()
+        return self._token or ""
+
+
+# ─────────────────── probes ──────────────────────────────
+async def probe(client: httpx.AsyncClient, target: Target, tokens: TokenSource) -> tuple[float, bool]:
+    start = time.perf_counter()
+    try:
+        if target.rpc is not None:
+            body = {"jsonrpc": "2.0", "id": 1, "params": {}, **target.rpc}
+            resp = await client.post(f"{GATEWAY_URL}/rpc", json=body, timeout=target.timeout,
+                                     headers={"Authorization": f"Bearer {tokens.get()}"})
+            ok = resp.status_code == 200 and "error" not in resp.json()
+        else:
+            resp = await client.get(target.url, timeout=target.timeout)
+            ok = resp.status_code < 400
+    except (httpx.HTTPError, ValueError, subprocess.CalledProcessError, FileNotFoundError):
+        ok = False
+    return (time.perf_counter() - start) * 1000, ok
+
+
+def matching_pids(pattern: re.Pattern) -> list[int]:
+    me = os.getpid()
+    pids = []
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit() or int(entry.name) == me:
+            continue
+        try:
+            with open(f"/proc/{entry.name}/cmdline", "rb") as fh:
+                cmdline = fh.read().replace(b"\0", b" ").decode(errors="replace")
+        except OSError:
+            continue
+        if pattern.search(cmdline):
+            pids.append(int(entry.name))
+    return pids
+
+
+def sample_processes(target: Target, now: float) -> tuple[float, float, int]:
+    """(cpu %, rss MB, process count) summed over the target's processes."""
+    pids = matching_pids(re.compile(target.process))
+    cpu, rss, seen = 0.0, 0, {}
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as fh:
+                fields = fh.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{pid}/statm") as fh:
+                rss += int(fh.read().split()[1]) * PAGE_SIZE
+        except (OSError, IndexError):
+            continue
+        cpu_s = (int(fields[11]) + int(fields[12])) / CLK_TCK   # utime + stime
+        seen[pid] = (now, cpu_s)
+        prev = target._cpu_prev.get(pid)
+        if prev and now > prev[0]:
+            cpu += (cpu_s - prev[1]) / (now - prev[0]) * 100
+    target._cpu_prev = seen
+    return cpu, rss / 1e6, len(seen)
+
+
+# ─────────────────── monitor loop ────────────────────────
+def summarise(target: Target, recent_s: float) -> dict:
+    now = time.time()
+    latency = target.series["latency_ms"]
+    errors = target.series["error"].since(0)
+    p95_all, p95_recent = latency.percentile(95), latency.percentile(95, since=now - recent_s)
+    row = {
+        "target": target.name,
+        "samples": len(latency),
+        "p50_ms": latency.percentile(50),
+        "p95_ms": p95_all,
+        "p95_recent_ms": p95_recent,
+        "drift": p95_recent / p95_all if p95_all and not math.isnan(p95_all) else math.nan,
+        "error_rate": sum(errors) / len(errors) if errors else math.nan,
+        "cpu_pct": target.series["cpu_pct"].last(),
+        "rss_mb": target.series["rss_mb"].last(),
+    }
+    return {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in row.items()}
+
+
+async def monitor_loop(targets: list[Target], opts: argparse.Namespace) -> None:
+    tokens = TokenSource()
+    export = open(opts.export, "a", encoding="utf-8") if opts.export else None
+    tick = 0
+    async with httpx.AsyncClient() as client:
+        while True:
+            started = time.monotonic()
+            now = time.time()
+            due = [t for t in targets if (t.url or t.rpc) and tick % t.every == 0]
+            results = await asyncio.gather(*(probe(client, t, tokens) for t in due))
+            for target, (latency_ms, ok) in zip(due, results):
+                target.record(now, "latency_ms", latency_ms)
+                target.record(now, "error", 0.0 if ok else 1.0)
+            for target in targets:
+                nprocs = None
+                if target.process:
+                    cpu, rss, nprocs = sample_processes(target, now)
+                    target.record(now, "cpu_pct", cpu if nprocs else math.nan)
+                    target.record(now, "rss_mb", rss if nprocs else math.nan)
+                row = summarise(target, opts.recent)
+                last_err = target.series["error"].last()
+                status = "✅" if last_err == 0.0 or (last_err is None and nprocs) else "❌"
+                logger.info("%s %-20s %8s ms  err %5s  cpu %6s %%  rss %7s MB  procs %s",
+                            status, target.name,
+                            _fmt(target.series["latency_ms"].last()), _fmt(row["error_rate"], 2),
+                            _fmt(row["cpu_pct"]), _fmt(row["rss_mb"]), nprocs if nprocs is not None else "–")
+                if row["drift"] and row["drift"] > opts.drift_alert and row["samples"] >= 20:
+                    logger.warning("Latency drift on %s: recent p95 %.0f ms vs %.0f ms window p95",
+                                   target.name, row["p95_recent_ms"], row["p95_ms"])
+                if export:
+                    export.write(json.dumps({"ts": now, **row}) + "\n")
+            if export:
+                export.flush()
+            tick += 1
+            await asyncio.sleep(max(0.0, opts.interval - (time.monotonic() - started)))
+
+
+def _fmt(value: Optional[float], digits: int = 0) -> str:
+    return "–" if value is None or math.isnan(value) else f"{value:.{digits}f}"
+
+
+# ─────────────────── HTTP API ────────────────────────────
+def build_app(targets: list[Target], opts: argparse.Namespace) -> FastAPI:
+    by_name = {t.name: t for t in targets}
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        task = asyncio.create_task(monitor_loop(targets, opts))
+        yield
+        task.cancel()
+
+    app = FastAPI(title="MCP monitor", lifespan=lifespan)
+
+    @app.get("/summary")
+    async def summary() -> list[dict]:
+        return [summarise(t, opts.recent) for t in targets]
+
+    @app.get("/series")
+    async def series(target: str, metric: str = "latency_ms") -> dict:
+        if target not in by_name or metric not in METRICS:
+            raise HTTPException(status_code=404, detail="Unknown target or metric")
+        points = by_name[target].series[metric].items()
+        return {"target": target, "metric": metric,
+                "points": [[ts, None if math.isnan(v) else v] for ts, v in points]}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics() -> str:
+        lines = []
+        for key, help_text in (("p50_ms", "Probe latency p50 over the window"),
+                               ("p95_ms", "Probe latency p95 over the window"),
+                               ("drift", "Recent p95 / window p95"),
+                               ("error_rate", "Share of failed probes over the window"),
+                               ("cpu_pct", "CPU % of the target's processes"),
+                               ("rss_mb", "RSS of the target's processes")):
+            lines += [f"# HELP mcp_monitor_{key} {help_text}", f"# TYPE mcp_monitor_{key} gauge"]
+            for t in targets:
+                value = summarise(t, opts.recent)[key]
+                if value is not None:
+                    lines.append(f'mcp_monitor_{key}{{target="{t.name}"}} {value:.6g}')
+        return "\n".join(lines) + "\n"
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monitor the MCP Gateway, frontends and agents")
+    parser.add_argument("--config", type=Path, help="JSON list of targets (default: local stack)")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between ticks")
+    parser.add_argument("--history", type=int, default=17280,
+                        help="samples kept per metric (17280 × 5 s = 24 h)")
+    parser.add_argument("--recent", type=float, default=300.0,
+                        help="seconds counted as 'recent' for drift")
+    parser.add_argument("--drift-alert", type=float, default=1.5)
+    parser.add_argument("--export", type=Path, help="append JSON lines per tick to this file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100, help="0 = no HTTP API")
+    opts = parser.parse_args()
+
+    targets = load_targets(opts.config, opts.history)
+    logger.info("Monitoring %d targets every %.0fs (press Ctrl-C to stop)…",
+                len(targets), opts.interval)
+    try:
+        if opts.port:
+            logger.info("History at http://%s:%d/summary", opts.host, opts.port)
+            uvicorn.run(build_app(targets, opts), host=opts.host, port=opts.port,
+                        log_level="warning")
+        else:
+            asyncio.run(monitor_loop(targets, opts))
+    except KeyboardInterrupt:
+        pass